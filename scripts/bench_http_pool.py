@@ -0,0 +1,108 @@
+# scripts/bench_http_pool.py
+"""
+Benchmark: conexiones (handshakes) por cada N llamadas en los caminos HTTP de
+producción, contra un servidor stub local HTTP/1.1:
+
+    bare     requests.get suelto (referencia, una conexión por llamada)
+    cached   http_cache.cached_get_json -> sesión por host de src/ingest/http_pool.py
+             (PandaScore, fantasy); caché desactivada para que todo vaya a red
+    aiohttp  AsyncAPISportsClient.get_url (API-Sports), secuencial y con gather
+
+Uso:
+
+    python scripts/bench_http_pool.py [--calls 100]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# every call must reach the stub: no response cache, and the API client needs a key to import
+os.environ["HTTP_CACHE_PATH"] = ""
+os.environ.setdefault("API_SPORTS_KEY", "bench")
+
+from src.ingest.http_cache import cached_get_json
+from src.ingest.http_pool import pool_stats, close_all
+from src.ingest.api_sports_client import AsyncAPISportsClient
+from src.utils.ratelimit import QuotaLimiter
+
+BODY = json.dumps({"response": [{"fixture": {"id": i}} for i in range(20)]}).encode()
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out in two writes
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+def report(label, server, calls, elapsed):
+    print(f"{label:>16} {calls:>6} {server.connections:>12} {elapsed * 1000 / calls:>10.2f}")
+
+def run_sync(label, get, server, calls):
+    server.connections = 0
+    url = f"http://127.0.0.1:{server.server_port}/fixtures"
+    t0 = time.perf_counter()
+    for i in range(calls):
+        get(url, {"league": i})
+    report(label, server, calls, time.perf_counter() - t0)
+
+async def run_async(label, server, calls, concurrent):
+    server.connections = 0
+    url = f"http://127.0.0.1:{server.server_port}/fixtures"
+    # private limiter: the bench must not spend (or persist) the real API-Sports quota
+    async with AsyncAPISportsClient(cache=False, limiter=QuotaLimiter({})) as client:
+        t0 = time.perf_counter()
+        if concurrent:
+            await asyncio.gather(*(client.get_url(url, {"league": i}) for i in range(calls)))
+        else:
+            for i in range(calls):
+                await client.get_url(url, {"league": i})
+        report(label, server, calls, time.perf_counter() - t0)
+        return client.stats()
+
+def bare_get(url, params):
+    r = requests.get(url, params=params, headers={"x-apisports-key": "x"}, timeout=5)
+    r.raise_for_status()
+    return r.json()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=100)
+    args = ap.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"{'client':>16} {'calls':>6} {'connections':>12} {'ms/call':>10}")
+    try:
+        run_sync("bare", bare_get, server, args.calls)
+        run_sync("cached_get_json", lambda url, params: cached_get_json(url, params, timeout=5), server, args.calls)
+        print("pool stats:", pool_stats())
+        close_all()
+        print("aiohttp stats:", asyncio.run(run_async("aiohttp", server, args.calls, concurrent=False)))
+        print("aiohttp stats:", asyncio.run(run_async("aiohttp gather", server, args.calls, concurrent=True)))
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# scripts/bench_parlay_search.py
+"""
+Benchmark: beam search del Soñador (src/parlay/search.py) vs la implementación
+original con listas de dicts. Uso:
+
+    python scripts/bench_parlay_search.py [--sizes 60 200 1000] [--target 10] [--beam 200]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.parlay.search import beam_search
+
+def legacy_beam_search(candidates, target_total_odds, max_legs, beam_width):
+    # copia de la versión previa de generate_parlay_sonador (solo la búsqueda)
+    best_combo = None
+    best_odds = 0.0
+    beam = [([], 1.0)]
+    for _ in range(1, min(max_legs, 8) + 1):
+        new_beam = []
+        for combo, combo_odds in beam:
+            for c in candidates:
+                if c in combo:
+                    continue
+                new_combo = combo + [c]
+                new_odds = combo_odds * c["odds"]
+                if new_odds >= target_total_odds:
+                    if new_odds > best_odds:
+                        best_combo = new_combo
+                        best_odds = new_odds
+                new_beam.append((new_combo, new_odds))
+        new_beam.sort(key=lambda tup: - (tup[1] * (1 + sum(x["ev"] for x in tup[0]))))
+        beam = new_beam[:beam_width]
+        if best_combo:
+            break
+    return best_combo if best_combo else (beam[0][0] if beam else [])
+
+def make_pool(n, seed=42):
+    rng = np.random.default_rng(seed)
+    odds = np.round(rng.uniform(1.21, 2.2, n), 2)
+    ev = np.round(rng.uniform(0.0, 0.15, n), 4)
+    match_idx = rng.integers(0, max(1, n // 3), n)
+    return odds, ev, match_idx
+
+def timed(fn, repeat):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[60, 200, 1000])
+    ap.add_argument("--target", type=float, default=10.0)
+    ap.add_argument("--beam", type=int, default=200)
+    ap.add_argument("--max-legs", type=int, default=8)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    print(f"target={args.target} beam={args.beam} max_legs={args.max_legs}")
+    print(f"{'n':>6} {'legacy_s':>10} {'new_s':>10} {'speedup':>8} {'legacy_odds':>12} {'new_odds':>10}")
+    for n in args.sizes:
+        odds, ev, match_idx = make_pool(n)
+        candidates = [{"odds": float(o), "ev": float(e), "match_id": int(m)} for o, e, m in zip(odds, ev, match_idx)]
+        t_old, old = timed(lambda: legacy_beam_search(candidates, args.target, args.max_legs, args.beam), 1)
+        t_new, new = timed(lambda: beam_search(odds, ev, match_idx, args.target, args.max_legs, args.beam), args.repeat)
+        old_odds = float(np.prod([c["odds"] for c in old])) if old else 0.0
+        new_odds = float(np.prod(odds[list(new)])) if new else 0.0
+        print(f"{n:>6} {t_old:>10.4f} {t_new:>10.4f} {t_old / t_new:>7.1f}x {old_odds:>12.2f} {new_odds:>10.2f}")
+
+if __name__ == "__main__":
+    main()
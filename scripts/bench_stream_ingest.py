@@ -0,0 +1,112 @@
+# scripts/bench_stream_ingest.py
+"""
+Benchmark: pico de memoria (RSS) de la ingesta con `await r.json()` + lista completa
+vs el parseo en streaming por lotes (src/worker/streaming.py). Cada modo corre
+en un proceso aparte para que ru_maxrss no se mezcle. Uso:
+
+    python scripts/bench_stream_ingest.py [--events 20000] [--books 8] [--batch 200]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.worker.oddsapi import normalize_event
+from src.worker.streaming import batches, iter_json_items
+
+class BytesStream:
+    """Serves the payload in network-sized chunks, like aiohttp's StreamReader."""
+    def __init__(self, path):
+        self.f = open(path, "rb")
+    async def read(self, n=-1):
+        await asyncio.sleep(0)
+        return self.f.read(65536 if n is None or n < 0 else n)
+
+def make_payload(path, events, books):
+    with open(path, "w") as f:
+        f.write("[")
+        for i in range(events):
+            if i:
+                f.write(",")
+            outcomes = [{"name": n, "price": 1.5 + (i % 7) / 10} for n in ("Home", "Away", "Draw")]
+            json.dump({
+                "id": f"ev{i}", "sport_key": "soccer_epl", "commence_time": "2026-01-01T15:00:00Z",
+                "home_team": f"H{i}", "away_team": f"A{i}",
+                "bookmakers": [{"title": f"book{b}", "markets": [{"key": "h2h", "outcomes": outcomes}]} for b in range(books)],
+            }, f)
+        f.write("]")
+
+async def write_batch(batch):
+    # stand-in for the DB writer: digest + upsert of one batch
+    await asyncio.sleep(0)
+    return len(batch)
+
+async def run_list(path, batch_size):
+    stream = BytesStream(path)
+    chunks = []
+    while True:
+        c = await stream.read(65536)
+        if not c:
+            break
+        chunks.append(c)
+    j = json.loads(b"".join(chunks))
+    matches = [normalize_event(m) for m in j]
+    first = time.perf_counter()
+    for i in range(0, len(matches), batch_size):
+        await write_batch(matches[i:i + batch_size])
+    return len(matches), first
+
+async def run_stream(path, batch_size):
+    async def items():
+        async for m in iter_json_items(BytesStream(path), "item"):
+            yield normalize_event(m)
+    n, first = 0, None
+    async for batch in batches(items(), batch_size):
+        if first is None:
+            first = time.perf_counter()
+        n += await write_batch(batch)
+    return n, first
+
+def child(mode, path, batch_size):
+    t0 = time.perf_counter()
+    n, first = asyncio.run((run_list if mode == "list" else run_stream)(path, batch_size))
+    total = time.perf_counter() - t0
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    print(json.dumps({"mode": mode, "matches": n, "total_s": total, "first_write_s": first - t0, "peak_rss_mb": rss_mb}))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--books", type=int, default=8)
+    ap.add_argument("--batch", type=int, default=200)
+    ap.add_argument("--mode", choices=["list", "stream"])
+    ap.add_argument("--payload")
+    args = ap.parse_args()
+    if args.mode:
+        child(args.mode, args.payload, args.batch)
+        return
+    path = os.path.join(ROOT, "data", "bench_oddsapi_payload.json")
+    make_payload(path, args.events, args.books)
+    print(f"payload: {os.path.getsize(path) / 1e6:.1f} MB, {args.events} events x {args.books} bookmakers")
+    print(f"{'mode':>8} {'matches':>8} {'total_s':>8} {'first_write_s':>14} {'peak_rss_mb':>12}")
+    try:
+        for mode in ("list", "stream"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--payload", path, "--batch", str(args.batch)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{r['mode']:>8} {r['matches']:>8} {r['total_s']:>8.2f} {r['first_write_s']:>14.3f} {r['peak_rss_mb']:>12.1f}")
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,8 @@
 Cron / Worker para:
 - Ingesta de datos desde APISPORTS, ODDSAPI y PANDASCORE
 - Upsert normalizado en la tabla `match_cache`
-- Revisión de `notifications`: notifica cambios de cuota (threshold_pct)
-- Notifica cuando una leg se gane (usa src/parlay/evaluator.evaluate_leg)
+- Revisión de `notifications` en lote (src/worker/notifications.py): notifica cambios de cuota (threshold_pct)
+- Notifica cuando una leg se gane o se gane a medias (liquidación en lote con src/parlay/evaluator.evaluate_legs)
 - Modo de persistencia:
     * Uso preferente: DATABASE_URL (asyncpg)
     * Fallback: SUPABASE_URL + SUPABASE_SERVICE_ROLE_KEY (REST)
@@ -26,14 +26,24 @@ import os
 import asyncio
 import aiohttp
 import asyncpg
-import json
 import time
-from typing import Optional, Dict, Any, List
-from decimal import Decimal
+from typing import AsyncIterator, Optional, Dict, Any, List
 from datetime import datetime, timezone
 
-# Evaluator import
-from src.parlay.evaluator import evaluate_leg  # se espera que exista
+# Notification pass (batched settlement + odds moves)
+from src.worker.notifications import build_notification_pass
+from src.worker.changes import MarketsDigests
+from src.worker.odds_index import OddsIndex
+from src.worker.delivery import DeliveryQueue, RetryAfter
+from src.worker.notify_state import NotificationStateStore
+from src.worker.match_cache import bulk_upsert_match_cache, stage_records, classify_records, rest_payload
+from src.worker.oddsapi import PROVIDER as ODDSAPI_PROVIDER, OddsApiQuota, load_oddsapi_slugs, slug_streams
+from src.worker.scheduler import PollScheduler
+from src.worker.sharding import PgLeaseStore, ShardManager, local_lease_store
+from src.worker.streaming import STREAM_BATCH, batches, iter_json_items, merge_streams
+from src.utils.ratelimit import retry_after, shared_limiter
+from src.parlay.cache import MATCH_CACHE_CHANNEL
+from src.parlay.generator import CANDIDATE_CACHE, refresh_parlay_catalogue
 
 # Env / Tokens (mantener exactamente los nombres)
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -49,183 +59,153 @@ DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("SUPABASE_DB_URL") or os.g
 CHECK_INTERVAL_SECONDS = int(os.getenv("NOTIFY_CHECK_INTERVAL", "30"))
 HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "BotPicks/1.0 (+https://example.com)")
 
-# Safety defaults
-DEFAULT_ODDS_CHANGE_THRESHOLD = 5.0  # percent
-DEFAULT_NOTIFY_ON_LEG_WON = True
+# Per-match markets digests: unchanged matches are not re-written (src/worker/changes.py)
+MARKETS_DIGESTS = MarketsDigests()
+
+# Workers that are not the ingest leader detect odds moves from the match_cache rows they read
+FOLLOWER_DIGESTS = MarketsDigests()
+
+# match_id -> subscribed parlays; odds-move alerts are driven by ingest deltas (src/worker/odds_index.py)
+ODDS_INDEX = OddsIndex()
+
+# Delivered events per (notification, leg, type): dedupe + cooldowns (src/worker/notify_state.py)
+NOTIFY_STATE = NotificationStateStore()
+
+# Provider quotas from response headers, shared with src/ingest and persisted between runs (src/utils/ratelimit.py)
+RATE_LIMITER = shared_limiter()
+
+# the-odds-api: slugs from config/markets_sources.json, planned within the limiter's "oddsapi" budget
+ODDSAPI_SLUGS = load_oddsapi_slugs()
+ODDSAPI_QUOTA = OddsApiQuota(RATE_LIMITER)
+
+# Per-target refresh cadence (live / pre-kickoff / far), paced per provider and
+# held back while the limiter reports the provider's quota spent (src/worker/scheduler.py)
+POLL_SCHEDULER = PollScheduler(limiter=RATE_LIMITER)
+
+# ids per PostgREST "in.(...)" filter, keeps request URLs short
+REST_IN_CHUNK = int(os.getenv("REST_IN_CHUNK", "150"))
 
 # Timeouts
 HTTP_TIMEOUT = aiohttp.ClientTimeout(total=20)
 
 # Simple Telegram send via Bot API (no aiogram dependency here)
-async def telegram_send_message(session: aiohttp.ClientSession, chat_id: int, text: str):
+async def telegram_deliver(session: aiohttp.ClientSession, chat_id: int, text: str):
+    """Send one message; raises RetryAfter on 429 and RuntimeError on other failures (used by DeliveryQueue)."""
     if not TELEGRAM_BOT_TOKEN:
         print("TELEGRAM_BOT_TOKEN not set; skipping telegram send.")
         return
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
-    try:
-        async with session.post(url, json=payload, timeout=HTTP_TIMEOUT) as resp:
-            if resp.status != 200:
-                txt = await resp.text()
-                print(f"Telegram send failed {resp.status}: {txt}")
-    except Exception as e:
-        print("Telegram send exception:", e)
+    async with session.post(url, json=payload, timeout=HTTP_TIMEOUT) as resp:
+        if resp.status == 429:
+            try:
+                body = await resp.json(content_type=None)
+                retry_after = float((body.get("parameters") or {}).get("retry_after") or 1)
+            except Exception:
+                retry_after = float(resp.headers.get("Retry-After") or 1)
+            raise RetryAfter(retry_after)
+        if resp.status != 200:
+            txt = await resp.text()
+            raise RuntimeError(f"Telegram send failed {resp.status}: {txt}")
 
 # Normalizer / Parser helpers for provider responses into our internal 'markets' format:
 # markets = { market_name: [ { "selection": "...", "odds": 1.23, "provider":"api-sports", "metadata": {...} }, ... ] }
 
-async def fetch_apisports_fixtures(session: aiohttp.ClientSession, sport: str = "football") -> List[Dict[str, Any]]:
+def normalize_apisports_fixture(f: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    fixture = f.get("fixture", {})
+    teams = f.get("teams", {})
+    if not fixture:
+        return None
+    match_id = str(fixture.get("id"))
+    start_ts = fixture.get("timestamp")
+    start_dt = datetime.fromtimestamp(start_ts, tz=timezone.utc) if start_ts else None
+    home = teams.get("home", {}).get("name")
+    away = teams.get("away", {}).get("name")
+    # Build markets from bookmakers if present
+    markets = {}
+    for bookmaker in f.get("bookmakers", []):
+        provider = bookmaker.get("title")
+        for bet in bookmaker.get("bets", []):
+            mname = bet.get("name") or "unknown"
+            selections = []
+            for val in bet.get("values", []):
+                odd = val.get("odd")
+                sel = val.get("value")
+                if odd is None or sel is None:
+                    continue
+                try:
+                    oddf = float(odd)
+                except Exception:
+                    continue
+                selections.append({"selection": sel, "odds": oddf, "provider": provider, "metadata": val})
+            if selections:
+                markets.setdefault(mname, []).extend(selections)
+    return {
+        "match_id": match_id,
+        "sport": "football",
+        "home": home,
+        "away": away,
+        "start_time": start_dt.isoformat() if start_dt else None,
+        "markets": markets,
+        "source": "api-sports"
+    }
+
+async def stream_apisports_fixtures(session: aiohttp.ClientSession, sport: str = "football") -> AsyncIterator[Dict[str, Any]]:
     """
-    Fetch fixtures + bookmaker markets from API-SPORTS (v3). Returns normalized list of matches.
-    Requires API_SPORTS_KEY.
+    Fixtures + bookmaker markets from API-SPORTS (v3), normalized one by one while the
+    response is parsed (src/worker/streaming.py). Requires API_SPORTS_KEY.
     """
     if not API_SPORTS_KEY:
-        return []
-    results = []
+        return
     headers = {"x-apisports-key": API_SPORTS_KEY, "User-Agent": HTTP_USER_AGENT}
     # Example: fetch upcoming fixtures for next 48h - adapt params if needed
     url = "https://v3.football.api-sports.io/fixtures"
     params = {"next": 48}  # next 48 hours
-    try:
-        async with session.get(url, headers=headers, params=params, timeout=HTTP_TIMEOUT) as r:
-            if r.status != 200:
-                txt = await r.text()
-                print("APISPORTS fetch error:", r.status, txt)
-                return []
-            j = await r.json()
-    except Exception as e:
-        print("APISPORTS request exception:", e)
-        return []
+    await RATE_LIMITER.acquire("apisports")
+    async with session.get(url, headers=headers, params=params, timeout=HTTP_TIMEOUT) as r:
+        RATE_LIMITER.update("apisports", r.headers)
+        if r.status == 429:
+            RATE_LIMITER.penalize("apisports", retry_after(r.headers))
+        if r.status != 200:
+            txt = await r.text()
+            raise RuntimeError(f"APISPORTS fetch error: {r.status} {txt[:200]}")
+        async for f in iter_json_items(r.content, "response.item"):
+            match = normalize_apisports_fixture(f)
+            if match:
+                yield match
 
-    for f in j.get("response", []):
-        fixture = f.get("fixture", {})
-        teams = f.get("teams", {})
-        if not fixture:
-            continue
-        match_id = str(fixture.get("id"))
-        start_ts = fixture.get("timestamp")
-        start_dt = datetime.fromtimestamp(start_ts, tz=timezone.utc) if start_ts else None
-        home = teams.get("home", {}).get("name")
-        away = teams.get("away", {}).get("name")
-        # Build markets from bookmakers if present
-        markets = {}
-        for bookmaker in f.get("bookmakers", []):
-            provider = bookmaker.get("title")
-            for bet in bookmaker.get("bets", []):
-                mname = bet.get("name") or "unknown"
-                selections = []
-                for val in bet.get("values", []):
-                    odd = val.get("odd")
-                    sel = val.get("value")
-                    if odd is None or sel is None:
-                        continue
-                    try:
-                        oddf = float(odd)
-                    except Exception:
-                        continue
-                    selections.append({"selection": sel, "odds": oddf, "provider": provider, "metadata": val})
-                if selections:
-                    markets.setdefault(mname, []).extend(selections)
-        results.append({
-            "match_id": match_id,
-            "sport": "football",
-            "home": home,
-            "away": away,
-            "start_time": start_dt.isoformat() if start_dt else None,
-            "markets": markets,
-            "source": "api-sports"
-        })
-    return results
-
-async def fetch_oddsapi_odds(session: aiohttp.ClientSession) -> List[Dict[str, Any]]:
-    """
-    Fetch odds from TheOddsAPI (oddsapi). Example endpoint: GET /v4/sports/{sport}/odds
-    We'll fetch several sports supported. Requires ODDSAPI_KEY.
-    """
-    if not ODDSAPI_KEY:
-        return []
-    results = []
-    base = "https://api.the-odds-api.com/v4/sports"
-    # List of some sports slugs used by the-odds-api
-    sport_slugs = ["soccer_epl", "soccer_spain_laliga", "basketball_nba", "americanfootball_nfl", "tennis_atp"]
-    for slug in sport_slugs:
-        url = f"{base}/{slug}/odds"
-        params = {"apiKey": ODDSAPI_KEY, "regions": "us,eu", "markets": "h2h,spreads,totals", "oddsFormat": "decimal"}
-        try:
-            async with session.get(url, params=params, timeout=HTTP_TIMEOUT, headers={"User-Agent": HTTP_USER_AGENT}) as r:
-                if r.status != 200:
-                    # skip quietly
-                    continue
-                j = await r.json()
-        except Exception:
-            continue
-        for match in j:
-            # match has: id, sport_key, commence_time, home_team, away_team, bookmakers -> markets
-            match_id = str(match.get("id") or f"{match.get('sport_key')}_{match.get('commence_time')}_{match.get('home_team')}")
-            start_time = match.get("commence_time")
-            home = match.get("home_team")
-            away = match.get("away_team")
-            markets = {}
-            for book in match.get("bookmakers", []):
-                prov = book.get("title")
-                for market in book.get("markets", []):
-                    mkey = market.get("key")
-                    for outcome in market.get("outcomes", []):
-                        sel = outcome.get("name")
-                        odd = outcome.get("price")
-                        if odd is None:
-                            continue
-                        try:
-                            oddf = float(odd)
-                        except Exception:
-                            continue
-                        markets.setdefault(mkey, []).append({"selection": sel, "odds": oddf, "provider": prov, "metadata": outcome})
-            results.append({
-                "match_id": match_id,
-                "sport": match.get("sport_key"),
-                "home": home,
-                "away": away,
-                "start_time": start_time,
-                "markets": markets,
-                "source": "oddsapi"
-            })
-    return results
-
-async def fetch_pandascore_matches(session: aiohttp.ClientSession) -> List[Dict[str, Any]]:
+def normalize_pandascore_match(m: Dict[str, Any]) -> Dict[str, Any]:
+    home = (m.get("opponents") or [{}])[0].get("opponent", {}).get("name") if m.get("opponents") else None
+    away = (m.get("opponents") or [{}])[1].get("opponent", {}).get("name") if m.get("opponents") else None
+    # PandaScore may not provide odds; markets may be empty -> still store metadata
+    return {
+        "match_id": str(m.get("id")),
+        "sport": "esports",
+        "home": home,
+        "away": away,
+        "start_time": m.get("begin_at"),
+        "markets": {},
+        "source": "pandascore"
+    }
+
+async def stream_pandascore_matches(session: aiohttp.ClientSession) -> AsyncIterator[Dict[str, Any]]:
     """
-    Fetch matches from PandaScore (esports). Requires PANDASCORE_KEY.
+    Matches from PandaScore (esports). Requires PANDASCORE_KEY.
     Endpoint example: https://api.pandascore.co/matches/upcoming
     """
     if not PANDASCORE_KEY:
-        return []
-    results = []
-    base = "https://api.pandascore.co"
-    url = f"{base}/matches/upcoming"
+        return
+    url = "https://api.pandascore.co/matches/upcoming"
     headers = {"Authorization": f"Bearer {PANDASCORE_KEY}", "User-Agent": HTTP_USER_AGENT}
-    try:
-        async with session.get(url, headers=headers, timeout=HTTP_TIMEOUT) as r:
-            if r.status != 200:
-                return []
-            j = await r.json()
-    except Exception:
-        return []
-    for m in j:
-        league = m.get("league", {}).get("name")
-        match_id = str(m.get("id"))
-        home = (m.get("opponents") or [{}])[0].get("opponent", {}).get("name") if m.get("opponents") else None
-        away = (m.get("opponents") or [{}])[1].get("opponent", {}).get("name") if m.get("opponents") else None
-        # PandaScore may not provide odds; markets may be empty -> still store metadata
-        markets = {}
-        results.append({
-            "match_id": match_id,
-            "sport": "esports",
-            "home": home,
-            "away": away,
-            "start_time": m.get("begin_at"),
-            "markets": markets,
-            "source": "pandascore"
-        })
-    return results
+    await RATE_LIMITER.acquire("pandascore")
+    async with session.get(url, headers=headers, timeout=HTTP_TIMEOUT) as r:
+        RATE_LIMITER.update("pandascore", r.headers)
+        if r.status == 429:
+            RATE_LIMITER.penalize("pandascore", retry_after(r.headers))
+        if r.status != 200:
+            raise RuntimeError(f"PandaScore fetch error: {r.status}")
+        async for m in iter_json_items(r.content, "item"):
+            yield normalize_pandascore_match(m)
 
 # DB wrapper: try asyncpg (Postgres). If not available, use Supabase REST API
 class DBClient:
@@ -252,274 +232,420 @@ class DBClient:
         if self.session:
             await self.session.close()
 
-    # Upsert match_cache row
-    async def upsert_match_cache(self, match: Dict[str, Any]):
+    async def upsert_match_cache_bulk(self, matches: List[Dict[str, Any]]) -> Dict[str, int]:
         """
-        match: { match_id, sport, home, away, start_time (iso), markets (dict), source }
+        Upsert a whole ingest batch (src/worker/match_cache.py): COPY + one merge with
+        asyncpg, chunked array POSTs of new/changed rows with Supabase REST.
+        Returns {"inserted", "updated", "unchanged", "failed", "failed_ids"}.
         """
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "failed": 0, "failed_ids": []}
+        if not matches:
+            return counts
+        all_ids = [str(m.get("match_id")) for m in matches]
         if self.pool:
-            async with self.pool.acquire() as conn:
-                try:
-                    await conn.execute(
-                        """
-                        INSERT INTO match_cache (match_id, sport, home, away, start_time, markets, status)
-                        VALUES ($1,$2,$3,$4,$5,$6,$7)
-                        ON CONFLICT (match_id) DO UPDATE
-                          SET markets = EXCLUDED.markets, start_time = EXCLUDED.start_time, sport = EXCLUDED.sport
-                        """,
-                        str(match.get("match_id")),
-                        match.get("sport"),
-                        match.get("home"),
-                        match.get("away"),
-                        match.get("start_time"),
-                        json.dumps(match.get("markets") or {}),
-                        "not_started"
-                    )
-                except Exception as e:
-                    print("DB upsert error (asyncpg):", e)
-        elif self.supabase_url and self.supabase_key:
-            # Use Supabase REST upsert (merge-duplicates) - requires primary key match_id
-            table = "match_cache"
-            url = f"{self.supabase_url}/rest/v1/{table}"
-            headers = {
-                "apikey": self.supabase_key,
-                "Authorization": f"Bearer {self.supabase_key}",
-                "Content-Type": "application/json",
-                "Prefer": "resolution=merge-duplicates",  # upsert
-                "Accept": "application/json"
-            }
-            payload = {
-                "match_id": str(match.get("match_id")),
-                "sport": match.get("sport"),
-                "home": match.get("home"),
-                "away": match.get("away"),
-                "start_time": match.get("start_time"),
-                "markets": match.get("markets") or {},
-                "status": "not_started"
-            }
             try:
-                async with self.session.post(url, headers=headers, json=[payload]) as resp:
-                    if resp.status not in (200, 201, 204):
-                        txt = await resp.text()
-                        print("Supabase upsert match_cache failed:", resp.status, txt)
+                async with self.pool.acquire() as conn:
+                    return dict(await bulk_upsert_match_cache(conn, matches), failed=0, failed_ids=[])
             except Exception as e:
-                print("Supabase upsert exception:", e)
+                print("DB bulk upsert error (asyncpg):", e)
+                return dict(counts, failed=len(matches), failed_ids=all_ids)
+        elif self.supabase_url and self.supabase_key:
+            records = stage_records(matches)
+            rows = await self._rest_fetch_in("match_cache", "match_id", [r[0] for r in records], select="match_id,sport,start_time,markets_hash")
+            existing = {str(r.get("match_id")): r for r in rows}
+            # rows written before markets_hash existed are compared on their markets
+            unhashed = [mid for mid, r in existing.items() if not r.get("markets_hash")]
+            if unhashed:
+                for r in await self._rest_fetch_in("match_cache", "match_id", unhashed, select="match_id,markets"):
+                    existing[str(r.get("match_id"))]["markets"] = r.get("markets")
+            to_write, counts = classify_records(records, existing)
+            counts.update(failed=0, failed_ids=[])
+            url = f"{self.supabase_url}/rest/v1/match_cache"
+            headers = dict(self._rest_headers(), **{"Content-Type": "application/json", "Prefer": "resolution=merge-duplicates,return=minimal"})
+            for i in range(0, len(to_write), REST_IN_CHUNK):
+                chunk = to_write[i:i + REST_IN_CHUNK]
+                payload = [rest_payload(r) for r in chunk]
+                try:
+                    async with self.session.post(url, headers=headers, json=payload) as resp:
+                        if resp.status not in (200, 201, 204):
+                            txt = await resp.text()
+                            print("Supabase bulk upsert match_cache failed:", resp.status, txt)
+                            counts["failed"] += len(payload)
+                            counts["failed_ids"].extend(r[0] for r in chunk)
+                except Exception as e:
+                    print("Supabase bulk upsert exception:", e)
+                    counts["failed"] += len(payload)
+                    counts["failed_ids"].extend(r[0] for r in chunk)
+            return counts
         else:
             print("No DB client available to upsert match_cache.")
+            return dict(counts, failed=len(matches), failed_ids=all_ids)
 
-    async def fetch_notifications(self):
+    async def fetch_markets_hashes(self) -> List[Dict[str, Any]]:
+        """Stored digests of upcoming/recent matches, to prime MARKETS_DIGESTS after a restart."""
+        if self.pool:
+            try:
+                async with self.pool.acquire() as conn:
+                    rows = await conn.fetch("SELECT match_id, markets_hash, sport, start_time FROM match_cache WHERE markets_hash IS NOT NULL AND start_time > now() - interval '1 day'")
+                    return [dict(r) for r in rows]
+            except Exception as e:
+                print("markets_hash prime error:", e)
+        return []
+
+    async def notify_match_cache_updated(self):
         """
-        Return list of notifications rows: id, user_id, parlay_id, trigger_config, active
-        Implemented for both Postgres and Supabase REST.
+        Invalida los snapshots de candidatos de parlay: en este proceso directamente y en
+        otros procesos (bot) via Postgres NOTIFY. Con Supabase REST solo aplica el TTL.
         """
+        CANDIDATE_CACHE.invalidate()
+        if self.pool:
+            try:
+                async with self.pool.acquire() as conn:
+                    await conn.execute("SELECT pg_notify($1, '')", MATCH_CACHE_CHANNEL)
+            except Exception as e:
+                print("pg_notify match_cache error:", e)
+
+    # --- batched notification pass: three reads, one write ---------------
+    def _rest_headers(self) -> Dict[str, str]:
+        return {"apikey": self.supabase_key, "Authorization": f"Bearer {self.supabase_key}", "Accept": "application/json"}
+
+    async def _rest_fetch_in(self, table: str, column: str, values: List[Any], select: str = "*") -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        for i in range(0, len(values), REST_IN_CHUNK):
+            chunk = ",".join('"%s"' % str(v).replace('"', '') for v in values[i:i + REST_IN_CHUNK])
+            url = f"{self.supabase_url}/rest/v1/{table}?{column}=in.({chunk})&select={select}"
+            async with self.session.get(url, headers=self._rest_headers()) as resp:
+                if resp.status == 200:
+                    rows.extend(await resp.json())
+                else:
+                    txt = await resp.text()
+                    print(f"Supabase fetch {table} failed:", resp.status, txt)
+        return rows
+
+    async def fetch_active_notifications(self) -> List[Dict[str, Any]]:
+        """Active notifications joined to their parlay (parlay_total_odds) in one query."""
         if self.pool:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch("SELECT id, user_id, parlay_id, trigger_config, active, last_notified_at FROM notifications WHERE active = true")
+                rows = await conn.fetch(
+                    """
+                    SELECT n.id, n.user_id, n.parlay_id, n.trigger_config, n.active, n.last_notified_at,
+                           p.total_odds AS parlay_total_odds
+                    FROM notifications n
+                    JOIN parlays p ON p.id = n.parlay_id
+                    WHERE n.active = true
+                    """
+                )
                 return [dict(r) for r in rows]
         elif self.supabase_url and self.supabase_key:
-            url = f"{self.supabase_url}/rest/v1/notifications?active=eq.true"
-            headers = {"apikey": self.supabase_key, "Authorization": f"Bearer {self.supabase_key}", "Accept": "application/json"}
-            async with self.session.get(url, headers=headers) as resp:
-                if resp.status == 200:
-                    j = await resp.json()
-                    return j
-                else:
+            url = f"{self.supabase_url}/rest/v1/notifications?active=eq.true&select=*,parlays(total_odds)"
+            async with self.session.get(url, headers=self._rest_headers()) as resp:
+                if resp.status != 200:
                     txt = await resp.text()
                     print("Supabase fetch notifications failed:", resp.status, txt)
                     return []
+                rows = await resp.json()
+            out = []
+            for r in rows:
+                parlay = r.pop("parlays", None)
+                if not parlay:
+                    continue
+                r["parlay_total_odds"] = (parlay[0] if isinstance(parlay, list) else parlay).get("total_odds")
+                out.append(r)
+            return out
         else:
             return []
 
-    async def fetch_parlay(self, parlay_id: int) -> Optional[Dict[str, Any]]:
+    async def fetch_legs_for_parlays(self, parlay_ids: List[int]) -> List[Dict[str, Any]]:
+        if not parlay_ids:
+            return []
         if self.pool:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow("SELECT id, user_id, total_odds, settings_snapshot FROM parlays WHERE id=$1", parlay_id)
-                return dict(row) if row else None
+                rows = await conn.fetch("SELECT id, parlay_id, match_id, market, selection, odds, metadata FROM parlay_legs WHERE parlay_id = ANY($1::bigint[])", parlay_ids)
+                return [dict(r) for r in rows]
         elif self.supabase_url and self.supabase_key:
-            url = f"{self.supabase_url}/rest/v1/parlays?id=eq.{parlay_id}&select=*"
-            headers = {"apikey": self.supabase_key, "Authorization": f"Bearer {self.supabase_key}", "Accept": "application/json"}
-            async with self.session.get(url, headers=headers) as resp:
-                if resp.status == 200:
-                    j = await resp.json()
-                    return j[0] if j else None
-                else:
-                    return None
+            return await self._rest_fetch_in("parlay_legs", "parlay_id", parlay_ids)
         else:
-            return None
+            return []
 
-    async def fetch_parlay_legs(self, parlay_id: int) -> List[Dict[str, Any]]:
+    async def fetch_matchcache_many(self, match_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Distinct match_cache rows by match_id."""
+        if not match_ids:
+            return {}
+        rows: List[Dict[str, Any]] = []
         if self.pool:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch("SELECT id, match_id, market, selection, odds FROM parlay_legs WHERE parlay_id=$1", parlay_id)
-                return [dict(r) for r in rows]
+                rows = [dict(r) for r in await conn.fetch(
+                    "SELECT match_id, sport, home, away, start_time, markets, status, home_score, away_score, to_jsonb(match_cache)->'maps' AS maps FROM match_cache WHERE match_id = ANY($1::text[])",
+                    match_ids
+                )]
         elif self.supabase_url and self.supabase_key:
-            url = f"{self.supabase_url}/rest/v1/parlay_legs?parlay_id=eq.{parlay_id}"
-            headers = {"apikey": self.supabase_key, "Authorization": f"Bearer {self.supabase_key}", "Accept": "application/json"}
-            async with self.session.get(url, headers=headers) as resp:
-                if resp.status == 200:
-                    return await resp.json()
-                else:
-                    return []
-        else:
-            return []
+            rows = await self._rest_fetch_in("match_cache", "match_id", match_ids)
+        return {str(r.get("match_id")): r for r in rows}
 
-    async def fetch_matchcache_by_id(self, match_id: str) -> Optional[Dict[str, Any]]:
+    async def update_notifications_last_notified(self, notif_ids: List[int]):
+        if not notif_ids:
+            return
         if self.pool:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow("SELECT match_id, sport, home, away, start_time, markets, status, home_score, away_score FROM match_cache WHERE match_id=$1", match_id)
-                return dict(row) if row else None
+                await conn.execute("UPDATE notifications SET last_notified_at = now() WHERE id = ANY($1::bigint[])", notif_ids)
         elif self.supabase_url and self.supabase_key:
-            url = f"{self.supabase_url}/rest/v1/match_cache?match_id=eq.{match_id}&select=*"
-            headers = {"apikey": self.supabase_key, "Authorization": f"Bearer {self.supabase_key}", "Accept": "application/json"}
-            async with self.session.get(url, headers=headers) as resp:
+            headers = dict(self._rest_headers(), **{"Content-Type": "application/json", "Prefer": "return=minimal"})
+            payload = {"last_notified_at": datetime.now(timezone.utc).isoformat()}
+            for i in range(0, len(notif_ids), REST_IN_CHUNK):
+                ids = ",".join(str(x) for x in notif_ids[i:i + REST_IN_CHUNK])
+                url = f"{self.supabase_url}/rest/v1/notifications?id=in.({ids})"
+                async with self.session.patch(url, headers=headers, json=payload) as resp:
+                    if resp.status not in (200, 204):
+                        txt = await resp.text()
+                        print("Supabase update notifications failed:", resp.status, txt)
+
+    async def load_notification_state(self, state: NotificationStateStore):
+        if self.pool:
+            try:
+                async with self.pool.acquire() as conn:
+                    await state.load(conn)
+            except Exception as e:
+                print("notification_events load error:", e)
+        elif self.supabase_url and self.supabase_key:
+            url = f"{self.supabase_url}/rest/v1/notification_events?select=*"
+            async with self.session.get(url, headers=self._rest_headers()) as resp:
                 if resp.status == 200:
-                    j = await resp.json()
-                    return j[0] if j else None
-                else:
-                    return None
-        else:
-            return None
+                    state.load_rows(await resp.json())
 
-    async def update_notification_last_notified(self, notif_id: int):
+    async def flush_notification_state(self, state: NotificationStateStore):
+        """Write the event states changed during the pass (one executemany / one POST)."""
         if self.pool:
-            async with self.pool.acquire() as conn:
-                await conn.execute("UPDATE notifications SET last_notified_at = now() WHERE id=$1", notif_id)
+            try:
+                async with self.pool.acquire() as conn:
+                    await state.flush(conn)
+            except Exception as e:
+                print("notification_events flush error:", e)
         elif self.supabase_url and self.supabase_key:
-            url = f"{self.supabase_url}/rest/v1/notifications?id=eq.{notif_id}"
-            headers = {"apikey": self.supabase_key, "Authorization": f"Bearer {self.supabase_key}", "Content-Type": "application/json", "Prefer": "return=representation"}
-            payload = {"last_notified_at": datetime.now(timezone.utc).isoformat()}
-            async with self.session.patch(url, headers=headers, json=payload) as resp:
-                if resp.status not in (200,204):
+            records = state.dirty_records()
+            if not records:
+                return
+            payload = [
+                {"notification_id": r[0], "leg_id": r[1], "event_type": r[2], "state": r[3], "last_value": r[4],
+                 "fired_at": r[5].isoformat() if r[5] else None}
+                for r in records
+            ]
+            headers = dict(self._rest_headers(), **{"Content-Type": "application/json", "Prefer": "resolution=merge-duplicates,return=minimal"})
+            async with self.session.post(f"{self.supabase_url}/rest/v1/notification_events", headers=headers, json=payload) as resp:
+                if resp.status in (200, 201, 204):
+                    state.mark_clean()
+                else:
                     txt = await resp.text()
-                    print("Supabase update notification failed:", resp.status, txt)
-
-# Helper to compute current total odds for a parlay by reading match_cache markets
-async def compute_current_parlay_odds(db: DBClient, legs: List[Dict[str, Any]]) -> float:
-    total = 1.0
-    for leg in legs:
-        match_id = str(leg.get("match_id"))
-        mc = await db.fetch_matchcache_by_id(match_id)
-        chosen_odds = None
-        if mc and mc.get("markets"):
-            markets = mc.get("markets") or {}
-            # try find market matching leg.market and selection
-            for mname, selections in markets.items():
-                # Compare normalized market name and selection heuristically
-                if normalize_str(mname) == normalize_str(leg.get("market")) or normalize_str(leg.get("market")) in normalize_str(mname):
-                    for s in selections:
-                        if normalize_str(s.get("selection","")) == normalize_str(leg.get("selection","")):
-                            chosen_odds = float(s.get("odds"))
-                            break
-                    if chosen_odds:
-                        break
-            # if not found, try to take first odds available
-            if not chosen_odds:
-                for mname, selections in markets.items():
-                    if selections:
-                        chosen_odds = float(selections[0].get("odds"))
-                        break
-        if not chosen_odds:
-            # fallback to stored leg odds
-            chosen_odds = float(leg.get("odds", 1.0) or 1.0)
-        total *= float(chosen_odds)
-    return float(total)
-
-def normalize_str(s: Optional[str]) -> str:
-    if not s:
-        return ""
-    return str(s).strip().lower()
+                    print("Supabase notification_events upsert failed:", resp.status, txt)
+
+# Batched notification pass: notifications+parlays, legs, match_cache rows; the rest in memory.
+# Odds moves come from ODDS_INDEX (ingest deltas); a full odds check only runs when the index is rebuilt.
+async def process_notifications(db: DBClient, delivery: DeliveryQueue, changed: Optional[List[Dict[str, Any]]] = None, odds_deltas: Optional[list] = None, shards: Optional[ShardManager] = None):
+    """changed/odds_deltas None: this worker did not ingest, the moves are diffed from match_cache."""
+    notifs = await db.fetch_active_notifications()
+    if shards is not None:
+        # only the parlays of the shards leased to this worker
+        notifs = shards.filter(notifs)
+    if not notifs:
+        return
+    NOTIFY_STATE.retain(n.get("id") for n in notifs)
+    parlay_ids = sorted({int(n.get("parlay_id")) for n in notifs})
+    legs = await db.fetch_legs_for_parlays(parlay_ids)
+    matches = await db.fetch_matchcache_many(sorted({str(leg.get("match_id")) for leg in legs}))
+    if changed is None:
+        changed, odds_deltas = FOLLOWER_DIGESTS.diff(list(matches.values()))
+        FOLLOWER_DIGESTS.commit(changed)
+    if ODDS_INDEX.stale():
+        plan = build_notification_pass(notifs, legs, matches, check_odds=True, state=NOTIFY_STATE)
+        ODDS_INDEX.rebuild(notifs, legs, matches)
+    else:
+        plan = ODDS_INDEX.apply(changed or [], odds_deltas or [], state=NOTIFY_STATE)
+        plan.extend(build_notification_pass(notifs, legs, matches, check_odds=False, state=NOTIFY_STATE))
+    # sending happens in the delivery workers; one coalesced message per chat and cycle
+    delivery.enqueue_batch(plan.messages, plan.leg_events)
+    await db.update_notifications_last_notified(plan.notified_ids)
+    await db.flush_notification_state(NOTIFY_STATE)
+    if plan.messages:
+        print(f"Notifications: {len(notifs)} active, {plan.odds_changes} odds changes, {plan.legs_won} legs won; delivery {delivery.metrics()}")
+
+def release_leg_events(tags: List[Any]):
+    """A leg-won message was dropped by the delivery queue: the next pass sends it again."""
+    for notif_id, leg_id in tags:
+        NOTIFY_STATE.leg_unsent(notif_id, leg_id)
+
+# Background stage: pre-generate the parlay catalogue after an ingest pass (asyncpg only)
+async def refresh_catalogue_stage(db: DBClient):
+    try:
+        entries = await refresh_parlay_catalogue(db.pool)
+        print(f"Parlay catalogue refreshed: {len(entries)} entries")
+    except Exception as e:
+        print("Parlay catalogue refresh error:", e)
+
+def poll_targets() -> Dict[str, Any]:
+    """
+    key -> (provider, stream(session)); the-odds-api slugs map to ("oddsapi", slug): each
+    keeps its own cadence, but the due ones are fetched together (oddsapi_streams).
+    """
+    targets: Dict[str, Any] = {
+        "apisports:football": ("apisports", stream_apisports_fixtures),
+        "pandascore": ("pandascore", stream_pandascore_matches),
+    }
+    if ODDSAPI_KEY:
+        for slug in ODDSAPI_SLUGS:
+            targets[f"oddsapi:{slug}"] = (ODDSAPI_PROVIDER, slug)
+    return targets
+
+def oddsapi_streams(session: aiohttp.ClientSession, slugs: List[str]) -> Dict[str, AsyncIterator[Dict[str, Any]]]:
+    """
+    Odds from TheOddsAPI (oddsapi). Example endpoint: GET /v4/sports/{sport}/odds
+    One stream per slug, planned within the remaining request quota and fetched at most
+    ODDSAPI_CONCURRENCY at a time (src/worker/oddsapi.py). Requires ODDSAPI_KEY.
+    """
+    return slug_streams(session, ODDSAPI_KEY, slugs, ODDSAPI_QUOTA, timeout=HTTP_TIMEOUT, headers={"User-Agent": HTTP_USER_AGENT})
+
+async def ingest_due_targets(db: DBClient, session: aiohttp.ClientSession, targets: Dict[str, Any]):
+    """
+    Stream the due targets into match_cache in STREAM_BATCH batches while the responses
+    are still being parsed. Returns (changed matches, odds deltas, rows inserted+updated).
+    """
+    due = POLL_SCHEDULER.due()
+    if not due:
+        return [], [], 0
+    sources: Dict[str, AsyncIterator[Dict[str, Any]]] = {}
+    slugs: Dict[str, str] = {}
+    for key in due:
+        provider, stream = targets[key]
+        if provider == ODDSAPI_PROVIDER:
+            slugs[stream] = key
+        else:
+            sources[key] = stream(session)
+    if slugs:
+        planned = oddsapi_streams(session, list(slugs))
+        for slug, key in slugs.items():
+            if slug in planned:
+                sources[key] = planned[slug]
+            else:
+                POLL_SCHEDULER.defer(key)  # outside this pass's quota plan
+        due = list(sources)
+    seen: Dict[str, List[Dict[str, Any]]] = {key: [] for key in due}
+    failed = set()
+
+    async def matches():
+        async for key, item in merge_streams(sources):
+            if isinstance(item, Exception):
+                print("Ingest task exception:", key, item)
+                failed.add(key)
+                continue
+            seen[key].append({"start_time": item.get("start_time"), "status": item.get("status")})
+            yield item
+
+    changed_all: List[Dict[str, Any]] = []
+    deltas_all: list = []
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0, "failed": 0}
+    received = 0
+    completed = False
+    try:
+        async for batch in batches(matches(), STREAM_BATCH):
+            received += len(batch)
+            # only matches whose markets digest (or sport/start_time) changed are written
+            changed, deltas = MARKETS_DIGESTS.diff(batch)
+            counts = await db.upsert_match_cache_bulk(changed)
+            if counts["failed"]:
+                # alerts, ODDS_INDEX and the digests only see the rows that were written
+                lost = set(counts.get("failed_ids") or (str(m.get("match_id")) for m in changed))
+                changed = [m for m in changed if str(m.get("match_id")) not in lost]
+                deltas = [d for d in deltas if d.match_id not in lost]
+            MARKETS_DIGESTS.commit(changed)
+            for k in totals:
+                totals[k] += counts[k]
+            changed_all.extend(changed)
+            deltas_all.extend(deltas)
+        completed = True
+    finally:
+        # never leave a target in flight: an aborted pass retries them with backoff
+        for key in due:
+            if not completed or key in failed:
+                POLL_SCHEDULER.failed(key)
+            else:
+                POLL_SCHEDULER.observe(key, seen[key])
+    if received:
+        skipped = received - len(changed_all) - totals["failed"]
+        print(f"match_cache: {totals['inserted']} inserted, {totals['updated']} updated, {totals['unchanged'] + skipped} unchanged, {totals['failed']} failed, {len(deltas_all)} odds moves")
+    return changed_all, deltas_all, totals["inserted"] + totals["updated"]
 
 # Main loop: ingest -> upsert -> check notifications -> send messages for odds change & leg won
 async def main_loop():
     db = DBClient(DATABASE_URL, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
     await db.init()
+    MARKETS_DIGESTS.prime(await db.fetch_markets_hashes())
+    await db.load_notification_state(NOTIFY_STATE)
+    # several workers can run side by side: parlays are sharded through leases (src/worker/sharding.py)
+    try:
+        shards = ShardManager(PgLeaseStore(db.pool) if db.pool else local_lease_store())
+    except RuntimeError:
+        await db.close()
+        raise
+    catalogue_task: Optional[asyncio.Task] = None
+    targets = poll_targets()
+    for key, (provider, _) in targets.items():
+        POLL_SCHEDULER.add(key, provider)
     async with aiohttp.ClientSession(timeout=HTTP_TIMEOUT, headers={"User-Agent": HTTP_USER_AGENT}) as session:
+        delivery = DeliveryQueue(lambda chat_id, text: telegram_deliver(session, chat_id, text), on_dropped=release_leg_events)
+        delivery.start()
         try:
             while True:
                 start = time.time()
-                # 1) Ingest from providers (APISPORTS, ODDSAPI, PANDASCORE)
-                tasks = [
-                    fetch_apisports_fixtures(session),
-                    fetch_oddsapi_odds(session),
-                    fetch_pandascore_matches(session)
-                ]
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                ingested = 0
-                for res in results:
-                    if isinstance(res, Exception):
-                        print("Ingest task exception:", res)
-                        continue
-                    for m in res:
-                        await db.upsert_match_cache(m)
-                        ingested += 1
-                if ingested:
-                    print(f"Ingested/updated {ingested} matches into match_cache")
-
-                # 2) Process notifications
-                notifs = await db.fetch_notifications()
-                for n in notifs:
-                    notif_id = n.get("id")
-                    user_id = int(n.get("user_id"))
-                    parlay_id = int(n.get("parlay_id"))
-                    trigger_config = n.get("trigger_config") or {}
-                    threshold = float(trigger_config.get("threshold_pct", DEFAULT_ODDS_CHANGE_THRESHOLD))
-                    notify_on_leg_won = bool(trigger_config.get("notify_on_leg_won", DEFAULT_NOTIFY_ON_LEG_WON))
-
-                    parlay = await db.fetch_parlay(parlay_id)
-                    if not parlay:
-                        continue
-                    saved_total_odds = float(parlay.get("total_odds") or 0.0)
-                    legs = await db.fetch_parlay_legs(parlay_id)
-                    # Compute current total odds
-                    current_total_odds = await compute_current_parlay_odds(db, legs)
-                    pct_change = abs((current_total_odds - saved_total_odds) / saved_total_odds * 100) if saved_total_odds > 0 else 0.0
-                    if pct_change >= threshold:
-                        # notify user
-                        msg = f"🔔 Cambio de cuota detectado para tu Parlay #{parlay_id}\nCuota anterior: {saved_total_odds:.2f}\nCuota actual: {current_total_odds:.2f}\nCambio: {pct_change:.2f}%"
-                        await telegram_send_message(session, user_id, msg)
-                        await db.update_notification_last_notified(notif_id)
-
-                    # Now check legs results (notify when a leg is won)
-                    if notify_on_leg_won:
-                        for leg in legs:
-                            match_id = str(leg.get("match_id"))
-                            mc = await db.fetch_matchcache_by_id(match_id)
-                            if not mc:
-                                continue
-                            status = (mc.get("status") or "").lower()
-                            # status should be 'finished' for evaluation
-                            if status != "finished":
-                                continue
-                            # build match_final structure expected by evaluator
-                            match_final = {
-                                "status": mc.get("status"),
-                                "home": mc.get("home"),
-                                "away": mc.get("away"),
-                                "home_score": mc.get("home_score"),
-                                "away_score": mc.get("away_score"),
-                                "winner": mc.get("winner"),
-                                "final_result": mc.get("final_result")
-                            }
-                            leg_obj = {"market": leg.get("market"), "selection": leg.get("selection"), "metadata": leg.get("metadata")}
-                            try:
-                                res = evaluate_leg(leg_obj, match_final)
-                            except Exception as e:
-                                print("Evaluator exception:", e)
-                                res = None
-                            if res is True:
-                                # Send notification for leg won
-                                text = f"✅ ¡Una leg de tu Parlay #{parlay_id} se ganó!\nMatch: {match_final.get('home')} vs {match_final.get('away')}\nPick: {leg.get('selection')} — Cuota: {float(leg.get('odds') or 0):.2f}"
-                                await telegram_send_message(session, user_id, text)
-                                # update notification last_notified
-                                await db.update_notification_last_notified(notif_id)
+                try:
+                    if await shards.heartbeat():
+                        # other parlays now: rebuild the odds index and reload their delivered events
+                        ODDS_INDEX.invalidate()
+                        await db.load_notification_state(NOTIFY_STATE)
+                        print("Shards:", shards.stats())
+                except Exception as e:
+                    # without valid leases another worker may own our shards: skip this pass
+                    print("Shard heartbeat error:", e)
+                    shards.held = set()
+                changed, odds_deltas = None, None
+                if shards.leader:
+                    # 1) Ingest from providers (APISPORTS, ODDSAPI, PANDASCORE): only the targets that are due
+                    try:
+                        changed, odds_deltas, ingested = await ingest_due_targets(db, session, targets)
+                    except Exception as e:
+                        # the followers' diff path still runs the notification pass
+                        print("Ingest pass error:", e)
+                        ingested = 0
+                    if ingested:
+                        await db.notify_match_cache_updated()
+                        # one refresh at a time; it runs while notifications are processed
+                        if db.pool and (catalogue_task is None or catalogue_task.done()):
+                            catalogue_task = asyncio.create_task(refresh_catalogue_stage(db))
+
+                # 2) Process notifications (three queries per pass, then in memory)
+                try:
+                    if shards.held:
+                        await process_notifications(db, delivery, changed, odds_deltas, shards)
+                except Exception as e:
+                    print("Notification pass error:", e)
                 elapsed = time.time() - start
-                sleep_for = max(1, CHECK_INTERVAL_SECONDS - elapsed)
+                # wake up for the next due refresh, at most CHECK_INTERVAL_SECONDS apart (settlement pass)
+                sleep_for = CHECK_INTERVAL_SECONDS - elapsed
+                next_due = POLL_SCHEDULER.next_due()
+                if next_due is not None and shards.leader:
+                    sleep_for = min(sleep_for, next_due - time.time())
+                sleep_for = max(1, sleep_for)
                 await asyncio.sleep(sleep_for)
         except asyncio.CancelledError:
             print("main loop cancelled")
         except Exception as e:
             print("Fatal exception in main_loop:", e)
         finally:
+            if catalogue_task and not catalogue_task.done():
+                catalogue_task.cancel()
+            await delivery.stop()
+            RATE_LIMITER.save()
+            try:
+                await shards.stop()
+            except Exception as e:
+                print("Shard release error:", e)
             await db.close()
 
 # Entry point
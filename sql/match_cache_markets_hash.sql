@@ -0,0 +1,4 @@
+-- sql/match_cache_markets_hash.sql
+-- Digest of the normalized markets (src/worker/changes.py). The ingest worker
+-- compares it instead of the full markets JSON and skips unchanged rows.
+alter table if exists public.match_cache add column if not exists markets_hash text;
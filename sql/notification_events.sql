@@ -0,0 +1,14 @@
+-- sql/notification_events.sql
+-- Estado de eventos ya notificados (src/worker/notify_state.py):
+-- leg_won por (notificación, leg) y odds_move por notificación (leg_id = 0).
+
+create table if not exists public.notification_events (
+  notification_id bigint not null,
+  leg_id bigint not null default 0,
+  event_type text not null,
+  state text not null,
+  last_value double precision,
+  fired_at timestamptz,
+  updated_at timestamptz not null default now(),
+  primary key (notification_id, leg_id, event_type)
+);
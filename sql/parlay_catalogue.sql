@@ -0,0 +1,14 @@
+-- sql/parlay_catalogue.sql
+-- Parlays pre-generados por el worker (src/parlay/catalogue.py)
+
+create table if not exists public.parlay_catalogue (
+  mode text not null,
+  target_total_odds numeric not null,
+  max_legs integer not null,
+  legs jsonb not null default '[]'::jsonb,
+  total_odds numeric,
+  joint_prob numeric,
+  joint_ev numeric,
+  generated_at timestamptz not null default now(),
+  primary key (mode, target_total_odds, max_legs)
+);
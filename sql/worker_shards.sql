@@ -0,0 +1,14 @@
+-- sql/worker_shards.sql
+-- Reparto de parlays entre workers de cron_notify.py (src/worker/sharding.py):
+-- un lease por shard (parlay_id % WORKER_SHARDS) y un heartbeat por worker.
+
+create table if not exists public.shard_leases (
+  shard_id integer primary key,
+  owner text,
+  expires_at timestamptz not null default now()
+);
+
+create table if not exists public.worker_heartbeats (
+  owner text primary key,
+  seen_at timestamptz not null default now()
+);
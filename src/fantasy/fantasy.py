@@ -17,6 +17,9 @@ from dotenv import load_dotenv
 from typing import List, Dict, Any
 import pulp
 
+from src.ingest.http_cache import CacheMiss, cached_get_json
+from src.utils.singleflight import coalesce
+
 load_dotenv()
 
 # Config / env
@@ -58,17 +61,19 @@ def fetch_api_sports_players(sport: str, league_id: str, date: str) -> pd.DataFr
     headers = {"x-apisports-key": API_SPORTS_KEY}
     # ejemplo: obtener jugadores en fixture -> usamos endpoints de lineups o players stats según deporte
     # Implementación simplificada: intenta lineups por fixture
-    resp = requests.get(f"{base}/fixtures?league={league_id}&date={date}", headers=headers, timeout=30)
-    resp.raise_for_status()
-    fixtures = resp.json().get("response", [])
+    # fixtures / lineups pasan por la caché HTTP (TTL por endpoint, revalidación con ETag)
+    fixtures = cached_get_json(f"{base}/fixtures", params={"league": league_id, "date": date},
+                               headers=headers, provider="apisports").get("response", [])
     rows = []
     for fx in fixtures:
         fixture_id = fx["fixture"]["id"]
         # lineups
-        r2 = requests.get(f"{base}/fixtures/lineups?fixture={fixture_id}", headers=headers, timeout=30)
-        if r2.status_code != 200: 
+        try:
+            lineups = cached_get_json(f"{base}/fixtures/lineups", params={"fixture": fixture_id},
+                                      headers=headers, provider="apisports")
+        except (requests.RequestException, CacheMiss):
             continue
-        for team_lineup in r2.json().get("response", []):
+        for team_lineup in lineups.get("response", []):
             team_name = team_lineup.get("team", {}).get("name")
             for p in team_lineup.get("startXI", []):
                 pid = str(p["player"]["id"])
@@ -92,9 +97,7 @@ def fetch_pandascore_players(kind: str, tournament_id: str) -> pd.DataFrame:
     base = "https://api.pandascore.co"
     headers = {}
     params = {"token": PANDASCORE_KEY}
-    resp = requests.get(f"{base}/{kind}/{tournament_id}/players", params=params, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
+    data = cached_get_json(f"{base}/{kind}/{tournament_id}/players", params=params, provider="pandascore")
     rows = []
     for p in data:
         rows.append({
@@ -106,9 +109,11 @@ def fetch_pandascore_players(kind: str, tournament_id: str) -> pd.DataFrame:
     return pd.DataFrame(rows)
 
 # Generic fetcher interface to be extended for each sport/platform
+@coalesce(clone=pd.DataFrame.copy)
 def fetch_players_for_market(sport: str, league_or_event_id: str, date: str) -> pd.DataFrame:
     """
     Detecta la fuente preferida por deporte y llama al fetcher adecuado.
+    Usuarios que piden el mismo mercado a la vez comparten la descarga (cada uno recibe su copia).
     """
     sport = sport.lower()
     if sport in ("football","soccer"):
@@ -2,13 +2,27 @@
 Cliente centralizado para API-Sports.
 Usa UNA sola key (API_SPORTS_KEY) y enruta requests según el deporte.
 Incluye reintentos, backoff exponencial básico, y manejo de errores comunes.
+
+El cliente es asíncrono (aiohttp, AsyncAPISportsClient): una sesión keep-alive
+con a lo sumo HOST_CONCURRENCY requests simultáneas por host, y
+gather_fixtures(specs) reparte una descarga de varios deportes/ligas en
+paralelo. get_for_sport / get_fixtures / get_teams siguen siendo síncronas:
+ejecutan la versión async en un event loop de fondo (un hilo daemon).
+Las respuestas pasan por la caché HTTP persistente (src/ingest/http_cache.py).
 """
 
 import os
-import time
+import copy
+import asyncio
 import logging
-from typing import Dict, Optional, Any
-import requests
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from src.ingest.http_cache import CacheMiss, HTTPCache, cache_key, shared_cache
+from src.utils.ratelimit import QuotaExhausted, QuotaLimiter, retry_after, shared_limiter
+from src.utils.singleflight import ASYNC_GROUP
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +46,10 @@ DEFAULT_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "30"))
 HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
 HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.7"))
 USER_AGENT = os.getenv("HTTP_USER_AGENT", "BotPicks/1.0")
+# requests in flight per api-sports host
+HOST_CONCURRENCY = int(os.getenv("API_SPORTS_HOST_CONCURRENCY", "4"))
+# provider name in the shared quota limiter (src/utils/ratelimit.py)
+PROVIDER = "apisports"
 
 class APIClientError(Exception):
     pass
@@ -41,35 +59,209 @@ def _build_headers() -> Dict[str, str]:
         "x-apisports-key": API_KEY,
         "User-Agent": USER_AGENT,
         "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
     }
 
-def _do_get(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    last_exc = None
-    for attempt in range(1, HTTP_RETRIES + 2):  # retries + first try
-        try:
-            resp = requests.get(url, headers=_build_headers(), params=params or {}, timeout=DEFAULT_TIMEOUT)
-            if resp.status_code == 429:
-                wait = HTTP_BACKOFF * (2 ** (attempt - 1))
+# built once, default headers of the client session
+HEADERS = _build_headers()
+
+def _sport_url(sport: str, path: str) -> str:
+    key = sport.lower()
+    if key not in SPORT_HOST:
+        raise ValueError(f"Sport '{sport}' sin host configurado en SPORT_HOST")
+    if not path.startswith("/"):
+        raise ValueError("path debe comenzar con '/'")
+    return f"https://{SPORT_HOST[key]}{path}"
+
+def _league_params(league: Optional[int], season: Optional[int], extra: Dict[str, Any]) -> Dict[str, Any]:
+    params: Dict[str, Any] = {}
+    if league is not None:
+        params["league"] = league
+    if season is not None:
+        params["season"] = season
+    params.update(extra)
+    return params
+
+class AsyncAPISportsClient:
+    """
+    async with AsyncAPISportsClient() as c:
+        data = await c.get_fixtures("football", league=39, season=2025)
+    """
+    def __init__(self, host_concurrency: int = HOST_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT,
+                 limiter: Optional[QuotaLimiter] = None, cache=None):
+        self.host_concurrency = max(1, host_concurrency)
+        self.timeout = timeout
+        # daily / per-minute API-Sports quota, read from the response headers
+        self.limiter = limiter if limiter is not None else shared_limiter()
+        # response cache (src/ingest/http_cache.py): None = shared cache, False = no cache
+        self.cache = cache
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._host_sems: Dict[str, asyncio.Semaphore] = {}
+        self.connections = 0
+        self.reused = 0
+        self.requests = 0
+
+    async def __aenter__(self) -> "AsyncAPISportsClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._on_new_connection)
+            trace.on_connection_reuseconn.append(self._on_reused_connection)
+            self._session = aiohttp.ClientSession(
+                headers=HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit_per_host=self.host_concurrency),
+                trace_configs=[trace],
+            )
+        return self._session
+
+    async def _on_new_connection(self, session, ctx, params) -> None:
+        self.connections += 1
+
+    async def _on_reused_connection(self, session, ctx, params) -> None:
+        self.reused += 1
+
+    def _host_sem(self, url: str) -> asyncio.Semaphore:
+        host = url.split("/", 3)[2]
+        sem = self._host_sems.get(host)
+        if sem is None:
+            sem = self._host_sems[host] = asyncio.Semaphore(self.host_concurrency)
+        return sem
+
+    def _cache(self) -> Optional[HTTPCache]:
+        if self.cache is False:
+            return None
+        return self.cache if self.cache is not None else shared_cache()
+
+    async def _fetch(self, url: str, params: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        """
+        One attempt: (status, decoded JSON or None, response headers).
+        Raises QuotaExhausted near the daily limit (get_url turns it into APIClientError).
+        """
+        await self.limiter.acquire(PROVIDER)
+        async with self._host_sem(url):
+            self.requests += 1
+            async with self._get_session().get(url, params=params, headers=headers) as resp:
+                self.limiter.update(PROVIDER, resp.headers)
+                if resp.status == 429:
+                    self.limiter.penalize(PROVIDER, retry_after(resp.headers))
+                if resp.status != 200:
+                    return resp.status, None, resp.headers
+                return resp.status, await resp.json(content_type=None), resp.headers
+
+    async def get_url(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        GET with cache and retries; identical calls in flight share one request (single-flight).
+        Every caller gets its own copy of the decoded JSON.
+        """
+        return await ASYNC_GROUP.do((PROVIDER, cache_key(url, params)), self._get_url, url, params, clone=copy.deepcopy)
+
+    async def _get_url(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        last_exc: Optional[BaseException] = None
+        # like requests: None values are dropped, anything that is not str/int/float is sent as str()
+        params = {
+            k: v if isinstance(v, (str, int, float)) and not isinstance(v, bool) else str(v)
+            for k, v in (params or {}).items() if v is not None
+        }
+        cache = self._cache()
+        entry = cache.lookup(url, params) if cache else None
+        if entry is not None and entry.fresh:
+            return entry.data
+        if cache is not None and cache.offline:
+            if entry is not None:
+                return entry.data
+            raise CacheMiss(url)
+        conditional = entry.conditional_headers() if entry is not None else None
+        for attempt in range(1, HTTP_RETRIES + 2):  # retries + first try
+            wait = HTTP_BACKOFF * (2 ** (attempt - 1))
+            try:
+                status, data, resp_headers = await self._fetch(url, params, conditional)
+            except QuotaExhausted as e:
+                # same error type as any other failed request for the callers
+                raise APIClientError(str(e)) from e
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                last_exc = e
+                logger.warning("Connection/Timeout for %s (attempt %d). Waiting %.2fs and retrying. Error: %s", url, attempt, wait, e)
+                await asyncio.sleep(wait)
+                continue
+            if status == 304 and entry is not None:
+                cache.renew(entry, url)
+                return entry.data
+            if status == 200:
+                if cache is not None:
+                    cache.store(url, params, data, resp_headers)
+                return data
+            if status == 429:
                 logger.warning("Rate limited (%s). Backing off %.2fs (attempt %d).", url, wait, attempt)
-                time.sleep(wait)
+                await asyncio.sleep(wait)
                 continue
-            resp.raise_for_status()
-            return resp.json()
-        except requests.exceptions.HTTPError as e:
-            last_exc = e
-            status = getattr(e.response, "status_code", None)
-            if status and 400 <= status < 500 and status != 429:
-                logger.error("HTTP error %s for %s: %s", status, url, e)
-                raise APIClientError(f"Request failed {status}: {e}") from e
-            wait = HTTP_BACKOFF * (2 ** (attempt - 1))
-            logger.warning("HTTP error for %s (attempt %d). Waiting %.2fs and retrying. Error: %s", url, attempt, wait, e)
-            time.sleep(wait)
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-            last_exc = e
-            wait = HTTP_BACKOFF * (2 ** (attempt - 1))
-            logger.warning("Connection/Timeout for %s (attempt %d). Waiting %.2fs and retrying. Error: %s", url, attempt, wait, e)
-            time.sleep(wait)
-    raise APIClientError(f"Failed to GET {url} after {HTTP_RETRIES+1} attempts") from last_exc
+            last_exc = APIClientError(f"Request failed {status}")
+            if 400 <= status < 500:
+                logger.error("HTTP error %s for %s", status, url)
+                raise last_exc
+            logger.warning("HTTP error %s for %s (attempt %d). Waiting %.2fs and retrying.", status, url, attempt, wait)
+            await asyncio.sleep(wait)
+        raise APIClientError(f"Failed to GET {url} after {HTTP_RETRIES+1} attempts") from last_exc
+
+    async def get_for_sport(self, sport: str, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self.get_url(_sport_url(sport, path), params)
+
+    async def get_fixtures(self, sport: str, league: Optional[int] = None, season: Optional[int] = None, **extra) -> Dict[str, Any]:
+        return await self.get_for_sport(sport, "/fixtures", _league_params(league, season, extra))
+
+    async def get_teams(self, sport: str, league: Optional[int] = None, season: Optional[int] = None, **extra) -> Dict[str, Any]:
+        return await self.get_for_sport(sport, "/teams", _league_params(league, season, extra))
+
+    async def gather_fixtures(self, specs: Iterable[Dict[str, Any]], return_exceptions: bool = True) -> List[Any]:
+        """
+        specs: [{"sport": "football", "league": 39, "season": 2025, ...extra params}, ...]
+        Returns the responses in the order of specs; a failed spec gives its exception
+        (unless return_exceptions=False). Concurrency is bounded per host.
+        """
+        coros = []
+        for spec in specs:
+            spec = dict(spec)
+            sport = spec.pop("sport")
+            coros.append(self.get_fixtures(sport, spec.pop("league", None), spec.pop("season", None), **spec))
+        return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "connections": self.connections, "reused": self.reused}
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+async def gather_fixtures(specs: Iterable[Dict[str, Any]], return_exceptions: bool = True) -> List[Any]:
+    async with AsyncAPISportsClient() as c:
+        return await c.gather_fixtures(specs, return_exceptions=return_exceptions)
+
+# --- sync API: thin wrappers over the async client on a background loop --------
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_SYNC_CLIENT: Optional[AsyncAPISportsClient] = None
+_LOOP_LOCK = threading.Lock()
+
+def _background_client() -> AsyncAPISportsClient:
+    global _LOOP, _SYNC_CLIENT
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="api-sports-loop", daemon=True).start()
+            _SYNC_CLIENT = AsyncAPISportsClient()
+    return _SYNC_CLIENT
+
+def _run(make_coro):
+    client = _background_client()
+    return asyncio.run_coroutine_threadsafe(make_coro(client), _LOOP).result()
+
+def _do_get(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return _run(lambda c: c.get_url(url, params))
 
 def get_for_sport(sport: str, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
@@ -86,32 +278,23 @@ def get_for_sport(sport: str, path: str, params: Optional[Dict[str, Any]] = None
         ValueError: si sport no está mapeado.
         APIClientError: fallo persistente en la request.
     """
-    key = sport.lower()
-    if key not in SPORT_HOST:
-        raise ValueError(f"Sport '{sport}' sin host configurado en SPORT_HOST")
-    host = SPORT_HOST[key]
-    if not path.startswith("/"):
-        raise ValueError("path debe comenzar con '/'")
-    url = f"https://{host}{path}"
+    url = _sport_url(sport, path)
     return _do_get(url, params=params)
 
 def get_fixtures(sport: str, league: Optional[int] = None, season: Optional[int] = None, **extra) -> Dict[str, Any]:
-    params = {}
-    if league is not None:
-        params["league"] = league
-    if season is not None:
-        params["season"] = season
-    params.update(extra)
-    return get_for_sport(sport, "/fixtures", params=params)
+    return get_for_sport(sport, "/fixtures", params=_league_params(league, season, extra))
 
 def get_teams(sport: str, league: Optional[int] = None, season: Optional[int] = None, **extra) -> Dict[str, Any]:
-    params = {}
-    if league is not None:
-        params["league"] = league
-    if season is not None:
-        params["season"] = season
-    params.update(extra)
-    return get_for_sport(sport, "/teams", params=params)
+    return get_for_sport(sport, "/teams", params=_league_params(league, season, extra))
+
+def get_fixtures_many(specs: Iterable[Dict[str, Any]], return_exceptions: bool = True) -> List[Any]:
+    """Sync form of gather_fixtures (same client and per-host limits as get_fixtures)."""
+    specs = list(specs)
+    return _run(lambda c: c.gather_fixtures(specs, return_exceptions=return_exceptions))
+
+def connection_stats() -> Dict[str, int]:
+    """Requests sent vs connections opened/reused by the sync wrappers' client."""
+    return _SYNC_CLIENT.stats() if _SYNC_CLIENT else {"requests": 0, "connections": 0, "reused": 0}
 
 if __name__ == "__main__":
     import json
@@ -8,16 +8,19 @@ import logging
 from typing import Dict, Any, Optional
 
 from src.ingest import api_sports_client  # nuevo módulo
-import requests
+from src.ingest.http_cache import cached_get_json
+from src.utils.singleflight import coalesce
 
 logger = logging.getLogger(__name__)
 
 PANDASCORE_KEY = os.getenv("PANDASCORE_KEY")
 
+@coalesce()
 def get_sport_fixtures(sport: str, league: Optional[int] = None, season: Optional[int] = None, **kwargs) -> Dict[str, Any]:
     """
     Obtiene fixtures para un deporte. Intenta API-Sports primero; si
     no está disponible o da error, intenta un fallback (si existe).
+    Llamadas concurrentes con los mismos argumentos comparten una sola descarga.
     """
     try:
         return api_sports_client.get_fixtures(sport, league=league, season=season, **kwargs)
@@ -39,9 +42,8 @@ def _fallback_get_fixtures(sport: str, **kwargs) -> Dict[str, Any]:
             raise RuntimeError("PANDASCORE_KEY no configurado para fallback de esports")
         headers = {"Authorization": f"Bearer {PANDASCORE_KEY}"}
         url = "https://api.pandascore.co/matches"
-        resp = requests.get(url, headers=headers, params=kwargs, timeout=int(os.getenv("HTTP_TIMEOUT", "30")))
-        resp.raise_for_status()
-        return resp.json()
+        return cached_get_json(url, params=kwargs, headers=headers, provider="pandascore",
+                               timeout=int(os.getenv("HTTP_TIMEOUT", "30")))
     raise RuntimeError(f"No hay fallback configurado para deporte: {sport}")
 
 def get_teams(sport: str, league: Optional[int] = None, season: Optional[int] = None, **kwargs) -> Dict[str, Any]:
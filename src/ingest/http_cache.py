@@ -0,0 +1,225 @@
+"""
+Caché HTTP persistente (SQLite, HTTP_CACHE_PATH) para las descargas de proveedores.
+- TTL por endpoint (ENDPOINT_TTLS); lo vencido se revalida con ETag / Last-Modified
+- desalojo LRU por encima de HTTP_CACHE_MAX_BYTES
+- HTTP_CACHE_OFFLINE=1 reproduce la caché sin red; HTTP_CACHE_PATH="" la desactiva
+cached_get_json() es la entrada síncrona; el cliente async de API-Sports usa
+lookup()/store()/renew().
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from src.ingest.http_pool import session_for
+from src.utils.ratelimit import retry_after, shared_limiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", "http_cache.sqlite")
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+HTTP_CACHE_DEFAULT_TTL = float(os.getenv("HTTP_CACHE_DEFAULT_TTL", "300"))
+# path suffix -> seconds
+ENDPOINT_TTLS: Dict[str, float] = json.loads(os.getenv("HTTP_CACHE_TTLS", json.dumps({
+    "/teams": 7 * 86400,
+    "/leagues": 86400,
+    "/players": 86400,
+    "/fixtures/lineups": 1800,
+    "/fixtures": 600,
+    "/matches": 600,
+    "/odds": 60,
+})))
+# query params that identify the caller, not the resource
+_AUTH_PARAMS = {"token", "apikey", "api_key", "key"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+  key TEXT PRIMARY KEY,
+  url TEXT NOT NULL,
+  body BLOB NOT NULL,
+  etag TEXT,
+  last_modified TEXT,
+  stored_at REAL NOT NULL,
+  expires_at REAL NOT NULL,
+  accessed_at REAL NOT NULL,
+  size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+"""
+
+class CacheMiss(Exception):
+    """Offline mode and the request is not cached."""
+
+@dataclass
+class CachedResponse:
+    key: str
+    data: Any
+    etag: Optional[str]
+    last_modified: Optional[str]
+    expires_at: float
+    fresh: bool
+
+    def conditional_headers(self) -> Dict[str, str]:
+        h = {}
+        if self.etag:
+            h["If-None-Match"] = self.etag
+        if self.last_modified:
+            h["If-Modified-Since"] = self.last_modified
+        return h
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    parts = urlsplit(url)
+    query = [(k, str(v)) for k, v in (params or {}).items() if v is not None and k.lower() not in _AUTH_PARAMS]
+    if parts.query:
+        for pair in parts.query.split("&"):
+            k, _, v = pair.partition("=")
+            if k.lower() not in _AUTH_PARAMS:
+                query.append((k, v))
+    canonical = json.dumps([parts.netloc.lower(), parts.path, sorted(query)], separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+def endpoint_ttl(url: str) -> float:
+    path = urlsplit(url).path.rstrip("/")
+    best = None
+    for suffix, ttl in ENDPOINT_TTLS.items():
+        if path.endswith(suffix) and (best is None or len(suffix) > len(best[0])):
+            best = (suffix, ttl)
+    return float(best[1]) if best else HTTP_CACHE_DEFAULT_TTL
+
+class HTTPCache:
+    def __init__(self, path: str, max_bytes: int = HTTP_CACHE_MAX_BYTES, offline: Optional[bool] = None, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.offline = os.getenv("HTTP_CACHE_OFFLINE", "0") == "1" if offline is None else offline
+        self.clock = clock
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evicted = 0
+
+    def lookup(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[CachedResponse]:
+        key = cache_key(url, params)
+        now = self.clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        body, etag, last_modified, expires_at = row
+        fresh = expires_at > now
+        if fresh:
+            self.hits += 1
+        return CachedResponse(key, json.loads(zlib.decompress(body)), etag, last_modified, expires_at, fresh)
+
+    def store(self, url: str, params: Optional[Dict[str, Any]], data: Any, headers=None, ttl: Optional[float] = None) -> None:
+        headers = {str(k).lower(): v for k, v in (headers or {}).items()}
+        body = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+        now = self.clock()
+        expires = now + (endpoint_ttl(url) if ttl is None else ttl)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, body, etag, last_modified, stored_at, expires_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(url, params), url, body, headers.get("etag"), headers.get("last-modified"), now, expires, now, len(body)),
+            )
+            self._evict()
+
+    def renew(self, entry: CachedResponse, url: str, ttl: Optional[float] = None) -> None:
+        """304 Not Modified: the cached body is valid for another TTL."""
+        now = self.clock()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?",
+                (now + (endpoint_ttl(url) if ttl is None else ttl), now, entry.key),
+            )
+        self.revalidated += 1
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.evicted += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses,
+                "revalidated": self.revalidated, "evicted": self.evicted, "offline": self.offline}
+
+    def close(self) -> None:
+        self._conn.close()
+
+_CACHES: Dict[str, HTTPCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+def shared_cache() -> Optional[HTTPCache]:
+    """Cache at HTTP_CACHE_PATH (read on every call); None when it is set to ""."""
+    path = os.getenv("HTTP_CACHE_PATH", DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+    with _CACHES_LOCK:
+        cache = _CACHES.get(path)
+        if cache is None:
+            cache = _CACHES[path] = HTTPCache(path)
+    return cache
+
+def cached_get_json(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+                    ttl: Optional[float] = None, timeout: float = 30, provider: Optional[str] = None,
+                    cache: Optional[HTTPCache] = None, session: Optional[requests.Session] = None) -> Any:
+    """
+    GET url and decode JSON through the cache. provider: name in the shared quota
+    limiter (src/utils/ratelimit.py), applied only when the request goes to the network.
+    Raises requests.HTTPError for non-2xx answers (nothing is cached then).
+    """
+    cache = cache if cache is not None else shared_cache()
+    entry = cache.lookup(url, params) if cache else None
+    if entry is not None and entry.fresh:
+        return entry.data
+    if cache is not None and cache.offline:
+        if entry is not None:
+            return entry.data
+        raise CacheMiss(url)
+    req_headers = dict(headers or {})
+    if entry is not None:
+        req_headers.update(entry.conditional_headers())
+    limiter = None
+    if provider:
+        limiter = shared_limiter()
+        limiter.acquire_sync(provider)
+    sess = session or session_for(urlsplit(url).netloc)
+    resp = sess.get(url, params=params, headers=req_headers, timeout=timeout)
+    if limiter is not None:
+        limiter.update(provider, resp.headers)
+        if resp.status_code == 429:
+            limiter.penalize(provider, retry_after(resp.headers))
+    if resp.status_code == 304 and entry is not None:
+        cache.renew(entry, url, ttl)
+        return entry.data
+    resp.raise_for_status()
+    data = resp.json()
+    if cache is not None:
+        cache.store(url, params, data, resp.headers, ttl)
+    return data
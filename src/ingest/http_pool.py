@@ -0,0 +1,86 @@
+"""
+Sesiones HTTP reutilizables (keep-alive) por host.
+Una requests.Session por host con un pool de HTTP_POOL_MAXSIZE conexiones, usada por
+http_cache.cached_get_json (PandaScore, fantasy); el cliente de API-Sports tiene su
+propia sesión aiohttp. stats() cuenta conexiones abiertas vs requests enviadas.
+"""
+
+import os
+import threading
+import logging
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+DEFAULT_HEADERS = {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+
+class HostSessions:
+    def __init__(self, pool_connections: int = HTTP_POOL_CONNECTIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+        """Session for `host`; headers are applied only when the session is created."""
+        s = self._sessions.get(host)
+        if s is not None:
+            return s
+        with self._lock:
+            s = self._sessions.get(host)
+            if s is None:
+                s = requests.Session()
+                # retries are handled by the callers (backoff on 429 / 5xx)
+                adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize, max_retries=0)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers.update(DEFAULT_HEADERS)
+                s.headers.update(headers or {})
+                self._sessions[host] = s
+                logger.debug("New pooled session for %s", host)
+        return s
+
+    def stats(self) -> Dict[str, Any]:
+        per_host: Dict[str, Dict[str, int]] = {}
+        for host, s in list(self._sessions.items()):
+            conns = reqs = 0
+            for adapter in set(s.adapters.values()):
+                for key in list(adapter.poolmanager.pools.keys()):
+                    pool = adapter.poolmanager.pools.get(key)
+                    if pool is None:
+                        continue
+                    conns += pool.num_connections
+                    reqs += pool.num_requests
+            per_host[host] = {"connections": conns, "requests": reqs}
+        connections = sum(h["connections"] for h in per_host.values())
+        total = sum(h["requests"] for h in per_host.values())
+        return {
+            "hosts": per_host,
+            "connections": connections,
+            "requests": total,
+            "reused": max(0, total - connections),
+            "reuse_ratio": (total - connections) / total if total else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for s in self._sessions.values():
+                s.close()
+            self._sessions.clear()
+
+# module-level pool shared by the ingest clients
+POOL = HostSessions()
+
+def session_for(host: str, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    return POOL.get(host, headers)
+
+def pool_stats() -> Dict[str, Any]:
+    return POOL.stats()
+
+def close_all() -> None:
+    POOL.close()
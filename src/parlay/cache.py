@@ -0,0 +1,103 @@
+# src/parlay/cache.py
+"""
+Caché en proceso de las CandidateTable decodificadas para generar parlays.
+- una tabla compartida (solo lectura) por (filtro de deportes, ventana de horas)
+- expira a los CANDIDATE_CACHE_TTL s; como máximo CANDIDATE_CACHE_MAX claves (LRU)
+- los misses concurrentes de una misma clave esperan una sola carga
+- la ingesta la invalida tras el upsert (invalidate() o NOTIFY en MATCH_CACHE_CHANNEL)
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+CANDIDATE_CACHE_TTL = float(os.getenv("CANDIDATE_CACHE_TTL", "60"))
+CANDIDATE_CACHE_MAX = int(os.getenv("CANDIDATE_CACHE_MAX", "16"))
+MATCH_CACHE_CHANNEL = "match_cache_updated"
+
+CacheKey = Tuple[Optional[Tuple[str, ...]], int]
+
+def make_key(included_sports: Optional[Iterable[str]] = None, window_hours: int = 24) -> CacheKey:
+    sports = tuple(sorted({s.lower() for s in included_sports})) if included_sports else None
+    return (sports, int(window_hours))
+
+def _freeze(table: Any) -> Any:
+    # shared between requests: make the numpy columns read-only
+    for name in ("match_idx", "market_id", "selection_id", "odds", "p_hat", "ev"):
+        col = getattr(table, name, None)
+        if col is not None and hasattr(col, "flags"):
+            col.flags.writeable = False
+    return table
+
+class CandidateCache:
+    def __init__(self, loader: Callable[..., Awaitable[Any]], ttl: float = CANDIDATE_CACHE_TTL, max_size: int = CANDIDATE_CACHE_MAX):
+        """
+        loader(conn, included_sports, window_hours) -> CandidateTable
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, conn, included_sports: Optional[Iterable[str]] = None, window_hours: int = 24) -> Any:
+        key = make_key(included_sports, window_hours)
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        pending = self._inflight.get(key)
+        if pending is not None:
+            # another request is already loading this key: share its result
+            self.hits += 1
+            return await asyncio.shield(pending)
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        generation = self._generation
+        try:
+            table = _freeze(await self.loader(conn, list(key[0]) if key[0] else None, key[1]))
+        except BaseException as e:
+            fut.set_exception(e)
+            # mark retrieved so an unawaited failure does not log a warning
+            fut.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        # an invalidation during the load means the snapshot may already be stale
+        if generation == self._generation:
+            self._entries[key] = (time.monotonic() + self.ttl, table)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        fut.set_result(table)
+        return table
+
+    def invalidate(self, *_args) -> None:
+        """Drop every snapshot. Signature also fits asyncpg listener callbacks."""
+        self._entries.clear()
+        self._generation += 1
+        self.invalidations += 1
+
+    async def listen(self, conn) -> None:
+        """Subscribe a dedicated asyncpg connection to match_cache change notifications."""
+        await conn.add_listener(MATCH_CACHE_CHANNEL, self.invalidate)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+        }
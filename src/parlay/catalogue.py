@@ -0,0 +1,132 @@
+# src/parlay/catalogue.py
+"""
+Catálogo de parlays pre-generados.
+Tras cada ingesta el cron precalcula Segurito/Soñador para los objetivos de cuota
+habituales y los guarda aquí y en la tabla `parlay_catalogue`, con clave
+(mode, target_total_odds, max_legs). Entradas con más de CATALOGUE_MAX_AGE s se ignoran.
+"""
+
+import os
+import json
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+CATALOGUE_SEGURITO_TARGETS = [float(x) for x in os.getenv("CATALOGUE_SEGURITO_TARGETS", "1.5,1.8,2.0").split(",") if x.strip()]
+CATALOGUE_SONADOR_TARGETS = [float(x) for x in os.getenv("CATALOGUE_SONADOR_TARGETS", "10.0").split(",") if x.strip()]
+CATALOGUE_MAX_AGE = float(os.getenv("CATALOGUE_MAX_AGE", "900"))
+# how long a row read from the DB is reused in-process before re-reading it
+CATALOGUE_LOCAL_TTL = float(os.getenv("CATALOGUE_LOCAL_TTL", "30"))
+
+CatalogueKey = Tuple[str, float, int]
+
+def catalogue_key(mode: str, target_total_odds: float, max_legs: int) -> CatalogueKey:
+    return (mode, round(float(target_total_odds), 2), int(max_legs))
+
+def _decode(raw):
+    if isinstance(raw, (str, bytes)):
+        return json.loads(raw)
+    return raw
+
+class ParlayCatalogue:
+    def __init__(self, max_age: float = CATALOGUE_MAX_AGE, local_ttl: float = CATALOGUE_LOCAL_TTL):
+        self.max_age = max_age
+        self.local_ttl = local_ttl
+        # key -> (local expiry (monotonic), entry)
+        self._entries: Dict[CatalogueKey, Tuple[float, Dict[str, Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, entry: Dict[str, Any]) -> bool:
+        generated_at = entry.get("generated_at")
+        if not generated_at:
+            return False
+        return (datetime.now(timezone.utc) - generated_at).total_seconds() <= self.max_age
+
+    def put(self, entries: List[Dict[str, Any]], local_ttl: Optional[float] = None) -> None:
+        """Store entries in memory. Entries built in this process stay until replaced or stale."""
+        expires = time.monotonic() + (local_ttl if local_ttl is not None else self.max_age)
+        for e in entries:
+            self._entries[catalogue_key(e["mode"], e["target_total_odds"], e["max_legs"])] = (expires, e)
+
+    def get_local(self, mode: str, target_total_odds: float, max_legs: int) -> Optional[Dict[str, Any]]:
+        item = self._entries.get(catalogue_key(mode, target_total_odds, max_legs))
+        if item and item[0] > time.monotonic() and self._fresh(item[1]):
+            return item[1]
+        return None
+
+    async def lookup(self, conn, mode: str, target_total_odds: float, max_legs: int) -> Optional[Dict[str, Any]]:
+        """Fresh entry from memory, else from the parlay_catalogue table; None means run a live search."""
+        entry = self.get_local(mode, target_total_odds, max_legs)
+        if entry is None and conn is not None:
+            try:
+                row = await conn.fetchrow(
+                    "SELECT mode, target_total_odds, max_legs, legs, total_odds, joint_prob, joint_ev, generated_at FROM parlay_catalogue WHERE mode=$1 AND target_total_odds=$2 AND max_legs=$3",
+                    mode, catalogue_key(mode, target_total_odds, max_legs)[1], int(max_legs)
+                )
+            except Exception as e:
+                print("parlay_catalogue lookup error:", e)
+                row = None
+            if row:
+                entry = {
+                    "mode": row["mode"],
+                    "target_total_odds": float(row["target_total_odds"]),
+                    "max_legs": int(row["max_legs"]),
+                    "legs": _decode(row["legs"]) or [],
+                    "total_odds": float(row["total_odds"] or 0.0),
+                    "joint_prob": float(row["joint_prob"] or 0.0),
+                    "joint_ev": float(row["joint_ev"] or 0.0),
+                    "generated_at": row["generated_at"],
+                }
+                if self._fresh(entry):
+                    self.put([entry], local_ttl=self.local_ttl)
+                else:
+                    entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def save(self, conn, entries: List[Dict[str, Any]]) -> None:
+        """Publish entries in memory and upsert them into parlay_catalogue in one executemany."""
+        self.put(entries)
+        if conn is None or not entries:
+            return
+        records = [
+            (e["mode"], catalogue_key(e["mode"], e["target_total_odds"], e["max_legs"])[1], int(e["max_legs"]),
+             json.dumps(e["legs"]), e["total_odds"], e["joint_prob"], e["joint_ev"], e["generated_at"])
+            for e in entries
+        ]
+        async with conn.transaction():
+            await conn.executemany(
+                """
+                INSERT INTO parlay_catalogue (mode, target_total_odds, max_legs, legs, total_odds, joint_prob, joint_ev, generated_at)
+                VALUES ($1,$2,$3,$4,$5,$6,$7,$8)
+                ON CONFLICT (mode, target_total_odds, max_legs) DO UPDATE
+                  SET legs = EXCLUDED.legs, total_odds = EXCLUDED.total_odds, joint_prob = EXCLUDED.joint_prob,
+                      joint_ev = EXCLUDED.joint_ev, generated_at = EXCLUDED.generated_at
+                """,
+                records
+            )
+
+    async def load_targets(self, conn) -> Tuple[List[float], List[float]]:
+        """Segurito and Soñador targets: defaults plus parlay_seg_target/parlay_so_target from config."""
+        seg = list(CATALOGUE_SEGURITO_TARGETS)
+        so = list(CATALOGUE_SONADOR_TARGETS)
+        if conn is not None:
+            try:
+                rows = await conn.fetch("SELECT key, value FROM config WHERE key = ANY($1::text[])", ["parlay_seg_target", "parlay_so_target"])
+            except Exception as e:
+                print("config targets read error:", e)
+                rows = []
+            for r in rows:
+                try:
+                    value = float(r["value"])
+                except (TypeError, ValueError):
+                    continue
+                (seg if r["key"] == "parlay_seg_target" else so).append(value)
+        return sorted({round(t, 2) for t in seg}), sorted({round(t, 2) for t in so})
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
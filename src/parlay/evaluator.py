@@ -1,6 +1,10 @@
 # src/parlay/evaluator.py
-from typing import Dict, Any, Optional
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import json
 import re
+import numpy as np
 
 """
 Evaluador de resultados de una 'leg'.
@@ -17,33 +21,60 @@ Entrada match_final (desde match_cache):
   "away": "Team B",
   "home_score": 2,
   "away_score": 1,
-  "maps": [{"home_score":2,"away_score":1},...],  // para esports/bo3 etc.
+  "maps": [{"home_score":13,"away_score":9,"status":"finished","winner":"home"},...],  // esports BO3/BO5, en orden
   "winner": "home"|"away"|"draw",  // si disponible
   "final_result": {...} optional provider-specific
 }
-Retorna: True (ganado), False (perdido), None (no decidido / no soportado)
+Mercados de mapas (esports): "Map 1 Winner", "Map Handicap" (Team A -1.5), "Total Maps"
+(Over 2.5) y "Correct Map Score" (2-1). El marcador de la serie sale de "maps"; sin
+"maps" se usa home_score/away_score como mapas ganados (PandaScore). El ganador de un
+mapa se liquida en cuanto ese mapa termina, aunque la serie siga en juego.
+settle_leg retorna un código RESULT_* (win, half-win, push, half-loss, loss, void, unknown);
+las líneas asiáticas de cuarto (2.25, -0.75, "0,-0.5") se liquidan mitad y mitad.
+evaluate_leg retorna: True (ganado / medio ganado), False (perdido / medio perdido),
+None (push, void, no decidido / no soportado)
 """
 
+# Patrones precompilados (se evalúan en cada ciclo del notificador)
+_WS_RE = re.compile(r'\s+')
+# lines: "2.5", "2.25", or split Asian lines "2, 2.5" / "-0.5/-1"
+_NUM = r'[0-9]+(?:\.[0-9]+)?'
+_OVER_RE = re.compile(r'(over|o)\s*(' + _NUM + r')(?:\s*[,/]\s*(' + _NUM + r'))?')
+_UNDER_RE = re.compile(r'(under|u)\s*(' + _NUM + r')(?:\s*[,/]\s*(' + _NUM + r'))?')
+_HANDICAP_RE = re.compile(r'([^\d\-\+]+)?\s*([+-]?' + _NUM + r')(?:\s*[,/]\s*([+-]?' + _NUM + r'))?\s*$')
+_MAP_NO_RE = re.compile(r'map\s*#?\s*(\d+)')
+_CORRECT_SCORE_RE = re.compile(r'(\d+)\s*[:\-]\s*(\d+)')
+_TEAM_TOTAL_RE = re.compile(r'(home|away|team\s*[a-z0-9]+|[a-z ]+)\s+(over|under)\s*(' + _NUM + r')')
+
+PARSE_CACHE_SIZE = 65536
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def normalize_text(s: str) -> str:
     if not s:
         return ""
-    return re.sub(r'\s+', ' ', s.strip().lower())
+    return _WS_RE.sub(' ', s.strip().lower())
+
+def _line(m, first: int) -> float:
+    # split Asian line "2, 2.5" is the same bet as the quarter line 2.25
+    if m.group(first + 1) is not None:
+        return (float(m.group(first)) + float(m.group(first + 1))) / 2.0
+    return float(m.group(first))
 
 def parse_over_under(selection: str) -> Optional[Dict[str, Any]]:
-    # selection examples: "Over 2.5", "Under 3", "o2.5", "u3"
+    # selection examples: "Over 2.5", "Under 3", "o2.5", "u3", "Over 2.25", "Over 2, 2.5"
     s = normalize_text(selection)
-    m = re.search(r'(over|o)\s*([0-9]+(?:\.[05])?)', s)
+    m = _OVER_RE.search(s)
     if m:
-        return {"type":"over_under", "side":"over", "line":float(m.group(2))}
-    m = re.search(r'(under|u)\s*([0-9]+(?:\.[05])?)', s)
+        return {"type":"over_under", "side":"over", "line":_line(m, 2)}
+    m = _UNDER_RE.search(s)
     if m:
-        return {"type":"over_under", "side":"under", "line":float(m.group(2))}
+        return {"type":"over_under", "side":"under", "line":_line(m, 2)}
     return None
 
 def parse_handicap(selection: str) -> Optional[Dict[str, Any]]:
     # "Home -1" , "-1 Away", "TeamA -0.5"
     s = normalize_text(selection)
-    m = re.search(r'([^\d\-\+]+)?\s*([+-]?[0-9]+(?:\.[05])?)\s*$', selection)
+    m = _HANDICAP_RE.search(selection)
     if m:
         # try detect side by presence of team name vs sign
         # fallback: if selection contains home/away words
@@ -52,13 +83,13 @@ def parse_handicap(selection: str) -> Optional[Dict[str, Any]]:
             side = 'home'
         elif 'away' in s:
             side = 'away'
-        return {"type":"handicap", "line":float(m.group(2)), "side":side}
+        return {"type":"handicap", "line":_line(m, 2), "side":side}
     return None
 
 def parse_correct_score(selection: str) -> Optional[Dict[str, Any]]:
     # formats: "2-1", "1 : 0", "3:2"
     s = normalize_text(selection)
-    m = re.search(r'(\d+)\s*[:\-]\s*(\d+)', s)
+    m = _CORRECT_SCORE_RE.search(s)
     if m:
         return {"type":"correct_score", "home":int(m.group(1)), "away":int(m.group(2))}
     return None
@@ -71,80 +102,286 @@ def parse_btts(selection: str) -> Optional[Dict[str, Any]]:
         return {"type":"btts","side":"no"}
     return None
 
-def parse_moneyline(selection: str, match_final: Dict[str,Any]) -> Optional[Dict[str,Any]]:
+def _parse_moneyline_names(selection: str, home_name: Optional[str], away_name: Optional[str]) -> Optional[Dict[str,Any]]:
     s = normalize_text(selection)
     # Accept "home", "away", "draw", team names
     if s in ('home','away','draw'):
         return {"type":"moneyline", "side":s}
     # try match team names
-    home = normalize_text(match_final.get("home","") or "")
-    away = normalize_text(match_final.get("away","") or "")
-    if s == home or s == normalize_text(match_final.get("home","")):
+    if s == normalize_text(home_name or ""):
         return {"type":"moneyline","side":"home"}
-    if s == away:
+    if s == normalize_text(away_name or ""):
         return {"type":"moneyline","side":"away"}
     return None
 
+def _team_side(label: str, home_name: Optional[str], away_name: Optional[str]) -> Optional[str]:
+    label = normalize_text(label)
+    if not label:
+        return None
+    if label == normalize_text(home_name or ""):
+        return "home"
+    if label == normalize_text(away_name or ""):
+        return "away"
+    return None
+
+def parse_moneyline(selection: str, match_final: Dict[str,Any]) -> Optional[Dict[str,Any]]:
+    return _parse_moneyline_names(selection, match_final.get("home"), match_final.get("away"))
+
 def parse_total_team(selection: str) -> Optional[Dict[str,Any]]:
     # Team total like "TeamA Over 1.5" or "Home Over 1.5"
     s = normalize_text(selection)
-    m = re.search(r'(home|away|team\s*[a-z0-9]+|[a-z ]+)\s+(over|under)\s*([0-9]+(?:\.[05])?)', s)
+    m = _TEAM_TOTAL_RE.search(s)
     if m:
         return {"type":"team_total", "side":m.group(2), "line":float(m.group(3)), "team":m.group(1)}
     return None
 
 def parse_map_total(selection: str) -> Optional[Dict[str,Any]]:
-    # For esports map totals, e.g. "Over 2.5 maps" or "Map winner Home"
-    return None  # placeholder, expand if specific samples provided
+    # For esports map totals, e.g. "Over 2.5 maps"
+    if 'map' not in normalize_text(selection):
+        return None
+    res = parse_over_under(selection)
+    if res:
+        res["type"] = "total_maps"
+    return res
 
-# Generic parser tries several market parsers
-def parse_selection(market: str, selection: str, match_final: Dict[str,Any]) -> Optional[Dict[str,Any]]:
+def parse_map_market(market_norm: str, selection: str, home_name: Optional[str], away_name: Optional[str]) -> Optional[Dict[str,Any]]:
+    """Esports series/map markets: map N winner, map handicap, total maps, correct map score."""
+    if 'map' not in market_norm:
+        return parse_map_total(selection)
+    if 'correct' in market_norm or 'score' in market_norm:
+        res = parse_correct_score(selection)
+        if res:
+            res["type"] = "correct_map_score"
+        return res
+    if 'handicap' in market_norm or 'spread' in market_norm:
+        res = parse_handicap(selection)
+        if res:
+            if res["side"] is None:
+                res["side"] = _team_side(_HANDICAP_RE.search(selection).group(1) or "", home_name, away_name)
+            res["type"] = "map_handicap"
+        return res
+    if 'total' in market_norm or 'over' in market_norm or 'under' in market_norm:
+        res = parse_over_under(selection)
+        if res:
+            res["type"] = "total_maps"
+        return res
+    m = _MAP_NO_RE.search(market_norm)
+    if m:
+        res = _parse_moneyline_names(selection, home_name, away_name)
+        if res and res["side"] in ("home", "away"):
+            return {"type":"map_winner", "map":int(m.group(1)), "side":res["side"]}
+    return None
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_leg_cached(market: str, selection: str, home: str, away: str) -> Optional[Tuple[Tuple[str, Any], ...]]:
     market_norm = normalize_text(market)
-    sel_norm = normalize_text(selection)
+    # Esports maps (before Over/Under: "Total Maps" is a series market)
+    res = parse_map_market(market_norm, selection, home, away)
+    if res:
+        return tuple(res.items())
     # Over/Under markets
     if 'over' in market_norm or 'under' in market_norm or 'total' in market_norm:
         res = parse_over_under(selection)
         if res:
-            return res
+            return tuple(res.items())
     # Both Teams To Score
     if 'both' in market_norm and 'score' in market_norm:
         res = parse_btts(selection)
         if res:
-            return res
+            return tuple(res.items())
     # Correct score
     if 'correct' in market_norm or 'score' in market_norm and '-' in selection:
         res = parse_correct_score(selection)
         if res:
-            return res
+            return tuple(res.items())
+    # Draw no bet: a handicap 0 (stake returned on a draw)
+    if 'draw no bet' in market_norm or market_norm == 'dnb':
+        res = _parse_moneyline_names(selection, home, away)
+        if res and res["side"] in ("home", "away"):
+            return tuple({"type":"handicap", "line":0.0, "side":res["side"]}.items())
     # Handicap / spread
     if 'handicap' in market_norm or 'spread' in market_norm or ('-' in selection and any(ch.isdigit() for ch in selection)):
         res = parse_handicap(selection)
         if res:
-            return res
+            if res["side"] is None:
+                # "Team A -1": resolve the side from the team names instead of assuming home
+                label = (_HANDICAP_RE.search(selection).group(1) or "")
+                res["side"] = _team_side(label, home, away)
+            return tuple(res.items())
     # Moneyline / match winner
     if any(k in market_norm for k in ['moneyline','winner','match winner','ml','1x2']):
-        res = parse_moneyline(selection, match_final)
+        res = _parse_moneyline_names(selection, home, away)
         if res:
-            return res
+            return tuple(res.items())
     # Team total
     res = parse_total_team(selection)
     if res:
-        return res
+        return tuple(res.items())
     # Fallback: try moneyline by team names
-    res = parse_moneyline(selection, match_final)
+    res = _parse_moneyline_names(selection, home, away)
     if res:
-        return res
+        return tuple(res.items())
     return None
 
-def evaluate_leg(leg: Dict[str, Any], match_final: Dict[str, Any]) -> Optional[bool]:
+def parse_leg(market: str, selection: str, home: Optional[str] = None, away: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
-    Devuelve True si la leg está ganada, False si perdida, None si no hay datos/soporte.
+    Parsed-leg representation (plain JSON dict, e.g. {"type":"over_under","side":"over","line":2.5}).
+    Memoized on (market, selection, home, away); safe to store in parlay_legs.metadata["parsed"].
     """
-    if not match_final or not match_final.get("status"):
+    items = _parse_leg_cached(market or "", selection or "", home or "", away or "")
+    return dict(items) if items is not None else None
+
+# Generic parser tries several market parsers
+def parse_selection(market: str, selection: str, match_final: Dict[str,Any]) -> Optional[Dict[str,Any]]:
+    return parse_leg(market, selection, match_final.get("home"), match_final.get("away"))
+
+def _stored_parsed(leg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # parlay_legs.metadata may carry the parsed representation written at persist time
+    meta = leg.get("metadata")
+    if isinstance(meta, str):
+        try:
+            meta = json.loads(meta)
+        except ValueError:
+            return None
+    if isinstance(meta, dict) and isinstance(meta.get("parsed"), dict) and meta["parsed"].get("type"):
+        return meta["parsed"]
+    return None
+
+# Settlement results (scalar settle_leg and bulk evaluate_legs_bulk)
+RESULT_UNKNOWN = -1
+RESULT_LOSS = 0
+RESULT_WIN = 1
+RESULT_PUSH = 2
+RESULT_HALF_WIN = 3
+RESULT_HALF_LOSS = 4
+RESULT_VOID = 5
+
+RESULT_NAMES = {
+    RESULT_UNKNOWN: "unknown", RESULT_LOSS: "loss", RESULT_WIN: "win", RESULT_PUSH: "push",
+    RESULT_HALF_WIN: "half_win", RESULT_HALF_LOSS: "half_loss", RESULT_VOID: "void",
+}
+DECIDED_RESULTS = (RESULT_LOSS, RESULT_WIN, RESULT_PUSH, RESULT_HALF_WIN, RESULT_HALF_LOSS, RESULT_VOID)
+
+FINISHED_STATUSES = ("finished", "post")
+VOID_STATUSES = ("cancelled", "canceled", "postponed", "abandoned", "void")
+
+# sum of the two half-stake signs (-2..2) -> result
+_SPLIT_RESULTS = (RESULT_LOSS, RESULT_HALF_LOSS, RESULT_PUSH, RESULT_HALF_WIN, RESULT_WIN)
+
+def _split_lines(line: float) -> Tuple[float, float]:
+    # quarter line (x.25 / x.75): half the stake on each neighbouring half/whole line
+    if abs(round(line * 4)) % 2 == 1:
+        return line - 0.25, line + 0.25
+    return line, line
+
+def _sign(x: float) -> int:
+    return (x > 0) - (x < 0)
+
+def _line_result(value: float, line: float, over: bool) -> int:
+    """Over/handicap style: value is compared with each half of a (possibly quarter) line."""
+    l1, l2 = _split_lines(line)
+    if over:
+        return _SPLIT_RESULTS[_sign(value - l1) + _sign(value - l2) + 2]
+    return _SPLIT_RESULTS[_sign(l1 - value) + _sign(l2 - value) + 2]
+
+# Esports maps
+MAX_MAPS = 7  # BO7
+_MAP_TYPES = ("map_winner", "map_handicap", "total_maps", "correct_map_score")
+
+def _maps(match_final: Dict[str, Any]) -> List[Any]:
+    maps = match_final.get("maps") or []
+    if isinstance(maps, str):
+        try:
+            maps = json.loads(maps)
+        except ValueError:
+            return []
+    return list(maps)[:MAX_MAPS] if isinstance(maps, (list, tuple)) else []
+
+def _map_winner(entry: Any, match_done: bool) -> Optional[str]:
+    # winner of one map, None while it is being played (or without data)
+    if not isinstance(entry, dict):
         return None
-    status = match_final.get("status").lower()
-    if status != "finished" and status != "post":  # permitir 'post' o 'finished'
+    w = str(entry.get("winner") or "").lower()
+    if w in ("home", "away", "draw"):
+        return w
+    if not (match_done or str(entry.get("status") or "").lower() in FINISHED_STATUSES):
+        return None
+    try:
+        h = int(entry.get("home_score", 0) or 0)
+        a = int(entry.get("away_score", 0) or 0)
+    except Exception:
         return None
+    return "home" if h > a else "away" if a > h else "draw"
+
+def map_results(match_final: Dict[str, Any]) -> List[Optional[str]]:
+    """Per-map winner ('home'/'away'/'draw', None = not finished) from match_final["maps"]."""
+    done = str(match_final.get("status") or "").lower() in FINISHED_STATUSES
+    return [_map_winner(m, done) for m in _maps(match_final)]
+
+def series_score(match_final: Dict[str, Any], home_score: Optional[int], away_score: Optional[int]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """(maps won by home, maps won by away, maps played); without "maps" the match score counts maps."""
+    results = map_results(match_final)
+    if results:
+        return results.count("home"), results.count("away"), len(results)
+    if home_score is None or away_score is None:
+        return None, None, None
+    return home_score, away_score, home_score + away_score
+
+def _settle_map(parsed: Dict[str, Any], match_final: Dict[str, Any], home_score: Optional[int], away_score: Optional[int]) -> int:
+    t = parsed.get("type")
+    finished = str(match_final.get("status") or "").lower() in FINISHED_STATUSES
+    if t == "map_winner":
+        results = map_results(match_final)
+        n = int(parsed.get("map") or 0)
+        if 1 <= n <= len(results) and results[n - 1] is not None:
+            return RESULT_WIN if results[n - 1] == parsed.get("side") else RESULT_LOSS
+        if results and finished and n > len(results):
+            # the series ended before this map was played
+            return RESULT_VOID
+        return RESULT_UNKNOWN
+    home_maps, away_maps, played = series_score(match_final, home_score, away_score)
+    if played is None:
+        return RESULT_UNKNOWN
+    if t == "total_maps":
+        return _line_result(played, float(parsed.get("line")), parsed.get("side") == "over")
+    if t == "correct_map_score":
+        hit = home_maps == parsed.get("home") and away_maps == parsed.get("away")
+        return RESULT_WIN if hit else RESULT_LOSS
+    side = parsed.get("side")
+    if side not in ("home", "away"):
+        return RESULT_UNKNOWN
+    margin = home_maps - away_maps if side == "home" else away_maps - home_maps
+    return _line_result(margin, -float(parsed.get("line", 0.0)), True)
+
+def payout_multiplier(result, odds):
+    """
+    Gross return per unit stake for each result (works on scalars and arrays):
+    win -> odds, half-win -> (1 + odds) / 2, push/void -> 1, half-loss -> 0.5,
+    loss -> 0, unknown -> nan. A parlay's multiplier is the product over its legs.
+    """
+    result = np.asarray(result)
+    odds = np.asarray(odds, dtype=np.float64)
+    out = np.select(
+        [result == RESULT_WIN, result == RESULT_HALF_WIN, (result == RESULT_PUSH) | (result == RESULT_VOID),
+         result == RESULT_HALF_LOSS, result == RESULT_LOSS],
+        [odds, (1.0 + odds) / 2.0, 1.0, 0.5, 0.0],
+        default=np.nan,
+    )
+    return float(out) if out.ndim == 0 else out
+
+def settle_leg(leg: Dict[str, Any], match_final: Dict[str, Any]) -> int:
+    """
+    Devuelve el resultado RESULT_* de la leg (win, half-win, push, half-loss, loss, void
+    o unknown si no hay datos/soporte).
+    """
+    if not match_final or not match_final.get("status"):
+        return RESULT_UNKNOWN
+    status = str(match_final.get("status")).lower()
+    if status in VOID_STATUSES:
+        return RESULT_VOID
+    finished = status in FINISHED_STATUSES  # permitir 'post' o 'finished'
+    if not finished and not match_final.get("maps"):
+        return RESULT_UNKNOWN
 
     # Normalize basic scores
     try:
@@ -154,102 +391,345 @@ def evaluate_leg(leg: Dict[str, Any], match_final: Dict[str, Any]) -> Optional[b
         home_score = None
         away_score = None
 
-    parsed = parse_selection(leg.get("market",""), str(leg.get("selection","")), match_final)
+    parsed = _stored_parsed(leg) or parse_selection(leg.get("market",""), str(leg.get("selection","")), match_final)
     if not parsed:
-        return None
+        return RESULT_UNKNOWN
+    # in play only a completed map can be settled
+    if not finished and parsed.get("type") != "map_winner":
+        return RESULT_UNKNOWN
+    return settle_parsed(parsed, match_final, home_score, away_score)
+
+def evaluate_leg(leg: Dict[str, Any], match_final: Dict[str, Any]) -> Optional[bool]:
+    """
+    Devuelve True si la leg está ganada (o medio ganada), False si perdida (o medio
+    perdida), None si es push/void o no hay datos/soporte. Ver settle_leg.
+    """
+    res = settle_leg(leg, match_final)
+    if res in (RESULT_WIN, RESULT_HALF_WIN):
+        return True
+    if res in (RESULT_LOSS, RESULT_HALF_LOSS):
+        return False
+    return None
 
+def settle_parsed(parsed: Dict[str, Any], match_final: Dict[str, Any], home_score: Optional[int], away_score: Optional[int]) -> int:
+    """
+    Arithmetic part of settle_leg: settle an already parsed leg against final scores.
+    """
     t = parsed.get("type")
+    if t in _MAP_TYPES:
+        return _settle_map(parsed, match_final, home_score, away_score)
     # Moneyline
     if t == "moneyline":
         winner = match_final.get("winner")
         if not winner:
             # derive winner from scores
             if home_score is None or away_score is None:
-                return None
+                return RESULT_UNKNOWN
             if home_score > away_score:
                 winner = "home"
             elif away_score > home_score:
                 winner = "away"
             else:
                 winner = "draw"
-        side = parsed.get("side")
-        return winner == side
+        return RESULT_WIN if winner == parsed.get("side") else RESULT_LOSS
 
-    # Over/Under
+    if home_score is None or away_score is None:
+        return RESULT_UNKNOWN
+
+    # Over/Under (integer lines push, quarter lines split)
     if t == "over_under":
-        if home_score is None or away_score is None:
-            return None
-        total = home_score + away_score
-        line = parsed.get("line")
-        side = parsed.get("side")
-        if side == "over":
-            return total > line
-        else:
-            return total < line
+        return _line_result(home_score + away_score, float(parsed.get("line")), parsed.get("side") == "over")
 
     # BTTS
     if t == "btts":
-        if home_score is None or away_score is None:
-            return None
-        if parsed.get("side") == "yes":
-            return (home_score > 0 and away_score > 0)
-        return not (home_score > 0 and away_score > 0)
+        both = home_score > 0 and away_score > 0
+        return RESULT_WIN if both == (parsed.get("side") == "yes") else RESULT_LOSS
 
     # Correct score
     if t == "correct_score":
-        if home_score is None or away_score is None:
-            return None
-        return (home_score == parsed.get("home") and away_score == parsed.get("away"))
+        hit = home_score == parsed.get("home") and away_score == parsed.get("away")
+        return RESULT_WIN if hit else RESULT_LOSS
 
-    # Handicap
+    # Handicap: the line is added to the margin of the picked side ('Home -1' covers when margin > 1)
     if t == "handicap":
-        if home_score is None or away_score is None:
-            return None
-        line = float(parsed.get("line",0.0))
-        # Determine side: if parsed.side is None, deduce by presence of home/away in selection string
         side = parsed.get("side")
-        # compute goal difference from perspective of side
-        # standard handicap: home_score + (-line) vs away_score  (if side home and line negative means give goals)
-        # We'll compute margin = (home_score - away_score) and compare with line
+        if side not in ("home", "away"):
+            return RESULT_UNKNOWN
         margin = home_score - away_score
-        # If line is applied to home (side home)
-        if side == "home" or side is None:
-            # Example: 'Home -1' means margin > 1 -> home covers
-            return margin + line > 0  # if line is negative, adding increases
-        else:
-            # side away
-            return (-margin) + line > 0
+        if side == "away":
+            margin = -margin
+        return _line_result(margin, -float(parsed.get("line", 0.0)), True)
 
     # Team total (Home/Away team over/under X)
     if t == "team_total":
-        team = parsed.get("team")
-        if team is None:
-            return None
-        # figure which team: home/away by matching 'home'/'away' or name
-        target_score = None
-        if 'home' in normalize_text(team):
-            target_score = home_score
-        elif 'away' in normalize_text(team):
-            target_score = away_score
-        else:
-            # try name match
-            if normalize_text(team) == normalize_text(match_final.get("home","")):
-                target_score = home_score
-            elif normalize_text(team) == normalize_text(match_final.get("away","")):
-                target_score = away_score
-            else:
-                # unknown team token
-                return None
-        side = parsed.get("side")
-        line = parsed.get("line")
-        if side == "over":
-            return target_score > line
-        else:
-            return target_score < line
-
-    # Map / esports / sets: attempt naive evaluation if maps field present and selection mentions map total/covers
-    if t == "map_total" or 'maps' in match_final:
-        # Not implemented fully without concrete formats. Return None for now.
-        return None
+        team = _team_code(parsed.get("team"), match_final.get("home"), match_final.get("away"))
+        if team == SIDE_NONE:
+            # unknown team token
+            return RESULT_UNKNOWN
+        target_score = home_score if team == SIDE_HOME else away_score
+        return _line_result(target_score, float(parsed.get("line")), parsed.get("side") == "over")
 
-    return None
+    return RESULT_UNKNOWN
+
+# ---------------------------------------------------------------------------
+# Liquidación masiva (vectorizada)
+# ---------------------------------------------------------------------------
+# Leg type codes
+LEG_UNKNOWN = 0
+LEG_MONEYLINE = 1
+LEG_OVER_UNDER = 2
+LEG_BTTS = 3
+LEG_CORRECT_SCORE = 4
+LEG_HANDICAP = 5
+LEG_TEAM_TOTAL = 6
+LEG_MAP_WINNER = 7
+LEG_MAP_HANDICAP = 8
+LEG_TOTAL_MAPS = 9
+LEG_CORRECT_MAP_SCORE = 10
+
+# Side / team codes
+SIDE_NONE = 0
+SIDE_HOME = 1
+SIDE_AWAY = 2
+SIDE_DRAW = 3
+SIDE_OVER = 4
+SIDE_UNDER = 5
+SIDE_YES = 6
+SIDE_NO = 7
+SIDE_OTHER = 8  # e.g. a provider 'winner' value that matches no side
+
+_TYPE_CODES = {
+    "moneyline": LEG_MONEYLINE, "over_under": LEG_OVER_UNDER, "btts": LEG_BTTS,
+    "correct_score": LEG_CORRECT_SCORE, "handicap": LEG_HANDICAP, "team_total": LEG_TEAM_TOTAL,
+    "map_winner": LEG_MAP_WINNER, "map_handicap": LEG_MAP_HANDICAP, "total_maps": LEG_TOTAL_MAPS,
+    "correct_map_score": LEG_CORRECT_MAP_SCORE,
+}
+_SIDE_CODES = {
+    "home": SIDE_HOME, "away": SIDE_AWAY, "draw": SIDE_DRAW, "over": SIDE_OVER,
+    "under": SIDE_UNDER, "yes": SIDE_YES, "no": SIDE_NO,
+}
+
+@dataclass
+class LegArrays:
+    """
+    Columnar parsed legs for evaluate_legs_bulk.
+    - type_code: LEG_* ; side: SIDE_* (over/under, yes/no, home/away/draw)
+    - line: handicap / total line
+    - team: SIDE_HOME/SIDE_AWAY for team totals (SIDE_NONE = unresolved team)
+    - target_home/target_away: correct score / correct map score targets
+    - map_no: map number (1-based) for map winner legs, 0 otherwise
+    """
+    type_code: np.ndarray
+    side: np.ndarray
+    line: np.ndarray
+    team: np.ndarray
+    target_home: np.ndarray
+    target_away: np.ndarray
+    map_no: Optional[np.ndarray] = None
+
+    def __post_init__(self):
+        if self.map_no is None:
+            self.map_no = np.zeros(self.type_code.shape, dtype=np.int16)
+
+    def __len__(self) -> int:
+        return int(self.type_code.shape[0])
+
+def _team_code(team: Optional[str], home_name: Optional[str], away_name: Optional[str]) -> int:
+    team_n = normalize_text(team or "")
+    if 'home' in team_n:
+        return SIDE_HOME
+    if 'away' in team_n:
+        return SIDE_AWAY
+    if team_n == normalize_text(home_name or ""):
+        return SIDE_HOME
+    if team_n == normalize_text(away_name or ""):
+        return SIDE_AWAY
+    return SIDE_NONE
+
+def encode_legs(parsed_legs: Sequence[Optional[Dict[str, Any]]], match_finals: Optional[Sequence[Dict[str, Any]]] = None) -> LegArrays:
+    """
+    Encode parsed legs (parse_leg output, None for unparseable) into LegArrays.
+    match_finals (aligned with the legs) is only used to resolve team-total team names.
+    """
+    n = len(parsed_legs)
+    type_code = np.zeros(n, dtype=np.int8)
+    side = np.zeros(n, dtype=np.int8)
+    line = np.zeros(n, dtype=np.float64)
+    team = np.zeros(n, dtype=np.int8)
+    target_home = np.full(n, -1, dtype=np.int32)
+    target_away = np.full(n, -1, dtype=np.int32)
+    map_no = np.zeros(n, dtype=np.int16)
+    for i, parsed in enumerate(parsed_legs):
+        if not parsed:
+            continue
+        t = _TYPE_CODES.get(parsed.get("type"), LEG_UNKNOWN)
+        type_code[i] = t
+        side[i] = _SIDE_CODES.get(parsed.get("side"), SIDE_NONE)
+        if parsed.get("line") is not None:
+            line[i] = float(parsed["line"])
+        if t in (LEG_CORRECT_SCORE, LEG_CORRECT_MAP_SCORE):
+            target_home[i] = int(parsed.get("home"))
+            target_away[i] = int(parsed.get("away"))
+        elif t == LEG_MAP_WINNER:
+            map_no[i] = int(parsed.get("map") or 0)
+        elif t == LEG_TEAM_TOTAL:
+            mf = match_finals[i] if match_finals is not None else {}
+            team[i] = _team_code(parsed.get("team"), (mf or {}).get("home"), (mf or {}).get("away"))
+    return LegArrays(type_code, side, line, team, target_home, target_away, map_no)
+
+def encode_matches(match_finals: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Score columns for evaluate_legs_bulk with the same normalization as settle_leg:
+    finished ('finished'/'post'), void (cancelled/postponed/abandoned), scores
+    (missing -> 0, non numeric -> unknown), winner code and, for esports, per-map
+    winners (SIDE_* per map, SIDE_NONE while a map is unfinished).
+    """
+    n = len(match_finals)
+    finished = np.zeros(n, dtype=bool)
+    void = np.zeros(n, dtype=bool)
+    known = np.zeros(n, dtype=bool)
+    home = np.zeros(n, dtype=np.int64)
+    away = np.zeros(n, dtype=np.int64)
+    winner = np.zeros(n, dtype=np.int8)
+    map_winners = np.zeros((n, MAX_MAPS), dtype=np.int8)
+    maps_played = np.zeros(n, dtype=np.int64)
+    for i, mf in enumerate(match_finals):
+        if not mf or not mf.get("status"):
+            continue
+        status = str(mf.get("status")).lower()
+        finished[i] = status in FINISHED_STATUSES
+        void[i] = status in VOID_STATUSES
+        try:
+            home[i] = int(mf.get("home_score", 0) or 0)
+            away[i] = int(mf.get("away_score", 0) or 0)
+            known[i] = True
+        except Exception:
+            pass
+        w = mf.get("winner")
+        if w:
+            winner[i] = _SIDE_CODES.get(w, SIDE_OTHER) if w in ("home", "away", "draw") else SIDE_OTHER
+        results = map_results(mf)
+        maps_played[i] = len(results)
+        for j, r in enumerate(results):
+            map_winners[i, j] = _SIDE_CODES[r] if r else SIDE_NONE
+    return {"home_score": home, "away_score": away, "finished": finished, "scores_known": known, "winner": winner, "void": void,
+            "map_winners": map_winners, "maps_played": maps_played}
+
+def _split_results(value: np.ndarray, line: np.ndarray, over: np.ndarray) -> np.ndarray:
+    """Vector form of _line_result: quarter lines settle half the stake on each neighbour."""
+    quarter = np.abs(np.rint(line * 4)).astype(np.int64) % 2 == 1
+    l1 = np.where(quarter, line - 0.25, line)
+    l2 = np.where(quarter, line + 0.25, line)
+    signs = np.sign(value - l1).astype(np.int64) + np.sign(value - l2).astype(np.int64)
+    signs = np.where(over, signs, -signs)
+    return np.asarray(_SPLIT_RESULTS, dtype=np.int8)[signs + 2]
+
+def evaluate_legs_bulk(legs: LegArrays, home_score, away_score, finished=None, scores_known=None, winner=None, void=None,
+                       map_winners=None, maps_played=None) -> np.ndarray:
+    """
+    Settle many legs at once. Score arrays are aligned (or broadcastable) with the
+    legs; returns an int8 RESULT_* code per leg, matching settle_leg leg by leg.
+    map_winners (n, MAX_MAPS) / maps_played come from encode_matches; without them
+    the scores are read as maps won (simulated esports series in the pricer).
+    """
+    home = np.asarray(home_score, dtype=np.int64)
+    away = np.asarray(away_score, dtype=np.int64)
+    shape = np.broadcast_shapes(legs.type_code.shape, home.shape, away.shape)
+    finished = np.ones(shape, dtype=bool) if finished is None else np.asarray(finished, dtype=bool)
+    void = np.zeros(shape, dtype=bool) if void is None else np.asarray(void, dtype=bool)
+    known = np.ones(shape, dtype=bool) if scores_known is None else np.asarray(scores_known, dtype=bool)
+    winner = np.zeros(shape, dtype=np.int8) if winner is None else np.asarray(winner, dtype=np.int8)
+
+    t, side, line = legs.type_code, legs.side, legs.line
+    total = home + away
+    margin = home - away
+    out = np.full(shape, RESULT_UNKNOWN, dtype=np.int8)
+    decided = np.zeros(shape, dtype=bool)
+
+    def binary(mask, win):
+        return np.where(mask, np.where(win, RESULT_WIN, RESULT_LOSS), out).astype(np.int8)
+
+    # Moneyline: provider winner if present, else from scores
+    derived = np.where(home > away, SIDE_HOME, np.where(away > home, SIDE_AWAY, SIDE_DRAW))
+    ml_winner = np.where(winner != SIDE_NONE, winner, derived)
+    is_ml = t == LEG_MONEYLINE
+    out = binary(is_ml, ml_winner == side)
+    decided |= is_ml & ((winner != SIDE_NONE) | known)
+
+    # Over/Under on the match total (whole lines push, quarter lines split)
+    is_ou = t == LEG_OVER_UNDER
+    out = np.where(is_ou, _split_results(total, line, side == SIDE_OVER), out)
+    decided |= is_ou & known
+
+    # Both teams to score
+    is_btts = t == LEG_BTTS
+    both = (home > 0) & (away > 0)
+    out = binary(is_btts, np.where(side == SIDE_YES, both, ~both))
+    decided |= is_btts & known
+
+    # Correct score
+    is_cs = t == LEG_CORRECT_SCORE
+    out = binary(is_cs, (home == legs.target_home) & (away == legs.target_away))
+    decided |= is_cs & known
+
+    # Handicap: margin of the picked side against -line; unresolved side stays unknown
+    is_hc = t == LEG_HANDICAP
+    side_margin = np.where(side == SIDE_AWAY, -margin, margin)
+    out = np.where(is_hc, _split_results(side_margin, -line, True), out)
+    decided |= is_hc & ((side == SIDE_HOME) | (side == SIDE_AWAY)) & known
+
+    # Team total
+    is_tt = t == LEG_TEAM_TOTAL
+    team_score = np.where(legs.team == SIDE_AWAY, away, home)
+    out = np.where(is_tt, _split_results(team_score, line, side == SIDE_OVER), out)
+    decided |= is_tt & (legs.team != SIDE_NONE) & known
+
+    # Esports series markets: maps won from map_winners when present, else from the scores
+    if maps_played is None:
+        maps_played = np.zeros(shape, dtype=np.int64)
+        map_winners = np.zeros(shape + (1,), dtype=np.int8)
+    maps_played = np.asarray(maps_played, dtype=np.int64)
+    map_winners = np.broadcast_to(np.asarray(map_winners, dtype=np.int8), shape + (np.shape(map_winners)[-1],))
+    has_maps = maps_played > 0
+    map_home = np.where(has_maps, (map_winners == SIDE_HOME).sum(axis=-1), home)
+    map_away = np.where(has_maps, (map_winners == SIDE_AWAY).sum(axis=-1), away)
+    played = np.where(has_maps, maps_played, home + away)
+    series_known = has_maps | known
+
+    is_tm = t == LEG_TOTAL_MAPS
+    out = np.where(is_tm, _split_results(played, line, side == SIDE_OVER), out)
+    decided |= is_tm & series_known
+
+    is_cms = t == LEG_CORRECT_MAP_SCORE
+    out = binary(is_cms, (map_home == legs.target_home) & (map_away == legs.target_away))
+    decided |= is_cms & series_known
+
+    is_mh = t == LEG_MAP_HANDICAP
+    map_margin = np.where(side == SIDE_AWAY, map_away - map_home, map_home - map_away)
+    out = np.where(is_mh, _split_results(map_margin, -line, True), out)
+    decided |= is_mh & ((side == SIDE_HOME) | (side == SIDE_AWAY)) & series_known
+
+    # Map N winner: settles as soon as map N is finished, void if the series ended before it
+    is_mw = t == LEG_MAP_WINNER
+    col = np.clip(legs.map_no.astype(np.int64) - 1, 0, map_winners.shape[-1] - 1)
+    col = np.broadcast_to(col, shape)
+    map_won = np.take_along_axis(map_winners, col[..., None], axis=-1)[..., 0]
+    in_range = (legs.map_no >= 1) & (legs.map_no <= maps_played)
+    map_done = is_mw & in_range & (map_won != SIDE_NONE)
+    out = binary(is_mw, map_won == side)
+    out = np.where(is_mw & has_maps & finished & (legs.map_no > maps_played), RESULT_VOID, out)
+    decided |= map_done | (is_mw & has_maps & finished & (legs.map_no > maps_played))
+
+    out = np.array(np.broadcast_to(out, shape), dtype=np.int8)
+    out[~(decided & (finished | map_done))] = RESULT_UNKNOWN
+    out[np.broadcast_to(void, shape)] = RESULT_VOID
+    return out
+
+def evaluate_legs(legs: Sequence[Dict[str, Any]], match_finals: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Convenience wrapper: leg dicts + aligned match_final dicts -> bulk results."""
+    parsed = [
+        _stored_parsed(leg) or parse_selection(leg.get("market", ""), str(leg.get("selection", "")), mf or {})
+        for leg, mf in zip(legs, match_finals)
+    ]
+    cols = encode_matches(match_finals)
+    return evaluate_legs_bulk(encode_legs(parsed, match_finals), **cols)
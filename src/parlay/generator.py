@@ -4,9 +4,16 @@ import math
 import json
 import asyncio
 from decimal import Decimal
-from typing import List, Dict, Any
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Any, Iterable, Optional, Sequence
 import asyncpg
+import numpy as np
 from datetime import datetime, timezone
+from src.parlay.search import beam_search
+from src.parlay.pricing import ParlayPricer
+from src.parlay.evaluator import parse_leg
+from src.parlay.cache import CandidateCache
+from src.parlay.catalogue import ParlayCatalogue
 
 # Configs from env (respect exact names)
 EV_THRESHOLD = float(os.getenv("EV_THRESHOLD", "0.0"))
@@ -14,6 +21,15 @@ MIN_PARLAY_LEGS = int(os.getenv("MIN_PARLAY_LEGS", "2"))
 MAX_PARLAY_LEGS = int(os.getenv("MAX_PARLAY_LEGS", "8"))
 DEFAULT_BANKROLL = float(os.getenv("BANKROLL", "100.0"))
 DEFAULT_STAKE_PCT = float(os.getenv("STAKE_PCT", "2.0"))  # percent
+SONADOR_MAX_CANDIDATES = int(os.getenv("SONADOR_MAX_CANDIDATES", "60"))
+PARLAY_MAX_LEGS_PER_MATCH = int(os.getenv("PARLAY_MAX_LEGS_PER_MATCH", "1"))
+PRICING_MAX_COMBOS = int(os.getenv("PRICING_MAX_COMBOS", "5000"))
+SEGURITO_MAX_LEGS = 3
+SONADOR_MAX_LEGS = 8
+SONADOR_BEAM_WIDTH = 200
+
+# Pre-generated parlays refreshed after each ingest pass (see src/parlay/catalogue.py)
+PARLAY_CATALOGUE = ParlayCatalogue()
 
 # Utility: implied prob
 def implied_prob(odds: float) -> float:
@@ -34,185 +50,405 @@ def estimate_prob_from_market(market: str, odds: float) -> float:
     return max(0.01, min(0.99, p_hat))
 
 def compute_ev(p_hat: float, odds: float) -> float:
-    # EV per unit stake
+    # EV per unit stake (works elementwise on numpy arrays too)
     return p_hat * (odds - 1) - (1 - p_hat)
 
+# Vectorized counterpart of estimate_prob_from_market for a whole odds column
+def estimate_probs(odds: np.ndarray) -> np.ndarray:
+    odds = np.asarray(odds, dtype=np.float64)
+    ip = np.divide(1.0, odds, out=np.zeros_like(odds), where=odds > 0)
+    return np.clip(ip * 0.9 + 0.05, 0.01, 0.99)
+
 def product_odds(odds_list: List[float]) -> float:
     prod = 1.0
     for o in odds_list:
         prod *= float(o)
     return prod
 
-# Fetch candidate legs from match_cache table
-async def fetch_candidate_legs(conn: asyncpg.Connection, included_sports: List[str] = None) -> List[Dict[str, Any]]:
-    q = "SELECT match_id, sport, home, away, markets FROM match_cache WHERE markets IS NOT NULL AND start_time > now() - interval '1 day'"
-    rows = await conn.fetch(q)
-    candidates = []
+@dataclass
+class CandidateTable:
+    """
+    Columnar view of every priced selection in match_cache.
+    Row i is one selection: match_idx[i] points into `matches`, market_id[i] into
+    `markets` and selection_id[i] into `selections`. odds/p_hat/ev are float64.
+    """
+    matches: List[Dict[str, Any]]
+    markets: List[str]
+    selections: List[str]
+    metadata: List[Any]
+    match_idx: np.ndarray
+    market_id: np.ndarray
+    selection_id: np.ndarray
+    odds: np.ndarray
+    p_hat: np.ndarray
+    ev: np.ndarray
+    _pricer: Optional[ParlayPricer] = field(default=None, repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return int(self.odds.shape[0])
+
+    def mask(self, min_ev: float = EV_THRESHOLD, min_odds: Optional[float] = None, max_odds: Optional[float] = None) -> np.ndarray:
+        """Boolean mask of rows with ev >= min_ev and odds inside (min_odds, max_odds]."""
+        m = self.ev >= min_ev
+        if min_odds is not None:
+            m &= self.odds > min_odds
+        if max_odds is not None:
+            m &= self.odds <= max_odds
+        return m
+
+    def leg(self, i: int) -> Dict[str, Any]:
+        """Materialize row i as the leg dict used by persist_parlay and the bot text."""
+        match = self.matches[self.match_idx[i]]
+        return {
+            "match_id": match["match_id"],
+            "sport": match["sport"],
+            "home": match["home"],
+            "away": match["away"],
+            "market": self.markets[self.market_id[i]],
+            "selection": self.selections[self.selection_id[i]],
+            "odds": float(self.odds[i]),
+            "ev": float(self.ev[i]),
+            "p_hat": float(self.p_hat[i]),
+            "metadata": self.metadata[i]
+        }
+
+    def legs(self, idx: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.leg(int(i)) for i in idx]
+
+    def pricer(self) -> ParlayPricer:
+        """Joint Monte Carlo pricer; lives with the table so cached snapshots reuse its draws."""
+        if self._pricer is None:
+            self._pricer = ParlayPricer(self)
+        return self._pricer
+
+def _decode_markets(raw) -> Dict[str, Any]:
+    # asyncpg returns json/jsonb as text unless a codec is registered
+    if not raw:
+        return {}
+    if isinstance(raw, (str, bytes)):
+        return json.loads(raw)
+    return raw
+
+def build_candidate_table(rows: Sequence[Any]) -> CandidateTable:
+    """
+    Single pass over match_cache rows collecting flat columns; probability and EV
+    are then computed for all selections at once.
+    """
+    matches: List[Dict[str, Any]] = []
+    market_ids: Dict[str, int] = {}
+    selection_ids: Dict[str, int] = {}
+    metadata: List[Any] = []
+    match_idx: List[int] = []
+    market_col: List[int] = []
+    selection_col: List[int] = []
+    odds_col: List[float] = []
     for r in rows:
-        markets = r["markets"] or {}
-        # markets stored as JSON: iterate common markets
+        markets = _decode_markets(r["markets"])
+        mi = len(matches)
+        matches.append({"match_id": r["match_id"], "sport": r["sport"], "home": r["home"], "away": r["away"]})
+        # markets stored as JSON: { market_name: [{selection, odds}, ...] }
         for market_name, selection_list in markets.items():
-            # selection_list expected [{selection, odds}, ...]
-            for s in selection_list:
+            market = market_ids.setdefault(market_name, len(market_ids))
+            for s in selection_list or []:
                 odds = s.get("odds")
                 if not odds:
                     continue
-                odds = float(odds)
-                market = market_name
-                selection = s.get("selection") or s.get("pick") or ""
-                p_hat = estimate_prob_from_market(market, odds)
-                ev = compute_ev(p_hat, odds)
-                candidate = {
-                    "match_id": r["match_id"],
-                    "sport": r["sport"],
-                    "home": r["home"],
-                    "away": r["away"],
-                    "market": market,
-                    "selection": selection,
-                    "odds": odds,
-                    "ev": ev,
-                    "p_hat": p_hat,
-                    "metadata": s.get("metadata", {})
-                }
-                candidates.append(candidate)
-    return candidates
-
-# Insert parlay and legs into DB and return parlay id
-async def persist_parlay(conn: asyncpg.Connection, user_id: int, mode: str, legs: List[Dict[str, Any]], stake: float) -> Dict[str, Any]:
-    total_odds = product_odds([leg["odds"] for leg in legs])
-    expected_return = total_odds * stake
-    settings_snapshot = {
-        "mode": mode,
-        "generated_at": datetime.now(timezone.utc).isoformat(),
-        "target_total_odds": total_odds,
-        "max_legs": len(legs)
-    }
-    row = await conn.fetchrow(
-        "INSERT INTO parlays (user_id, mode, total_odds, legs_count, stake, expected_return, settings_snapshot) VALUES ($1,$2,$3,$4,$5,$6,$7) RETURNING id",
-        user_id, mode, Decimal(str(total_odds)), len(legs), Decimal(str(stake)), Decimal(str(expected_return)), json.dumps(settings_snapshot)
+                selection = str(s.get("selection") or s.get("pick") or "")
+                match_idx.append(mi)
+                market_col.append(market)
+                selection_col.append(selection_ids.setdefault(selection, len(selection_ids)))
+                odds_col.append(float(odds))
+                metadata.append(s.get("metadata", {}))
+    odds_arr = np.asarray(odds_col, dtype=np.float64)
+    p_hat = estimate_probs(odds_arr)
+    return CandidateTable(
+        matches=matches,
+        markets=list(market_ids),
+        selections=list(selection_ids),
+        metadata=metadata,
+        match_idx=np.asarray(match_idx, dtype=np.int64),
+        market_id=np.asarray(market_col, dtype=np.int64),
+        selection_id=np.asarray(selection_col, dtype=np.int64),
+        odds=odds_arr,
+        p_hat=p_hat,
+        ev=compute_ev(p_hat, odds_arr),
     )
-    parlay_id = row["id"]
-    for leg in legs:
-        await conn.execute(
-            "INSERT INTO parlay_legs (parlay_id, match_id, sport, market, selection, odds, ev, metadata) VALUES ($1,$2,$3,$4,$5,$6,$7,$8)",
-            parlay_id, str(leg["match_id"]), leg["sport"], leg["market"], str(leg["selection"]), Decimal(str(leg["odds"])), Decimal(str(leg["ev"])), json.dumps(leg.get("metadata", {}))
-        )
+
+# Fetch candidate legs from match_cache table as a columnar table
+async def fetch_candidate_table(conn: asyncpg.Connection, included_sports: List[str] = None, window_hours: int = 24) -> CandidateTable:
+    q = "SELECT match_id, sport, home, away, markets FROM match_cache WHERE markets IS NOT NULL AND start_time > now() - make_interval(hours => $1)"
+    if included_sports:
+        # case-insensitive, like the candidate cache key (cache.make_key)
+        sports = sorted({s.lower() for s in included_sports})
+        rows = await conn.fetch(q + " AND lower(sport) = ANY($2::text[])", int(window_hours), sports)
+    else:
+        rows = await conn.fetch(q, int(window_hours))
+    return build_candidate_table(rows)
+
+# Process-wide snapshot cache shared by every parlay request (see src/parlay/cache.py)
+CANDIDATE_CACHE = CandidateCache(fetch_candidate_table)
+
+# Legacy list-of-dicts view (kept for callers that still want one dict per selection)
+async def fetch_candidate_legs(conn: asyncpg.Connection, included_sports: List[str] = None) -> List[Dict[str, Any]]:
+    table = await fetch_candidate_table(conn, included_sports)
+    return table.legs(range(len(table)))
+
+def _greedy_prefix(odds: np.ndarray, target_total_odds: float, max_legs: int) -> int:
+    """
+    Length of the greedy prefix: take legs in order until the running product
+    reaches the target with at least 2 legs, or max_legs is hit.
+    """
+    cum = np.cumprod(odds[:max(max_legs, 0)])
+    if cum.size == 0:
+        return 0
+    hit = np.flatnonzero((cum >= target_total_odds) & (np.arange(1, cum.size + 1) >= 2))
+    return int(hit[0]) + 1 if hit.size else int(cum.size)
+
+def _cap_per_match(table: CandidateTable, idx: np.ndarray, limit: int) -> np.ndarray:
+    """idx without the rows past the first `limit` of each match (order kept)."""
+    seen: Dict[int, int] = {}
+    keep = []
+    for i in idx:
+        mi = int(table.match_idx[i])
+        seen[mi] = seen.get(mi, 0) + 1
+        keep.append(seen[mi] <= limit)
+    return idx[np.asarray(keep, dtype=bool)] if keep else idx
+
+def _segurito_pick(table: CandidateTable, target_total_odds: float, max_legs: int, per_match: Optional[int] = None) -> np.ndarray:
+    idx = np.flatnonzero(table.mask(max_odds=2.5))
+    # sort ascending odds, then by ev desc (lexsort is stable, last key is primary)
+    idx = idx[np.lexsort((-table.ev[idx], table.odds[idx]))]
+    if per_match is not None:
+        idx = _cap_per_match(table, idx, per_match)
+    chosen = idx[:_greedy_prefix(table.odds[idx], target_total_odds, max_legs)]
+    # fallback: if not enough, relax odds filter
+    if np.prod(table.odds[chosen]) < target_total_odds:
+        idx = np.flatnonzero(table.mask())
+        idx = idx[np.argsort(-table.ev[idx], kind="stable")]
+        if per_match is not None:
+            idx = _cap_per_match(table, idx, per_match)
+        chosen = idx[:_greedy_prefix(table.odds[idx], target_total_odds, max_legs)]
+    return chosen
+
+def select_segurito_legs(table: CandidateTable, target_total_odds: float, max_legs: int) -> np.ndarray:
+    """
+    Row indices for a Segurito parlay: lowest odds first, relaxed to best EV if the target is missed.
+    A pick with several legs on one match is priced jointly; if the correlation takes its
+    EV below EV_THRESHOLD it is rejected and rebuilt with PARLAY_MAX_LEGS_PER_MATCH.
+    """
+    chosen = _segurito_pick(table, target_total_odds, max_legs)
+    if np.unique(table.match_idx[chosen]).size < chosen.size:
+        joint_ev = table.pricer().price([chosen])[2][0]
+        if joint_ev < EV_THRESHOLD:
+            chosen = _segurito_pick(table, target_total_odds, max_legs, per_match=PARLAY_MAX_LEGS_PER_MATCH)
+    return chosen
+
+def select_sonador_legs(table: CandidateTable, target_total_odds: float, max_legs: int, beam_width: int, max_candidates: int = SONADOR_MAX_CANDIDATES) -> np.ndarray:
+    """
+    Row indices for a Soñador parlay. Beam search over the top EV candidates
+    finds every leg set reaching the target at the shallowest depth. From the
+    second leg on the beam is ranked on joint prices (correlation-aware Monte
+    Carlo), and the best joint EV among the sets reaching the target wins.
+    """
+    idx = np.flatnonzero(table.mask(min_odds=1.2))
+    # sort by ev desc and odds desc to prioritize high momio+edge
+    idx = idx[np.lexsort((-table.odds[idx], -table.ev[idx]))]
+    # Limit candidates to top-N to avoid explosion
+    idx = idx[:max_candidates]
+    pricer = table.pricer()
+
+    def joint_score(sets):
+        # same form as the beam's own score: odds * (1 + EV), with the joint EV
+        _, total_odds, ev = pricer.price([idx[np.asarray(s, dtype=np.int64)] for s in sets])
+        return total_odds * (1.0 + ev)
+
+    best, hits, _ = beam_search(table.odds[idx], table.ev[idx], table.match_idx[idx], target_total_odds, max_legs, beam_width,
+                                max_legs_per_match=PARLAY_MAX_LEGS_PER_MATCH, return_beam=True, rescore=joint_score)
+    if hits:
+        hits = hits[:PRICING_MAX_COMBOS]
+        combos = [idx[np.asarray(h, dtype=np.int64)] for h in hits]
+        _, total_odds, ev = pricer.price(combos)
+        # best joint EV, then higher odds; lexsort keeps the search order on ties
+        best_i = int(np.lexsort((-total_odds, -ev))[0])
+        return combos[best_i]
+    return idx[np.asarray(best, dtype=np.int64)]
+
+_INSERT_PARLAY_SQL = "INSERT INTO parlays (user_id, mode, total_odds, legs_count, stake, expected_return, settings_snapshot) VALUES ($1,$2,$3,$4,$5,$6,$7) RETURNING id"
+# RETURNING order is not guaranteed: ids are drawn in the CTE and returned with their input position
+_INSERT_PARLAYS_BULK_SQL = """
+WITH batch AS (
+  SELECT nextval(pg_get_serial_sequence('parlays', 'id')) AS id, u, m, t, n, s, e, ss, ord
+  FROM unnest($1::bigint[], $2::text[], $3::numeric[], $4::int[], $5::numeric[], $6::numeric[], $7::text[])
+       WITH ORDINALITY AS x(u, m, t, n, s, e, ss, ord)
+), ins AS (
+  INSERT INTO parlays (id, user_id, mode, total_odds, legs_count, stake, expected_return, settings_snapshot)
+  SELECT id, u, m, t, n, s, e, ss::jsonb FROM batch
+  RETURNING id
+)
+SELECT batch.id, batch.ord FROM batch JOIN ins USING (id)
+"""
+_INSERT_LEG_SQL = "INSERT INTO parlay_legs (parlay_id, match_id, sport, market, selection, odds, ev, metadata) VALUES ($1,$2,$3,$4,$5,$6,$7,$8)"
+
+def _parlay_summary(mode: str, legs: List[Dict[str, Any]], stake: float) -> Dict[str, Any]:
+    total_odds = product_odds([leg["odds"] for leg in legs])
     return {
-        "id": parlay_id,
         "total_odds": total_odds,
         "stake": stake,
-        "expected_return": expected_return,
-        "settings_snapshot": settings_snapshot
+        "expected_return": total_odds * stake,
+        "settings_snapshot": {
+            "mode": mode,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "target_total_odds": total_odds,
+            "max_legs": len(legs)
+        }
     }
 
+def _parlay_params(user_id: int, mode: str, legs: List[Dict[str, Any]], summary: Dict[str, Any]) -> tuple:
+    return (user_id, mode, Decimal(str(summary["total_odds"])), len(legs), Decimal(str(summary["stake"])),
+            Decimal(str(summary["expected_return"])), json.dumps(summary["settings_snapshot"]))
+
+def _leg_metadata(leg: Dict[str, Any]) -> Any:
+    # store the parsed selection so settlement only does the arithmetic
+    meta = leg.get("metadata", {})
+    if isinstance(meta, dict) and "parsed" not in meta:
+        parsed = parse_leg(leg["market"], str(leg["selection"]), leg.get("home"), leg.get("away"))
+        if parsed:
+            meta = {**meta, "parsed": parsed}
+    return meta
+
+def _leg_records(parlay_id: int, legs: List[Dict[str, Any]]) -> List[tuple]:
+    return [
+        (parlay_id, str(leg["match_id"]), leg["sport"], leg["market"], str(leg["selection"]),
+         Decimal(str(leg["odds"])), Decimal(str(leg["ev"])), json.dumps(_leg_metadata(leg)))
+        for leg in legs
+    ]
+
+# Insert parlay and legs into DB (one transaction, legs in a single executemany) and return parlay id
+async def persist_parlay(conn: asyncpg.Connection, user_id: int, mode: str, legs: List[Dict[str, Any]], stake: float) -> Dict[str, Any]:
+    summary = _parlay_summary(mode, legs, stake)
+    async with conn.transaction():
+        row = await conn.fetchrow(_INSERT_PARLAY_SQL, *_parlay_params(user_id, mode, legs, summary))
+        parlay_id = row["id"]
+        if legs:
+            await conn.executemany(_INSERT_LEG_SQL, _leg_records(parlay_id, legs))
+    return {"id": parlay_id, **summary}
+
+async def persist_parlays_bulk(conn: asyncpg.Connection, parlays: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Persist N parlays at once (scheduled pre-generation). Each item is
+    {"user_id", "mode", "legs", "stake"}. All parents go in one INSERT ... SELECT
+    FROM unnest, all legs in one executemany, inside a single transaction.
+    Returns one persist_parlay-style dict per item, in input order.
+    """
+    if not parlays:
+        return []
+    summaries = [_parlay_summary(p["mode"], p["legs"], p["stake"]) for p in parlays]
+    params = [_parlay_params(p["user_id"], p["mode"], p["legs"], s) for p, s in zip(parlays, summaries)]
+    columns = [list(col) for col in zip(*params)]
+    async with conn.transaction():
+        rows = await conn.fetch(_INSERT_PARLAYS_BULK_SQL, *columns)
+        ids = [None] * len(parlays)
+        for r in rows:
+            ids[int(r["ord"]) - 1] = r["id"]
+        records = [rec for pid, p in zip(ids, parlays) for rec in _leg_records(pid, p["legs"])]
+        if records:
+            await conn.executemany(_INSERT_LEG_SQL, records)
+    return [{"id": pid, **s} for pid, s in zip(ids, summaries)]
+
 # Simple stake calc using bankroll percent (can be extended)
 def calc_stake(bankroll: float, stake_pct: float) -> float:
     return round(bankroll * (stake_pct / 100.0), 2)
 
+# Stake from the user's bankroll (users table) or DEFAULT_BANKROLL
+async def fetch_user_stake(conn: asyncpg.Connection, user_id: int) -> float:
+    bankroll_row = await conn.fetchrow("SELECT bankroll FROM users WHERE id=$1", user_id)
+    bankroll = float(bankroll_row["bankroll"]) if bankroll_row and bankroll_row.get("bankroll") else DEFAULT_BANKROLL
+    return calc_stake(bankroll, DEFAULT_STAKE_PCT)
+
+def render_parlay_text(title: str, target_total_odds: float, chosen: List[Dict[str, Any]], persisted: Dict[str, Any], joint_p: float, joint_ev: float) -> str:
+    text_lines = [f"{title} (Cuota objetivo: {target_total_odds})", "Generado automáticamente por BotPicks", ""]
+    text_lines.append(f"Legs seleccionadas: {len(chosen)}")
+    text_lines.append(f"Cuota total: {float(persisted['total_odds']):.2f}")
+    text_lines.append(f"Stake sugerido: ${persisted['stake']} ({DEFAULT_STAKE_PCT}%)\n")
+    for leg in chosen:
+        text_lines.append("-------------------------------------")
+        text_lines.append(f"{leg['sport']} — {leg['home']} vs {leg['away']}")
+        text_lines.append(f"Mercado: {leg['market']}")
+        text_lines.append(f"Pick: {leg['selection']}")
+        text_lines.append(f"Cuota: {leg['odds']:.2f}  EV: {'🟢' if leg['ev']>0 else '🔴'} {leg['ev']:.2f}")
+        text_lines.append(f"Explicación: (heurística) EV {leg['ev']:.2f}")
+    text_lines.append("\n💰 Potencial retorno: ${:.2f}".format(persisted["expected_return"]))
+    text_lines.append(f"📊 Probabilidad estimada: {joint_p * 100:.1f}% (EV conjunto {joint_ev:+.2f})")
+    return "\n".join(text_lines)
+
+def _catalogue_entry(table: CandidateTable, mode: str, target_total_odds: float, max_legs: int, rows: np.ndarray, generated_at: datetime) -> Dict[str, Any]:
+    joint_p, total_odds, joint_ev = (float(x[0]) for x in table.pricer().price([rows]))
+    return {
+        "mode": mode,
+        "target_total_odds": float(target_total_odds),
+        "max_legs": int(max_legs),
+        "legs": table.legs(rows),
+        "total_odds": total_odds,
+        "joint_prob": joint_p,
+        "joint_ev": joint_ev,
+        "generated_at": generated_at,
+    }
+
+def build_catalogue_entries(table: CandidateTable, segurito_targets: Sequence[float], sonador_targets: Sequence[float],
+                            segurito_max_legs: int = SEGURITO_MAX_LEGS, sonador_max_legs: int = SONADOR_MAX_LEGS,
+                            beam_width: int = SONADOR_BEAM_WIDTH) -> List[Dict[str, Any]]:
+    """Pure compute step of the catalogue refresh; in a worker thread pass a table nobody else prices."""
+    now = datetime.now(timezone.utc)
+    entries = [
+        _catalogue_entry(table, "segurito", t, segurito_max_legs, select_segurito_legs(table, t, segurito_max_legs), now)
+        for t in segurito_targets
+    ]
+    entries += [
+        _catalogue_entry(table, "sonador", t, sonador_max_legs, select_sonador_legs(table, t, sonador_max_legs, beam_width), now)
+        for t in sonador_targets
+    ]
+    return entries
+
+async def refresh_parlay_catalogue(db_pool) -> List[Dict[str, Any]]:
+    """
+    Background stage run by the cron worker after an ingest pass: precompute
+    parlays for the common targets and publish them to PARLAY_CATALOGUE.
+    """
+    async with db_pool.acquire() as conn:
+        table = await CANDIDATE_CACHE.get(conn)
+        segurito_targets, sonador_targets = await PARLAY_CATALOGUE.load_targets(conn)
+        # private copy (same columns, own pricer): the worker thread must not fill the
+        # shared snapshot's pricer caches while event-loop requests read them
+        private = replace(table, _pricer=None)
+        entries = await asyncio.to_thread(build_catalogue_entries, private, segurito_targets, sonador_targets)
+        await PARLAY_CATALOGUE.save(conn, entries)
+    return entries
+
 # Greedy Segurito: choose low odds legs until reach target_total_odds or max_legs
-async def generate_parlay_segurito(db_pool, user_id: int, target_total_odds: float = 2.5, max_legs: int = 3) -> Dict[str, Any]:
+async def generate_parlay_segurito(db_pool, user_id: int, target_total_odds: float = 2.5, max_legs: int = SEGURITO_MAX_LEGS) -> Dict[str, Any]:
     async with db_pool.acquire() as conn:
-        candidates = await fetch_candidate_legs(conn)
-        # filter EV>threshold and small odds
-        candidates = [c for c in candidates if c["ev"] >= EV_THRESHOLD and c["odds"] <= 2.5]
-        # sort ascending odds, then by ev desc
-        candidates.sort(key=lambda x: (x["odds"], -x["ev"]))
-        chosen = []
-        current_odds = 1.0
-        used_matches = set()
-        for c in candidates:
-            if len(chosen) >= max_legs:
-                break
-            # allow same match by config in future: for now allow duplicates
-            chosen.append(c)
-            current_odds = product_odds([leg["odds"] for leg in chosen])
-            if current_odds >= target_total_odds and len(chosen) >= 2:
-                break
-        # fallback: if not enough, relax odds filter
-        if product_odds([leg["odds"] for leg in chosen]) < target_total_odds:
-            candidates_relaxed = [c for c in await fetch_candidate_legs(conn) if c["ev"] >= EV_THRESHOLD]
-            candidates_relaxed.sort(key=lambda x: -x["ev"])
-            chosen = []
-            for c in candidates_relaxed:
-                if len(chosen) >= max_legs:
-                    break
-                chosen.append(c)
-                if product_odds([leg["odds"] for leg in chosen]) >= target_total_odds and len(chosen) >= 2:
-                    break
-        # stake calc: fetch user's bankroll from users table if exists
-        bankroll_row = await conn.fetchrow("SELECT bankroll FROM users WHERE id=$1", user_id)
-        bankroll = float(bankroll_row["bankroll"]) if bankroll_row and bankroll_row.get("bankroll") else DEFAULT_BANKROLL
-        stake = calc_stake(bankroll, DEFAULT_STAKE_PCT)
+        # pre-generated catalogue first: a tap becomes lookup + stake personalization
+        entry = await PARLAY_CATALOGUE.lookup(conn, "segurito", target_total_odds, max_legs)
+        if entry is None:
+            table = await CANDIDATE_CACHE.get(conn)
+            entry = _catalogue_entry(table, "segurito", target_total_odds, max_legs,
+                                     select_segurito_legs(table, target_total_odds, max_legs), datetime.now(timezone.utc))
+        chosen = entry["legs"]
+        stake = await fetch_user_stake(conn, user_id)
         persisted = await persist_parlay(conn, user_id, "segurito", chosen, stake)
-        # Build text
-        text_lines = [f"🔥 Parlay Segurito (Cuota objetivo: {target_total_odds})", "Generado automáticamente por BotPicks", ""]
-        text_lines.append(f"Legs seleccionadas: {len(chosen)}")
-        text_lines.append(f"Cuota total: {float(persisted['total_odds']):.2f}")
-        text_lines.append(f"Stake sugerido: ${persisted['stake']} ({DEFAULT_STAKE_PCT}%)\n")
-        for leg in chosen:
-            text_lines.append("-------------------------------------")
-            text_lines.append(f"{leg['sport']} — {leg['home']} vs {leg['away']}")
-            text_lines.append(f"Mercado: {leg['market']}")
-            text_lines.append(f"Pick: {leg['selection']}")
-            text_lines.append(f"Cuota: {leg['odds']:.2f}  EV: {'🟢' if leg['ev']>0 else '🔴'} {leg['ev']:.2f}")
-            text_lines.append(f"Explicación: (heurística) EV {leg['ev']:.2f}")
-        text_lines.append("\n💰 Potencial retorno: ${:.2f}".format(persisted["expected_return"]))
-        text_lines.append("📊 Probabilidad estimada: (calculada internamente)")
-        return {"id": persisted["id"], "text": "\n".join(text_lines), "mode": "segurito"}
+        text = render_parlay_text("🔥 Parlay Segurito", target_total_odds, chosen, persisted, entry["joint_prob"], entry["joint_ev"])
+        return {"id": persisted["id"], "text": text, "mode": "segurito"}
 
 # Beam search Soñador: try combinations to reach high total odds with EV>threshold
-import itertools
-async def generate_parlay_sonador(db_pool, user_id: int, target_total_odds: float = 10.0, max_legs: int = 8, beam_width: int = 200) -> Dict[str, Any]:
+async def generate_parlay_sonador(db_pool, user_id: int, target_total_odds: float = 10.0, max_legs: int = SONADOR_MAX_LEGS, beam_width: int = SONADOR_BEAM_WIDTH) -> Dict[str, Any]:
     async with db_pool.acquire() as conn:
-        candidates = await fetch_candidate_legs(conn)
-        candidates = [c for c in candidates if c["ev"] >= EV_THRESHOLD and c["odds"] > 1.2]
-        # sort by ev desc and odds desc to prioritize high momio+edge
-        candidates.sort(key=lambda x: (-x["ev"], -x["odds"]))
-        # Limit candidates to top-N to avoid explosion
-        candidates = candidates[:min(len(candidates), 60)]
-        # Beam search across increasing lengths up to max_legs
-        best_combo = None
-        best_odds = 0.0
-        beam = [([], 1.0)]
-        for _ in range(1, min(max_legs, 8) + 1):
-            new_beam = []
-            for combo, combo_odds in beam:
-                for c in candidates:
-                    if c in combo:
-                        continue
-                    new_combo = combo + [c]
-                    new_odds = combo_odds * c["odds"]
-                    if new_odds >= target_total_odds:
-                        # prefer combos with higher aggregated EV sum and higher odds
-                        ev_sum = sum([x["ev"] for x in new_combo])
-                        score = (new_odds * (1 + ev_sum))
-                        if new_odds > best_odds:
-                            best_combo = new_combo
-                            best_odds = new_odds
-                    new_beam.append((new_combo, new_odds))
-            # keep top beam_width by odds * sum(ev)
-            new_beam.sort(key=lambda tup: - (tup[1] * (1 + sum(x["ev"] for x in tup[0]))))
-            beam = new_beam[:beam_width]
-            if best_combo:
-                break
-        chosen = best_combo if best_combo else (beam[0][0] if beam else [])
-        # stake calc
-        bankroll_row = await conn.fetchrow("SELECT bankroll FROM users WHERE id=$1", user_id)
-        bankroll = float(bankroll_row["bankroll"]) if bankroll_row and bankroll_row.get("bankroll") else DEFAULT_BANKROLL
-        stake = calc_stake(bankroll, DEFAULT_STAKE_PCT)
+        entry = await PARLAY_CATALOGUE.lookup(conn, "sonador", target_total_odds, max_legs) if beam_width == SONADOR_BEAM_WIDTH else None
+        if entry is None:
+            table = await CANDIDATE_CACHE.get(conn)
+            entry = _catalogue_entry(table, "sonador", target_total_odds, max_legs,
+                                     select_sonador_legs(table, target_total_odds, max_legs, beam_width), datetime.now(timezone.utc))
+        chosen = entry["legs"]
+        stake = await fetch_user_stake(conn, user_id)
         persisted = await persist_parlay(conn, user_id, "sonador", chosen, stake)
-        # Build text
-        text_lines = [f"💥 Parlay Soñador (Cuota objetivo: {target_total_odds})", "Generado automáticamente por BotPicks", ""]
-        text_lines.append(f"Legs seleccionadas: {len(chosen)}")
-        text_lines.append(f"Cuota total: {float(persisted['total_odds']):.2f}")
-        text_lines.append(f"Stake sugerido: ${persisted['stake']} ({DEFAULT_STAKE_PCT}%)\n")
-        for leg in chosen:
-            text_lines.append("-------------------------------------")
-            text_lines.append(f"{leg['sport']} — {leg['home']} vs {leg['away']}")
-            text_lines.append(f"Mercado: {leg['market']}")
-            text_lines.append(f"Pick: {leg['selection']}")
-            text_lines.append(f"Cuota: {leg['odds']:.2f}  EV: {'🟢' if leg['ev']>0 else '🔴'} {leg['ev']:.2f}")
-            text_lines.append(f"Explicación: (heurística) EV {leg['ev']:.2f}")
-        text_lines.append("\n💰 Potencial retorno: ${:.2f}".format(persisted["expected_return"]))
-        text_lines.append("📊 Probabilidad estimada: (calculada internamente)")
-        return {"id": persisted["id"], "text": "\n".join(text_lines), "mode": "sonador"}
+        text = render_parlay_text("💥 Parlay Soñador", target_total_odds, chosen, persisted, entry["joint_prob"], entry["joint_ev"])
+        return {"id": persisted["id"], "text": text, "mode": "sonador"}
@@ -0,0 +1,212 @@
+# src/parlay/pricing.py
+"""
+Precio conjunto de parlays (probabilidad de acierto y EV) con Monte Carlo.
+- por partido, un modelo Poisson de marcador ajustado a sus cuotas
+  (Over/Under y Moneyline sin vig)
+- cada leg se liquida sobre PRICING_SIMULATIONS marcadores y se guarda como vector de bits:
+  legs del mismo partido quedan correlacionadas, las de partidos distintos no
+- EV = retorno bruto medio por simulación - 1 (incluye push y medias líneas)
+- semilla por partido (PRICING_SEED + match_id): precios reproducibles
+"""
+
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.parlay.evaluator import (
+    parse_leg, encode_legs, evaluate_legs_bulk, payout_multiplier, RESULT_WIN, RESULT_LOSS, RESULT_UNKNOWN,
+)
+
+PRICING_SIMULATIONS = int(os.getenv("PRICING_SIMULATIONS", "4096"))
+PRICING_SEED = int(os.getenv("PRICING_SEED", "20240601"))
+
+# Expected total score per match when no Over/Under line is available
+DEFAULT_TOTAL_RATE: Dict[str, float] = {
+    "soccer": 2.6,
+    "football": 2.6,  # api-sports uses 'football' for soccer
+    "efutbol": 2.6,
+    "hockey": 5.8,
+    "icehockey": 5.8,
+    "baseball": 8.8,
+    "basketball": 220.0,
+    "americanfootball": 44.0,
+    "esports": 2.5,
+}
+FALLBACK_TOTAL_RATE = 2.6
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+def _sport_rate(sport: Optional[str]) -> float:
+    key = (sport or "").lower()
+    for prefix, rate in DEFAULT_TOTAL_RATE.items():
+        if key.startswith(prefix):
+            return rate
+    return FALLBACK_TOTAL_RATE
+
+def _poisson_pmf(mus: np.ndarray, kmax: int) -> np.ndarray:
+    """pmf[i, k] = P(Poisson(mus[i]) == k) for k in [0, kmax], computed in log space."""
+    k = np.arange(kmax + 1)
+    log_fact = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, kmax + 1)))))
+    mus = np.maximum(np.asarray(mus, dtype=np.float64), 1e-9)[:, None]
+    return np.exp(-mus + k[None, :] * np.log(mus) - log_fact[None, :])
+
+def _kmax(mu: float) -> int:
+    return int(mu + 8.0 * np.sqrt(mu) + 10)
+
+def fit_total_rate(line: float, p_over: float) -> float:
+    """Total rate mu with P(Poisson(mu) > line) closest to p_over."""
+    mus = max(line, 0.5) * np.linspace(0.4, 1.8, 281)
+    pmf = _poisson_pmf(mus, _kmax(mus[-1]))
+    p = 1.0 - pmf[:, : int(np.floor(line)) + 1].sum(axis=1)
+    return float(mus[np.argmin(np.abs(p - p_over))])
+
+def fit_home_share(mu: float, p_home_no_draw: float) -> float:
+    """Share s of mu scored by home so that P(H>A | no draw) matches the moneyline."""
+    shares = np.linspace(0.05, 0.95, 181)
+    kmax = _kmax(mu)
+    pmf_h = _poisson_pmf(shares * mu, kmax)
+    pmf_a = _poisson_pmf((1.0 - shares) * mu, kmax)
+    cdf_h = np.cumsum(pmf_h, axis=1)
+    cdf_a = np.cumsum(pmf_a, axis=1)
+    p_home = (pmf_a * (1.0 - cdf_h)).sum(axis=1)
+    p_away = (pmf_h * (1.0 - cdf_a)).sum(axis=1)
+    ratio = p_home / np.maximum(p_home + p_away, 1e-12)
+    return float(shares[np.argmin(np.abs(ratio - p_home_no_draw))])
+
+class ParlayPricer:
+    """Joint pricing of leg sets drawn from one CandidateTable (rows are table row indices)."""
+
+    def __init__(self, table, n_sims: int = PRICING_SIMULATIONS, seed: int = PRICING_SEED):
+        self.table = table
+        self.n_sims = max(8, int(n_sims))
+        self.seed = seed
+        self._rows_by_match: Optional[Dict[int, np.ndarray]] = None
+        self._scores: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._packed: Dict[int, np.ndarray] = {}
+        self._mult: Dict[int, np.ndarray] = {}  # rows that can push / half-settle
+        self._log_odds = np.log(table.odds)
+
+    # --- per match model -------------------------------------------------
+    def _match_rows(self, mi: int) -> np.ndarray:
+        if self._rows_by_match is None:
+            order = np.argsort(self.table.match_idx, kind="stable")
+            bounds = np.flatnonzero(np.diff(self.table.match_idx[order])) + 1
+            self._rows_by_match = {int(self.table.match_idx[g[0]]): g for g in np.split(order, bounds) if g.size}
+        return self._rows_by_match.get(mi, np.empty(0, dtype=np.int64))
+
+    def _parse(self, row: int) -> Optional[Dict[str, Any]]:
+        t = self.table
+        match = t.matches[t.match_idx[row]]
+        return parse_leg(t.markets[t.market_id[row]], t.selections[t.selection_id[row]], match.get("home"), match.get("away"))
+
+    def match_model(self, mi: int) -> Tuple[float, float]:
+        """(home rate, away rate) fitted from the match's own Moneyline and Over/Under odds."""
+        ml: Dict[str, List[float]] = {}
+        totals: Dict[float, Dict[str, List[float]]] = {}
+        for row in self._match_rows(mi):
+            parsed = self._parse(int(row))
+            if not parsed:
+                continue
+            ip = 1.0 / float(self.table.odds[row])
+            if parsed["type"] == "moneyline":
+                ml.setdefault(parsed["side"], []).append(ip)
+            elif parsed["type"] == "over_under":
+                totals.setdefault(parsed["line"], {}).setdefault(parsed["side"], []).append(ip)
+        mu = _sport_rate(self.table.matches[mi].get("sport"))
+        if totals:
+            # prefer a line quoted on both sides so the margin can be removed
+            line = max(totals, key=lambda ln: (len(totals[ln]), len(totals[ln].get("over", []))))
+            over = np.mean(totals[line]["over"]) if "over" in totals[line] else None
+            under = np.mean(totals[line]["under"]) if "under" in totals[line] else None
+            if over is not None and under is not None:
+                p_over = over / (over + under)
+            else:
+                p_over = over if over is not None else 1.0 - under
+            mu = fit_total_rate(line, float(np.clip(p_over, 0.02, 0.98)))
+        share = 0.5
+        if "home" in ml and "away" in ml:
+            ph, pa = np.mean(ml["home"]), np.mean(ml["away"])
+            share = fit_home_share(mu, float(ph / (ph + pa)))
+        return share * mu, (1.0 - share) * mu
+
+    def _rng(self, *parts: Any) -> np.random.Generator:
+        return np.random.default_rng([self.seed] + [zlib.crc32(str(p).encode("utf-8")) for p in parts])
+
+    def match_scores(self, mi: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Simulated (home, away) scorelines for match mi, drawn once and reused by every combo."""
+        if mi not in self._scores:
+            lam_h, lam_a = self.match_model(mi)
+            rng = self._rng(self.table.matches[mi]["match_id"])
+            self._scores[mi] = (rng.poisson(lam_h, self.n_sims), rng.poisson(lam_a, self.n_sims))
+        return self._scores[mi]
+
+    # --- per leg bit vectors ---------------------------------------------
+    def _settle(self, row: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Per-draw 'stake not lost' flags, plus gross multipliers when the leg is not plain win/loss."""
+        mi = int(self.table.match_idx[row])
+        parsed = self._parse(row)
+        if parsed:
+            match = self.table.matches[mi]
+            home, away = self.match_scores(mi)
+            # settle the leg on every simulated scoreline with the evaluator's bulk path
+            res = evaluate_legs_bulk(encode_legs([parsed], [match]), home, away)
+            if not np.all(res == RESULT_UNKNOWN):
+                if np.all((res == RESULT_WIN) | (res == RESULT_LOSS)):
+                    return res == RESULT_WIN, None
+                mult = payout_multiplier(res, float(self.table.odds[row]))
+                return mult >= 1.0, mult
+        # unsupported market: independent Bernoulli with the leg's p_hat
+        rng = self._rng(self.table.matches[mi]["match_id"], row)
+        return rng.random(self.n_sims) < float(self.table.p_hat[row]), None
+
+    def packed(self, rows: Sequence[int]) -> np.ndarray:
+        """Packed bit vectors (len(rows), n_sims/8) for table rows, computed once per row."""
+        for row in rows:
+            row = int(row)
+            if row not in self._packed:
+                hits, mult = self._settle(row)
+                self._packed[row] = np.packbits(hits)
+                if mult is not None:
+                    self._mult[row] = mult
+        return np.stack([self._packed[int(r)] for r in rows]) if len(rows) else np.empty((0, 0), np.uint8)
+
+    def multipliers(self, row: int) -> np.ndarray:
+        """Gross return per draw of one leg (after packed())."""
+        if row in self._mult:
+            return self._mult[row]
+        hits = np.unpackbits(self._packed[row], count=self.n_sims)
+        return hits * float(self.table.odds[row])
+
+    def leg_probability(self, rows: Sequence[int]) -> np.ndarray:
+        bits = self.packed(rows)
+        return _POPCOUNT[bits].sum(axis=1) / self.n_sims
+
+    # --- combos ----------------------------------------------------------
+    def price(self, combos: Sequence[Sequence[int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Joint probability (no leg loses), total odds and EV per unit stake for
+        each combo of table rows. Combos of equal length are priced in one batch.
+        """
+        n = len(combos)
+        p = np.ones(n)
+        total_odds = np.ones(n)
+        by_len: Dict[int, List[int]] = {}
+        for i, combo in enumerate(combos):
+            by_len.setdefault(len(combo), []).append(i)
+        needed = np.asarray(sorted({int(r) for combo in combos for r in combo}), dtype=np.int64)
+        bank = self.packed(needed)
+        for k, members in by_len.items():
+            if k == 0:
+                continue
+            rows = np.asarray([list(combos[i]) for i in members], dtype=np.int64)
+            bits = bank[np.searchsorted(needed, rows)]
+            joint = np.bitwise_and.reduce(bits, axis=1)
+            p[members] = _POPCOUNT[joint].sum(axis=1) / self.n_sims
+            total_odds[members] = np.exp(self._log_odds[rows].sum(axis=1))
+        ev = p * total_odds - 1.0
+        for i, combo in enumerate(combos):
+            if any(int(r) in self._mult for r in combo):
+                ev[i] = float(np.prod([self.multipliers(int(r)) for r in combo], axis=0).mean()) - 1.0
+        return p, total_odds, ev
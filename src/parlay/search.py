@@ -0,0 +1,167 @@
+# src/parlay/search.py
+"""
+Motor de búsqueda combinatoria (beam search) para el Parlay Soñador.
+- combos = tuplas ordenadas de candidatos, con log-odds y EV en punto fijo
+  (resultado determinista)
+- por profundidad se expande todo el beam con NumPy; se podan los hijos que repiten partido,
+  no alcanzan la cuota objetivo o cuya cota superior de score queda bajo el mejor hijo
+- sobreviven los `beam_width` mejores sets (empates por la tupla de legs)
+"""
+
+import math
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LOG_SCALE = float(2 ** 32)  # fixed-point resolution for log-odds
+EV_SCALE = 1e9              # fixed-point resolution for EV sums
+MAX_DEPTH = 8
+
+def _fixed(values: np.ndarray, scale: float) -> np.ndarray:
+    return np.rint(np.asarray(values, dtype=np.float64) * scale).astype(np.int64)
+
+def _score(log_odds: np.ndarray, ev_sum: np.ndarray) -> np.ndarray:
+    # odds * (1 + sum(ev)), the ranking used by the original beam search
+    return np.exp(log_odds / LOG_SCALE) * (1.0 + ev_sum / EV_SCALE)
+
+def _reach_bound(values: np.ndarray, max_depth: int) -> np.ndarray:
+    """bound[r] = largest sum any r extra legs can add (ignores the one-per-match rule)."""
+    top = np.sort(np.maximum(values, 0))[::-1][:max_depth]
+    return np.concatenate(([0], np.cumsum(top), np.repeat(top.sum(), max(0, max_depth - top.size))))
+
+def beam_search(
+    odds: Sequence[float],
+    ev: Sequence[float],
+    match_idx: Optional[Sequence[int]] = None,
+    target_total_odds: float = 10.0,
+    max_legs: int = MAX_DEPTH,
+    beam_width: int = 200,
+    max_legs_per_match: int = 1,
+    return_beam: bool = False,
+    rescore: Optional[Callable[[List[Tuple[int, ...]]], np.ndarray]] = None,
+):
+    """
+    Search leg sets whose product of odds reaches target_total_odds.
+
+    Stops at the first depth where some set reaches the target and returns the
+    one with the highest odds. If none does, returns the best scoring set of the
+    last beam. Returns a sorted tuple of positions into `odds`; with
+    return_beam=True returns (best, hits, beam) where hits are every set that
+    reached the target at that depth, ordered by score.
+
+    rescore(leg sets) -> scores replaces the independent score when the beam is
+    cut: from depth 2 on, the top 2 * beam_width children are re-ranked with it
+    (e.g. joint odds * (1 + joint EV) from the Monte Carlo pricer).
+    """
+    n = len(odds)
+    empty: Tuple[int, ...] = ()
+    if n == 0 or max_legs <= 0 or beam_width <= 0:
+        return (empty, [], []) if return_beam else empty
+    lo = _fixed(np.log(np.asarray(odds, dtype=np.float64)), LOG_SCALE)
+    evf = _fixed(ev, EV_SCALE)
+    if match_idx is None:
+        match_idx = np.arange(n)
+    # dense match ids so per-match counters fit a small matrix
+    _, match_of = np.unique(np.asarray(match_idx), return_inverse=True)
+    n_matches = int(match_of.max()) + 1
+    depth_limit = min(max_legs, MAX_DEPTH)
+    target_lo = int(math.ceil(math.log(target_total_odds) * LOG_SCALE)) if target_total_odds > 0 else -(2 ** 62)
+    bound = _reach_bound(lo, depth_limit)
+    ev_bound = _reach_bound(evf, depth_limit)
+    # if even the best legs cannot reach the target, keep the beam unpruned for the fallback
+    prune = bound[depth_limit] >= target_lo
+    # with odds >= 1 and EV >= 0 a set's score only grows with more legs, so a child whose
+    # best completion scores below the best child of the same depth can never win
+    prune_ev = bool((lo >= 0).all() and (evf >= 0).all())
+
+    combos: List[Tuple[int, ...]] = [empty]
+    beam_lo = np.zeros(1, dtype=np.int64)
+    beam_ev = np.zeros(1, dtype=np.int64)
+    in_combo = np.zeros((1, n), dtype=bool)
+    per_match = np.zeros((1, n_matches), dtype=np.int16)
+    fallback: Tuple[int, ...] = empty
+
+    for depth in range(1, depth_limit + 1):
+        child_lo = beam_lo[:, None] + lo[None, :]
+        child_ev = beam_ev[:, None] + evf[None, :]
+        valid = ~in_combo & (per_match[:, match_of] < max_legs_per_match)
+        if prune:
+            valid &= child_lo + bound[depth_limit - depth] >= target_lo
+        parents, legs = np.nonzero(valid)
+        if parents.size == 0:
+            break
+        c_lo = child_lo[parents, legs]
+        c_ev = child_ev[parents, legs]
+        c_score = _score(c_lo, c_ev)
+
+        hit = np.flatnonzero(c_lo >= target_lo)
+        if hit.size:
+            hits = _distinct(combos, parents[hit], legs[hit], c_score[hit], c_lo[hit], limit=None)
+            best = max(hits, key=lambda h: (h[2], _neg(h[0])))[0]
+            if return_beam:
+                return best, [h[0] for h in hits], combos
+            return best
+
+        left = depth_limit - depth
+        if prune_ev and left:
+            upper = _score(c_lo + bound[left], c_ev + ev_bound[left])
+            keep = np.flatnonzero(upper >= c_score.max())
+            parents, legs, c_lo, c_ev, c_score = parents[keep], legs[keep], c_lo[keep], c_ev[keep], c_score[keep]
+        if rescore is not None and depth > 1:
+            kept = _rescored(_distinct(combos, parents, legs, c_score, c_lo, limit=2 * beam_width), rescore)[:beam_width]
+        else:
+            kept = _distinct(combos, parents, legs, c_score, c_lo, limit=beam_width)
+        rows = [k[3] for k in kept]
+        combos = [k[0] for k in kept]
+        beam_lo = c_lo[rows]
+        beam_ev = c_ev[rows]
+        in_combo = np.zeros((len(combos), n), dtype=bool)
+        per_match = np.zeros((len(combos), n_matches), dtype=np.int16)
+        for r, combo in enumerate(combos):
+            idx = list(combo)
+            in_combo[r, idx] = True
+            np.add.at(per_match[r], match_of[idx], 1)
+        fallback = combos[0]
+
+    if return_beam:
+        return fallback, [], combos
+    return fallback
+
+def _neg(combo: Tuple[int, ...]) -> Tuple[int, ...]:
+    # max() helper: prefer the lexicographically smallest tuple on equal keys
+    return tuple(-i for i in combo)
+
+def _rescored(entries, rescore):
+    """_distinct() entries re-ranked by rescore(leg sets), ties broken by the sorted legs."""
+    if not entries:
+        return entries
+    scores = np.asarray(rescore([e[0] for e in entries]), dtype=np.float64)
+    out = [(e[0], float(s), e[2], e[3]) for e, s in zip(entries, scores)]
+    return sorted(out, key=lambda t: (-t[1], t[0]))
+
+def _distinct(combos, parents, legs, scores, c_lo, limit: Optional[int]):
+    """
+    Distinct child leg sets ordered by (-score, sorted legs). Returns tuples
+    (legs, score, log_odds, row) where row indexes the flattened child arrays.
+    When `limit` is set only the top `limit` sets are materialized.
+    """
+    total = scores.size
+    if limit is None or limit >= total:
+        order = np.argsort(-scores, kind="stable")
+    else:
+        # a set appears at most once per leg, so depth * limit rows always hold `limit` distinct sets
+        depth = len(combos[0]) + 1
+        k = min(total, depth * limit)
+        part = np.argpartition(-scores, k - 1)[:k]
+        cutoff = scores[part].min()
+        # pull in every row tied with the cutoff so tie-breaking stays canonical
+        part = np.flatnonzero(scores >= cutoff)
+        order = part[np.argsort(-scores[part], kind="stable")]
+    seen = {}
+    for row in order:
+        row = int(row)
+        key = tuple(sorted(combos[parents[row]] + (int(legs[row]),)))
+        if key not in seen:
+            seen[key] = (key, float(scores[row]), int(c_lo[row]), row)
+    out = sorted(seen.values(), key=lambda t: (-t[1], t[0]))
+    return out if limit is None else out[:limit]
@@ -0,0 +1,316 @@
+# src/utils/ratelimit.py
+"""
+Token buckets para limitar el ritmo de llamadas (Telegram, proveedores de cuotas).
+- TokenBucket: try_acquire() no bloquea y devuelve la espera; pause() tras un 429
+- KeyedBuckets: un bucket por clave (chat_id, host...) con desalojo LRU
+- QuotaLimiter (shared_limiter()): cuotas de API-Sports, the-odds-api y PandaScore
+  leídas de los headers y persistidas entre corridas
+"""
+
+import os
+import json
+import time
+import atexit
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available and return 0.0, else return the seconds to wait."""
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (tokens - self.tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """No tokens until `seconds` from now; the bucket restarts empty."""
+        now = self.clock()
+        self.paused_until = max(self.paused_until, now + max(0.0, seconds))
+        self.tokens = 0.0
+        self.updated = self.paused_until
+
+class KeyedBuckets:
+    def __init__(self, rate: float, capacity: Optional[float] = None, max_keys: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max(1, max_keys)
+        self.clock = clock
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def get(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.capacity, clock=self.clock)
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+# --- provider quotas -----------------------------------------------------------
+# QuotaLimiter: one TokenBucket per provider (per_minute) plus the period quota
+# reported by the provider's headers. It is the only place that reads those
+# headers: the the-odds-api slug planner and the poll scheduler ask it for the
+# budget. Requests wait for a token; budget() is what is left above the
+# provider's reserve, in requests of the last reported cost (the-odds-api
+# charges markets x regions credits). At zero, acquire() raises QuotaExhausted
+# until the period resets (next UTC hour/day/month) or, with probe_interval, one
+# request re-reads a count that may be stale, instead of spending the last
+# requests and collecting 429s. The remaining counts, reset times and 429
+# pauses are saved to RATE_LIMIT_STATE (JSON) so consecutive cron / GitHub
+# Actions runs share the same budget.
+
+RATE_LIMIT_STATE = os.getenv("RATE_LIMIT_STATE", os.path.join(os.path.dirname(__file__), "..", "..", "data", "ratelimit_state.json"))
+RATE_LIMIT_SAVE_INTERVAL = float(os.getenv("RATE_LIMIT_SAVE_INTERVAL", "10"))
+PROVIDER_LIMITS: Dict[str, Dict[str, float]] = json.loads(os.getenv("PROVIDER_LIMITS", json.dumps({
+    "apisports": {"per_minute": 10, "reserve": 5},
+    "oddsapi": {"per_minute": 30, "reserve": int(os.getenv("ODDSAPI_RESERVE", "50")),
+                "probe_interval": float(os.getenv("ODDSAPI_PROBE_INTERVAL", "3600"))},
+    "pandascore": {"per_minute": 15, "reserve": 20},
+})))
+
+# header (lower case) -> period of the remaining count it reports
+_PERIOD_HEADERS = (
+    ("x-ratelimit-requests-remaining", "day"),  # API-Sports, daily
+    ("x-requests-remaining", "month"),          # the-odds-api, monthly credits
+    ("x-rate-limit-remaining", "hour"),         # PandaScore, hourly
+)
+_MINUTE_HEADER = "x-ratelimit-remaining"        # API-Sports, per minute
+_COST_HEADER = "x-requests-last"                # the-odds-api, credits of the last request
+
+class QuotaExhausted(Exception):
+    def __init__(self, provider: str, reset_at: Optional[float]):
+        when = datetime.fromtimestamp(reset_at, tz=timezone.utc).isoformat() if reset_at else "unknown"
+        super().__init__(f"{provider} quota exhausted until {when}")
+        self.provider = provider
+        self.reset_at = reset_at
+
+def _next_reset(now: float, period: str) -> float:
+    dt = datetime.fromtimestamp(now, tz=timezone.utc)
+    if period == "hour":
+        start = dt.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    elif period == "month":
+        # calendar month; a billing cycle on another day is caught by probe_interval
+        start = dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        start = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    else:
+        start = dt.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return start.timestamp()
+
+class QuotaLimiter:
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None, path: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.limits = PROVIDER_LIMITS if limits is None else limits
+        self.path = path
+        self.clock = clock
+        self.buckets: Dict[str, TokenBucket] = {}
+        # provider -> {"remaining": int|None, "reset_at": epoch|None}
+        self.quota: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        self._dirty = False
+        self.waits = 0
+        if path:
+            self.load()
+
+    def _bucket(self, provider: str) -> TokenBucket:
+        b = self.buckets.get(provider)
+        if b is None:
+            per_minute = float(self.limits.get(provider, {}).get("per_minute") or 0)
+            # unknown providers: no per-minute limit
+            b = TokenBucket(per_minute / 60.0 if per_minute else 1e9, capacity=per_minute or 1e9, clock=self.clock)
+            self.buckets[provider] = b
+        return b
+
+    def _quota(self, provider: str) -> Dict[str, Any]:
+        q = self.quota.setdefault(provider, {"remaining": None, "reset_at": None, "cost": 1, "updated_at": None})
+        if q["reset_at"] is not None and self.clock() >= q["reset_at"]:
+            q["remaining"], q["reset_at"] = None, None
+        return q
+
+    def remaining(self, provider: str) -> Optional[int]:
+        """Last reported count for the current period (None = unknown yet)."""
+        return self._quota(provider)["remaining"]
+
+    def cost(self, provider: str) -> int:
+        """Units one request spends (the-odds-api: credits of the last request)."""
+        return self._quota(provider)["cost"]
+
+    def budget(self, provider: str) -> Optional[int]:
+        """Requests left above the reserve (None = quota unknown yet, no limit)."""
+        q = self._quota(provider)
+        if q["remaining"] is None:
+            return None
+        limits = self.limits.get(provider, {})
+        n = max(0, int((q["remaining"] - limits.get("reserve", 0)) // max(1, q["cost"])))
+        probe = limits.get("probe_interval")
+        if n == 0 and probe and self.clock() - (q["updated_at"] or 0.0) >= probe:
+            return 1  # stale count: one request re-reads it
+        return n
+
+    def exhausted(self, provider: str) -> bool:
+        return self.budget(provider) == 0
+
+    def resume_at(self, provider: str) -> Optional[float]:
+        """When an exhausted provider may be asked again (period reset or next probe)."""
+        if not self.exhausted(provider):
+            return None
+        q = self._quota(provider)
+        probe = self.limits.get(provider, {}).get("probe_interval")
+        times = [t for t in (q["reset_at"], (q["updated_at"] or 0.0) + probe if probe else None) if t is not None]
+        return min(times) if times else None
+
+    def _take(self, provider: str) -> float:
+        with self._lock:
+            if self.exhausted(provider):
+                raise QuotaExhausted(provider, self.resume_at(provider))
+            wait = self._bucket(provider).try_acquire()
+            if wait <= 0:
+                self._dirty = True
+                q = self._quota(provider)
+                if q["remaining"] is not None:
+                    q["remaining"] -= q["cost"]  # corrected by the next response headers
+                    q["updated_at"] = self.clock()
+            return wait
+
+    async def acquire(self, provider: str) -> None:
+        while True:
+            wait = self._take(provider)
+            if wait <= 0:
+                return
+            self.waits += 1
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, provider: str) -> None:
+        while True:
+            wait = self._take(provider)
+            if wait <= 0:
+                return
+            self.waits += 1
+            time.sleep(wait)
+
+    def update(self, provider: str, headers) -> None:
+        """Read the provider's rate-limit headers from a response."""
+        h = {str(k).lower(): v for k, v in (headers or {}).items()}
+        now = self.clock()
+        with self._lock:
+            self._dirty = True
+            for name, period in _PERIOD_HEADERS:
+                remaining = _to_int(h.get(name))
+                if remaining is not None:
+                    q = self._quota(provider)
+                    q["remaining"] = remaining
+                    q["reset_at"] = _next_reset(now, period)
+                    q["updated_at"] = now
+                    break
+            cost = _to_int(h.get(_COST_HEADER))
+            if cost:
+                self._quota(provider)["cost"] = cost
+            minute = _to_int(h.get(_MINUTE_HEADER))
+            if minute is not None:
+                b = self._bucket(provider)
+                b._refill(now)
+                b.tokens = min(b.tokens, float(minute))
+                if minute <= 0:
+                    b.pause(60 - (now % 60))
+        if self.path and now - self._saved_at >= RATE_LIMIT_SAVE_INTERVAL:
+            self.save()
+
+    def penalize(self, provider: str, retry_after: Optional[float] = None) -> None:
+        """After a 429: no requests to the provider for retry_after seconds (default 60)."""
+        with self._lock:
+            self._dirty = True
+            self._bucket(provider).pause(60.0 if retry_after is None else float(retry_after))
+
+    def state(self) -> Dict[str, Any]:
+        out = {}
+        for provider in set(self.quota) | set(self.buckets):
+            q = self._quota(provider)
+            b = self.buckets.get(provider)
+            out[provider] = {"remaining": q["remaining"], "reset_at": q["reset_at"], "cost": q["cost"],
+                             "updated_at": q["updated_at"], "paused_until": b.paused_until if b else 0.0}
+        return out
+
+    def save(self) -> None:
+        if not self.path or not self._dirty:
+            return
+        self._saved_at = self.clock()
+        self._dirty = False
+        try:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"saved_at": self._saved_at, "providers": self.state()}, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("rate limit state not saved:", e)
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for provider, st in (data.get("providers") or {}).items():
+            self.quota[provider] = {"remaining": st.get("remaining"), "reset_at": st.get("reset_at"),
+                                    "cost": st.get("cost") or 1, "updated_at": st.get("updated_at")}
+            self._quota(provider)  # drops expired periods
+            paused = float(st.get("paused_until") or 0.0)
+            if paused > self.clock():
+                self._bucket(provider).pause(paused - self.clock())
+
+def retry_after(headers) -> Optional[float]:
+    """Seconds from a Retry-After header (None when missing or an HTTP date)."""
+    value = (headers or {}).get("Retry-After") or (headers or {}).get("retry-after")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+_SHARED: Optional[QuotaLimiter] = None
+
+def shared_limiter() -> QuotaLimiter:
+    """Process-wide limiter backed by RATE_LIMIT_STATE, saved again at exit."""
+    global _SHARED
+    if _SHARED is None:
+        _SHARED = QuotaLimiter(path=RATE_LIMIT_STATE)
+        atexit.register(_SHARED.save)
+    return _SHARED
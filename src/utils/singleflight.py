@@ -0,0 +1,160 @@
+# src/utils/singleflight.py
+"""
+Single-flight: llamadas concurrentes con la misma clave comparten un solo fetch.
+SingleFlight (hilos) y AsyncSingleFlight (corutinas, por event loop); coalesce()
+decora funciones sync o async. No guarda nada al terminar (eso es de la caché HTTP).
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def snapshot(self, in_flight: int) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": in_flight,
+            "coalesced_ratio": self.coalesced / self.calls if self.calls else 0.0,
+        }
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._n = _Counters()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, clone: Optional[Callable[[Any], Any]] = None, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) unless a call with `key` is in flight. With clone, the
+        shared result stays untouched and every caller (leader included) gets clone(result).
+        """
+        with self._lock:
+            self._n.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._n.executions += 1
+            else:
+                self._n.coalesced += 1
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+                with self._lock:
+                    self._n.errors += 1
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return clone(call.result) if clone else call.result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._n.snapshot(len(self._calls))
+
+class AsyncSingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._n = _Counters()
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args,
+                 clone: Optional[Callable[[Any], Any]] = None, **kwargs) -> Any:
+        """
+        Await fn(*args, **kwargs) unless a call with `key` is in flight on this loop.
+        If the leader is cancelled, a waiting follower takes over as the new leader.
+        """
+        loop = asyncio.get_running_loop()
+        k = (id(loop), key)  # futures are bound to their loop
+        self._n.calls += 1
+        while True:
+            fut = self._calls.get(k)
+            if fut is None:
+                break
+            self._n.coalesced += 1
+            try:
+                # shield: a cancelled follower must not cancel the leader's fetch
+                result = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                # shield keeps fut alive when only this follower is cancelled
+                if fut.cancelled():
+                    self._n.coalesced -= 1
+                    continue  # the leader was cancelled, not us: retry
+                raise
+            return clone(result) if clone else result
+        fut = self._calls[k] = loop.create_future()
+        self._n.executions += 1
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            self._n.errors += 1
+            fut.set_exception(e)
+            fut.exception()  # followers re-raise it; avoid "exception never retrieved"
+            raise
+        else:
+            fut.set_result(result)
+            return clone(result) if clone else result
+        finally:
+            self._calls.pop(k, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._n.snapshot(len(self._calls))
+
+# module-level groups shared by the ingest clients
+SYNC_GROUP = SingleFlight()
+ASYNC_GROUP = AsyncSingleFlight()
+
+def default_key(fn: Callable, args, kwargs) -> Hashable:
+    # repr() so dict/list arguments (params) can be part of the key
+    return (fn.__module__, fn.__qualname__, repr(args), repr(sorted(kwargs.items())))
+
+def coalesce(key: Optional[Callable[..., Hashable]] = None, clone: Optional[Callable[[Any], Any]] = None):
+    """
+    Decorator: concurrent calls with the same key share one execution.
+    key(*args, **kwargs) -> hashable; clone gives every caller its own copy of a mutable result.
+    """
+    def deco(fn):
+        def make_key(args, kwargs):
+            return key(*args, **kwargs) if key else default_key(fn, args, kwargs)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                return await ASYNC_GROUP.do(make_key(args, kwargs), fn, *args, clone=clone, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return SYNC_GROUP.do(make_key(args, kwargs), fn, *args, clone=clone, **kwargs)
+        return wrapper
+    return deco
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {"sync": SYNC_GROUP.stats(), "async": ASYNC_GROUP.stats()}
@@ -0,0 +1,129 @@
+# src/worker/changes.py
+"""
+Detección de cambios en la ingesta (digest de mercados por partido).
+MarketsDigests guarda por match_id el digest de los mercados normalizados
+(match_cache.markets_hash) y sus cuotas:
+- diff(batch): partidos con mercados, sport o start_time distintos y sus deltas de cuota
+- commit(changed): los registra tras un upsert correcto
+- prime(rows): digests guardados tras un reinicio (su primer cambio va sin deltas)
+"""
+
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+ODDS_DECIMALS = int(os.getenv("ODDS_DECIMALS", "3"))
+# matches remembered in memory (least recently changed dropped first)
+MARKETS_DIGEST_MAX = int(os.getenv("MARKETS_DIGEST_MAX", "50000"))
+
+OddsKey = Tuple[str, str]  # (market, selection), normalized
+
+@dataclass(frozen=True)
+class OddsDelta:
+    match_id: str
+    market: str
+    selection: str
+    old_odds: Optional[float]  # None: new selection
+    new_odds: Optional[float]  # None: selection removed
+
+def _norm(s: Any) -> str:
+    return " ".join(str(s or "").split()).lower()
+
+def flatten_markets(markets: Any) -> Dict[OddsKey, float]:
+    """{(market, selection): best odds} from a match_cache markets dict (or its JSON text)."""
+    if isinstance(markets, (str, bytes)):
+        try:
+            markets = json.loads(markets)
+        except ValueError:
+            return {}
+    flat: Dict[OddsKey, float] = {}
+    for mname, selections in (markets or {}).items():
+        for s in selections or []:
+            try:
+                odds = round(float(s.get("odds")), ODDS_DECIMALS)
+            except (TypeError, ValueError, AttributeError):
+                continue
+            key = (_norm(mname), _norm(s.get("selection")))
+            if odds > flat.get(key, 0.0):
+                flat[key] = odds
+    return flat
+
+def digest_flat(flat: Dict[OddsKey, float]) -> str:
+    canonical = json.dumps(sorted([m, s, o] for (m, s), o in flat.items()), separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+def markets_digest(markets: Any) -> str:
+    return digest_flat(flatten_markets(markets))
+
+def odds_deltas(match_id: str, old: Dict[OddsKey, float], new: Dict[OddsKey, float]) -> List[OddsDelta]:
+    out = []
+    for key in sorted(set(old) | set(new)):
+        o, n = old.get(key), new.get(key)
+        if o != n:
+            out.append(OddsDelta(match_id, key[0], key[1], o, n))
+    return out
+
+class MarketsDigests:
+    def __init__(self, max_size: int = MARKETS_DIGEST_MAX):
+        self.max_size = max(1, max_size)
+        # match_id -> (digest, sport, start_time, flat odds or None when primed from the DB)
+        self._state: "OrderedDict[str, Tuple[str, Any, str, Optional[Dict[OddsKey, float]]]]" = OrderedDict()
+
+    def _set(self, match_id: str, value) -> None:
+        self._state[match_id] = value
+        self._state.move_to_end(match_id)
+        while len(self._state) > self.max_size:
+            self._state.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def prime(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """rows: match_id, markets_hash, sport, start_time as stored in match_cache."""
+        for r in rows:
+            if r.get("markets_hash"):
+                self._set(str(r["match_id"]), (r["markets_hash"], r.get("sport"), _time_key(r.get("start_time")), None))
+
+    def diff(self, matches: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[OddsDelta]]:
+        """
+        Changed matches (each with "markets_hash" set) and their odds deltas.
+        Later duplicates of a match_id in the same batch win.
+        """
+        latest: Dict[str, Dict[str, Any]] = {}
+        for m in matches:
+            if m.get("match_id") is not None:
+                latest[str(m["match_id"])] = m
+        changed: List[Dict[str, Any]] = []
+        deltas: List[OddsDelta] = []
+        for match_id, m in latest.items():
+            flat = flatten_markets(m.get("markets"))
+            digest = digest_flat(flat)
+            prev = self._state.get(match_id)
+            if prev and prev[0] == digest and prev[1] == m.get("sport") and prev[2] == _time_key(m.get("start_time")):
+                continue
+            if prev is None or prev[3] is not None:
+                deltas.extend(odds_deltas(match_id, prev[3] if prev else {}, flat))
+            changed.append(dict(m, markets_hash=digest, _flat_odds=flat))
+        return changed, deltas
+
+    def commit(self, changed: Iterable[Dict[str, Any]]) -> None:
+        for m in changed:
+            flat = m.get("_flat_odds")
+            if flat is None:
+                flat = flatten_markets(m.get("markets"))
+            self._set(str(m["match_id"]), (m.get("markets_hash") or digest_flat(flat), m.get("sport"), _time_key(m.get("start_time")), flat))
+
+    def forget(self, match_ids: Iterable[str]) -> None:
+        for mid in match_ids:
+            self._state.pop(str(mid), None)
+
+def _time_key(value: Any) -> str:
+    # compare datetimes and ISO strings from providers/DB on the same footing
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    return str(value).replace("Z", "+00:00")
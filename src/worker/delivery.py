@@ -0,0 +1,178 @@
+# src/worker/delivery.py
+"""
+Cola de entrega de mensajes de Telegram para el worker de notificaciones.
+- DELIVERY_WORKERS tareas envían en segundo plano, con token buckets global y por chat
+- 429 (RetryAfter): pausa y reintento, hasta DELIVERY_MAX_ATTEMPTS intentos
+- los mensajes de un mismo chat en un enqueue_batch() se agrupan en uno
+- un mensaje descartado se reporta a on_dropped(tags) para reenviarlo en la próxima pasada
+"""
+
+import os
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.ratelimit import TokenBucket, KeyedBuckets
+
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "4"))
+DELIVERY_MAX_QUEUE = int(os.getenv("DELIVERY_MAX_QUEUE", "10000"))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "3"))
+# Telegram: ~30 msg/s per bot, ~1 msg/s per chat
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_MAX_LEN = 4096
+COALESCE_SEPARATOR = "\n\n"
+
+class RetryAfter(Exception):
+    """Raised by the send function on HTTP 429; retry_after in seconds."""
+    def __init__(self, retry_after: float):
+        super().__init__(f"retry after {retry_after}s")
+        self.retry_after = float(retry_after)
+
+@dataclass
+class Delivery:
+    chat_id: Any
+    text: str
+    attempts: int = 0
+    tags: List[Any] = field(default_factory=list)
+
+def _coalesce_indexed(messages: Iterable[Tuple[Any, str]], max_len: int = TELEGRAM_MAX_LEN) -> List[Tuple[Any, str, List[int]]]:
+    # (chat_id, text, indexes of the input messages joined into text)
+    by_chat: Dict[Any, List[Tuple[int, str]]] = {}
+    for i, (chat_id, text) in enumerate(messages):
+        by_chat.setdefault(chat_id, []).append((i, text))
+    out: List[Tuple[Any, str, List[int]]] = []
+    for chat_id, texts in by_chat.items():
+        current, joined = "", []
+        for i, text in texts:
+            candidate = current + COALESCE_SEPARATOR + text if current else text
+            if current and len(candidate) > max_len:
+                out.append((chat_id, current, joined))
+                current, joined = text, [i]
+            else:
+                current = candidate
+                joined.append(i)
+        if current:
+            out.append((chat_id, current, joined))
+    return out
+
+def coalesce(messages: Iterable[Tuple[Any, str]], max_len: int = TELEGRAM_MAX_LEN) -> List[Tuple[Any, str]]:
+    """Join the messages of each chat (in order) into as few messages as fit max_len."""
+    return [(chat_id, text) for chat_id, text, _ in _coalesce_indexed(messages, max_len)]
+
+class DeliveryQueue:
+    def __init__(
+        self,
+        send: Callable[[Any, str], Awaitable[Any]],
+        workers: int = DELIVERY_WORKERS,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        max_queue: int = DELIVERY_MAX_QUEUE,
+        max_attempts: int = DELIVERY_MAX_ATTEMPTS,
+        on_dropped: Optional[Callable[[List[Any]], Any]] = None,
+    ):
+        """send(chat_id, text) delivers one message and raises RetryAfter on 429."""
+        self.send = send
+        self.on_dropped = on_dropped
+        self.workers = max(1, workers)
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets = KeyedBuckets(chat_rate, capacity=1.0)
+        self.max_attempts = max(1, max_attempts)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_queue))
+        self._tasks: List[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _drop(self, item: Delivery) -> None:
+        self.dropped += 1
+        if item.tags and self.on_dropped is not None:
+            self.on_dropped(item.tags)
+
+    def enqueue(self, chat_id: Any, text: str, tags: Optional[List[Any]] = None) -> bool:
+        item = Delivery(chat_id, text, tags=list(tags or []))
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            print(f"Delivery queue full; dropping message for chat {chat_id}")
+            self._drop(item)
+            return False
+
+    def enqueue_batch(self, messages: Iterable[Tuple[Any, str]], tags: Optional[Dict[int, Any]] = None) -> int:
+        """
+        Enqueue one cycle's messages, one (coalesced) delivery per chat where possible.
+        tags: index in messages -> tag handed to on_dropped if that message is dropped.
+        """
+        messages = list(messages)
+        merged = _coalesce_indexed(messages)
+        self.coalesced += len(messages) - len(merged)
+        tags = tags or {}
+        return sum(1 for chat_id, text, joined in merged if self.enqueue(chat_id, text, [tags[i] for i in joined if i in tags]))
+
+    async def _worker(self) -> None:
+        while True:
+            item: Delivery = await self._queue.get()
+            try:
+                await self._deliver(item)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: Delivery) -> None:
+        chat_bucket = self.chat_buckets.get(item.chat_id)
+        await chat_bucket.acquire()
+        await self.global_bucket.acquire()
+        item.attempts += 1
+        try:
+            await self.send(item.chat_id, item.text)
+            self.sent += 1
+        except RetryAfter as e:
+            chat_bucket.pause(e.retry_after)
+            self.global_bucket.pause(e.retry_after)
+            if item.attempts < self.max_attempts:
+                # never block the worker on its own queue: a full queue drops the retry
+                try:
+                    self._queue.put_nowait(item)
+                    self.retried += 1
+                except asyncio.QueueFull:
+                    print(f"Delivery queue full; dropping retry for chat {item.chat_id}")
+                    self._drop(item)
+            else:
+                print(f"Telegram delivery to {item.chat_id} dropped after {item.attempts} attempts (429)")
+                self._drop(item)
+        except Exception as e:
+            self.failed += 1
+            print(f"Telegram delivery to {item.chat_id} failed:", e)
+
+    async def join(self) -> None:
+        """Wait until every queued message was sent or given up."""
+        await self._queue.join()
+
+    async def stop(self, drain: bool = True, timeout: Optional[float] = 10.0) -> None:
+        if drain and self._tasks:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"Delivery queue stop: {self._queue.qsize()} messages not sent")
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "workers": len(self._tasks),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "chats": len(self.chat_buckets),
+        }
@@ -0,0 +1,146 @@
+# src/worker/match_cache.py
+"""
+Upsert masivo de `match_cache` para el worker de ingesta.
+- asyncpg: COPY a una tabla temporal y un solo merge ON CONFLICT (arrays unnest()
+  por chunks si COPY no está disponible)
+- Supabase REST: solo se envían las filas nuevas o cambiadas, en arrays por chunks
+Las filas con sport/start_time/markets_hash iguales no se reescriben.
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.worker.changes import markets_digest
+
+MATCH_CACHE_CHUNK = int(os.getenv("MATCH_CACHE_CHUNK", "1000"))
+
+MATCH_CACHE_COLUMNS = ("match_id", "sport", "home", "away", "start_time", "markets", "status", "markets_hash")
+
+# Shared merge: {source} yields the staged columns; unchanged rows are filtered by the WHERE
+_MERGE_SQL = """
+WITH up AS (
+    INSERT INTO match_cache (match_id, sport, home, away, start_time, markets, status, markets_hash)
+    SELECT match_id, sport, home, away, start_time, markets, status, markets_hash FROM {source}
+    ON CONFLICT (match_id) DO UPDATE
+      SET markets = EXCLUDED.markets, start_time = EXCLUDED.start_time, sport = EXCLUDED.sport,
+          markets_hash = EXCLUDED.markets_hash
+      WHERE (match_cache.markets_hash, match_cache.start_time, match_cache.sport)
+            IS DISTINCT FROM (EXCLUDED.markets_hash, EXCLUDED.start_time, EXCLUDED.sport)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated FROM up
+"""
+
+_STAGE_SQL = """
+CREATE TEMP TABLE match_cache_stage (
+    match_id text, sport text, home text, away text, start_time timestamptz, markets jsonb, status text, markets_hash text
+) ON COMMIT DROP
+"""
+
+_UNNEST_SOURCE = """unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::timestamptz[], $6::jsonb[], $7::text[], $8::text[])
+    AS s(match_id, sport, home, away, start_time, markets, status, markets_hash)"""
+
+MatchRecord = Tuple[str, Optional[str], Optional[str], Optional[str], Optional[datetime], str, str, str]
+
+def _start_time(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def match_record(match: Dict[str, Any]) -> MatchRecord:
+    """match: { match_id, sport, home, away, start_time (iso/datetime), markets (dict), source }"""
+    return (
+        str(match.get("match_id")),
+        match.get("sport"),
+        match.get("home"),
+        match.get("away"),
+        _start_time(match.get("start_time")),
+        json.dumps(match.get("markets") or {}, sort_keys=True),
+        "not_started",
+        match.get("markets_hash") or markets_digest(match.get("markets")),
+    )
+
+def stage_records(matches: Sequence[Dict[str, Any]]) -> List[MatchRecord]:
+    """One record per match_id (last occurrence wins), in first-seen order."""
+    by_id: Dict[str, MatchRecord] = {}
+    for m in matches:
+        if m.get("match_id") is None:
+            continue
+        rec = match_record(m)
+        by_id[rec[0]] = rec
+    return list(by_id.values())
+
+def _counts(row: Any, total: int) -> Dict[str, int]:
+    inserted = int(row["inserted"] or 0) if row else 0
+    updated = int(row["updated"] or 0) if row else 0
+    return {"inserted": inserted, "updated": updated, "unchanged": total - inserted - updated}
+
+def _add(a: Dict[str, int], b: Dict[str, int]) -> Dict[str, int]:
+    return {k: a.get(k, 0) + b.get(k, 0) for k in ("inserted", "updated", "unchanged")}
+
+async def bulk_upsert_match_cache(conn, matches: Sequence[Dict[str, Any]], use_copy: bool = True) -> Dict[str, int]:
+    """asyncpg path: COPY + one merge, or chunked unnest merges when COPY fails."""
+    records = stage_records(matches)
+    if not records:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+    if use_copy:
+        try:
+            async with conn.transaction():
+                await conn.execute(_STAGE_SQL)
+                await conn.copy_records_to_table("match_cache_stage", records=records, columns=list(MATCH_CACHE_COLUMNS))
+                row = await conn.fetchrow(_MERGE_SQL.format(source="match_cache_stage"))
+            return _counts(row, len(records))
+        except Exception as e:
+            print("match_cache COPY upsert failed, using chunked merge:", e)
+    total = {"inserted": 0, "updated": 0, "unchanged": 0}
+    sql = _MERGE_SQL.format(source=_UNNEST_SOURCE)
+    for i in range(0, len(records), MATCH_CACHE_CHUNK):
+        chunk = records[i:i + MATCH_CACHE_CHUNK]
+        columns = [list(col) for col in zip(*chunk)]
+        row = await conn.fetchrow(sql, *columns)
+        total = _add(total, _counts(row, len(chunk)))
+    return total
+
+def _same_row(rec: MatchRecord, existing: Dict[str, Any]) -> bool:
+    if existing.get("markets_hash"):
+        return (existing.get("sport") == rec[1] and _start_time(existing.get("start_time")) == rec[4]
+                and existing["markets_hash"] == rec[7])
+    markets = existing.get("markets")
+    if isinstance(markets, str):
+        try:
+            markets = json.loads(markets)
+        except ValueError:
+            markets = None
+    existing_start = _start_time(existing.get("start_time"))
+    return (
+        existing.get("sport") == rec[1]
+        and existing_start == rec[4]
+        and markets == json.loads(rec[5])
+    )
+
+def classify_records(records: Sequence[MatchRecord], existing: Dict[str, Dict[str, Any]]) -> Tuple[List[MatchRecord], Dict[str, int]]:
+    """REST path: (records to write, counts) given the stored rows by match_id."""
+    to_write: List[MatchRecord] = []
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    for rec in records:
+        row = existing.get(rec[0])
+        if row is None:
+            counts["inserted"] += 1
+        elif _same_row(rec, row):
+            counts["unchanged"] += 1
+            continue
+        else:
+            counts["updated"] += 1
+        to_write.append(rec)
+    return to_write, counts
+
+def rest_payload(rec: MatchRecord) -> Dict[str, Any]:
+    payload = dict(zip(MATCH_CACHE_COLUMNS, rec))
+    payload["markets"] = json.loads(rec[5])
+    payload["start_time"] = rec[4].isoformat() if rec[4] else None
+    return payload
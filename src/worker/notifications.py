@@ -0,0 +1,193 @@
+# src/worker/notifications.py
+"""
+Pasada de notificaciones en lote (scripts/cron_notify.py).
+Con las notificaciones, legs y partidos ya cargados (tres consultas), calcula en
+memoria las cuotas actuales de cada parlay y liquida todas las legs con un solo
+evaluate_legs. Con NotificationStateStore cada evento se entrega una sola vez.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.parlay.evaluator import evaluate_legs, RESULT_WIN, RESULT_HALF_WIN, DECIDED_RESULTS
+
+# Safety defaults
+DEFAULT_ODDS_CHANGE_THRESHOLD = 5.0  # percent
+DEFAULT_NOTIFY_ON_LEG_WON = True
+
+def normalize_str(s: Optional[str]) -> str:
+    if not s:
+        return ""
+    return str(s).strip().lower()
+
+def decode_json(raw: Any, default: Any = None) -> Any:
+    # asyncpg returns json/jsonb columns as text
+    if isinstance(raw, (str, bytes)):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return default
+    return raw if raw is not None else default
+
+class MarketLookup:
+    """Odds lookup over one match_cache markets dict, normalized once per pass."""
+
+    def __init__(self, markets: Any):
+        markets = decode_json(markets, {}) or {}
+        self.markets: List[Tuple[str, Dict[str, float]]] = []
+        self.first_odds: Optional[float] = None
+        for mname, selections in markets.items():
+            by_sel: Dict[str, float] = {}
+            for s in selections or []:
+                try:
+                    odds = float(s.get("odds"))
+                except (TypeError, ValueError):
+                    continue
+                by_sel.setdefault(normalize_str(s.get("selection", "")), odds)
+                if self.first_odds is None:
+                    self.first_odds = odds
+            self.markets.append((normalize_str(mname), by_sel))
+
+    def odds_for(self, market: Optional[str], selection: Optional[str]) -> Optional[float]:
+        # same heuristic as before: first market whose name matches or contains the leg's market
+        m = normalize_str(market)
+        sel = normalize_str(selection)
+        for mname, by_sel in self.markets:
+            if mname == m or m in mname:
+                if sel in by_sel and by_sel[sel]:
+                    return by_sel[sel]
+        # if not found, take the first odds available
+        return self.first_odds
+
+def match_final(mc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """match_final structure expected by the evaluator, from a match_cache row."""
+    if not mc:
+        return {}
+    return {
+        "status": mc.get("status"),
+        "home": mc.get("home"),
+        "away": mc.get("away"),
+        "home_score": mc.get("home_score"),
+        "away_score": mc.get("away_score"),
+        "winner": mc.get("winner"),
+        "maps": decode_json(mc.get("maps")),
+        "final_result": mc.get("final_result"),
+    }
+
+@dataclass
+class NotificationPass:
+    """In-memory result of one pass: messages to send and notifications to stamp."""
+    messages: List[Tuple[int, str]] = field(default_factory=list)  # (chat_id, text)
+    notified_ids: List[Any] = field(default_factory=list)
+    odds_changes: int = 0
+    legs_won: int = 0
+    # index in messages -> (notification_id, leg_id) of a leg-won message
+    leg_events: Dict[int, Tuple[Any, Any]] = field(default_factory=dict)
+
+    def extend(self, other: "NotificationPass") -> None:
+        offset = len(self.messages)
+        self.leg_events.update((i + offset, ev) for i, ev in other.leg_events.items())
+        self.messages.extend(other.messages)
+        self.notified_ids.extend(i for i in other.notified_ids if i not in self.notified_ids)
+        self.odds_changes += other.odds_changes
+        self.legs_won += other.legs_won
+
+def odds_change_pct(saved_total_odds: float, current_total_odds: float) -> float:
+    return abs((current_total_odds - saved_total_odds) / saved_total_odds * 100) if saved_total_odds > 0 else 0.0
+
+def odds_change_text(parlay_id: int, saved_total_odds: float, current_total_odds: float, pct_change: float) -> str:
+    return f"🔔 Cambio de cuota detectado para tu Parlay #{parlay_id}\nCuota anterior: {saved_total_odds:.2f}\nCuota actual: {current_total_odds:.2f}\nCambio: {pct_change:.2f}%"
+
+def trigger_settings(n: Dict[str, Any]) -> Tuple[float, bool]:
+    """(threshold_pct, notify_on_leg_won) from a notification's trigger_config."""
+    trigger_config = decode_json(n.get("trigger_config"), {}) or {}
+    return (float(trigger_config.get("threshold_pct", DEFAULT_ODDS_CHANGE_THRESHOLD)),
+            bool(trigger_config.get("notify_on_leg_won", DEFAULT_NOTIFY_ON_LEG_WON)))
+
+def leg_odds(leg: Dict[str, Any], lookup: Optional[MarketLookup]) -> float:
+    chosen_odds = lookup.odds_for(leg.get("market"), leg.get("selection")) if lookup else None
+    if not chosen_odds:
+        # fallback to stored leg odds
+        chosen_odds = float(leg.get("odds", 1.0) or 1.0)
+    return float(chosen_odds)
+
+def current_parlay_odds(legs: Iterable[Dict[str, Any]], lookups: Dict[str, MarketLookup]) -> float:
+    total = 1.0
+    for leg in legs:
+        total *= leg_odds(leg, lookups.get(str(leg.get("match_id"))))
+    return float(total)
+
+def should_alert_odds(state, notif_id: Any, pct_change: float, threshold: float, current_total_odds: float) -> bool:
+    if state is None:
+        return pct_change >= threshold
+    # the state machine also needs below-threshold values to re-arm
+    return state.odds_move(notif_id, pct_change, threshold, current_total_odds)
+
+def build_notification_pass(notifs: List[Dict[str, Any]], legs: List[Dict[str, Any]], matches: Dict[str, Dict[str, Any]],
+                            check_odds: bool = True, state=None) -> NotificationPass:
+    """
+    notifs: active notifications joined to their parlay (parlay_total_odds)
+    legs: parlay_legs rows of those parlays; matches: match_cache rows by match_id
+    check_odds=False only settles legs (odds moves come from the OddsIndex).
+    state: optional NotificationStateStore for dedupe/cooldowns.
+    """
+    out = NotificationPass()
+    legs_by_parlay: Dict[Any, List[Dict[str, Any]]] = {}
+    for leg in legs:
+        legs_by_parlay.setdefault(str(leg.get("parlay_id")), []).append(leg)
+    notif_ids_by_parlay: Dict[str, List[Any]] = {}
+    for n in notifs:
+        notif_ids_by_parlay.setdefault(str(n.get("parlay_id")), []).append(n.get("id"))
+    lookups = {mid: MarketLookup(mc.get("markets")) for mid, mc in matches.items() if mc and mc.get("markets")} if check_odds else {}
+
+    def handled(leg: Dict[str, Any]) -> bool:
+        return state is not None and all(state.leg_done(nid, leg.get("id")) for nid in notif_ids_by_parlay.get(str(leg.get("parlay_id")), []))
+
+    # settle every distinct leg once, in bulk (legs already notified/settled for every subscriber are skipped)
+    to_settle = [leg for leg in legs if str(leg.get("match_id")) in matches and not handled(leg)]
+    results: Dict[int, int] = {}
+    if to_settle:
+        finals = [match_final(matches[str(leg.get("match_id"))]) for leg in to_settle]
+        bulk = evaluate_legs(
+            [{"market": l.get("market"), "selection": l.get("selection"), "metadata": l.get("metadata")} for l in to_settle],
+            finals,
+        )
+        results = {id(leg): int(r) for leg, r in zip(to_settle, bulk)}
+
+    for n in notifs:
+        notif_id = n.get("id")
+        user_id = int(n.get("user_id"))
+        parlay_id = int(n.get("parlay_id"))
+        threshold, notify_on_leg_won = trigger_settings(n)
+        saved_total_odds = float(n.get("parlay_total_odds") or 0.0)
+        parlay_legs = legs_by_parlay.get(str(parlay_id), [])
+        notified = False
+
+        if check_odds:
+            current_total_odds = current_parlay_odds(parlay_legs, lookups)
+            pct_change = odds_change_pct(saved_total_odds, current_total_odds)
+            if should_alert_odds(state, notif_id, pct_change, threshold, current_total_odds):
+                out.messages.append((user_id, odds_change_text(parlay_id, saved_total_odds, current_total_odds, pct_change)))
+                out.odds_changes += 1
+                notified = True
+
+        # notify when a leg is won (half-win on quarter Asian lines)
+        for leg in parlay_legs:
+            res = results.get(id(leg))
+            if not notify_on_leg_won or res not in (RESULT_WIN, RESULT_HALF_WIN):
+                # decided without a message (loss, push, void or leg-won alerts off): not settled again
+                if state is not None and res in DECIDED_RESULTS:
+                    state.leg_settled(notif_id, leg.get("id"))
+                continue
+            if state is not None and not state.leg_won(notif_id, leg.get("id")):
+                continue
+            mc = matches.get(str(leg.get("match_id"))) or {}
+            won = "se ganó" if res == RESULT_WIN else "se ganó a medias"
+            out.leg_events[len(out.messages)] = (notif_id, leg.get("id"))
+            out.messages.append((user_id, f"✅ ¡Una leg de tu Parlay #{parlay_id} {won}!\nMatch: {mc.get('home')} vs {mc.get('away')}\nPick: {leg.get('selection')} — Cuota: {float(leg.get('odds') or 0):.2f}"))
+            out.legs_won += 1
+            notified = True
+        if notified:
+            out.notified_ids.append(notif_id)
+    return out
@@ -0,0 +1,182 @@
+# src/worker/notify_state.py
+"""
+Estado de notificaciones por (notificación, leg, tipo de evento), espejo de la
+tabla notification_events: load() al iniciar, flush() al final de cada pasada.
+
+leg_won (leg_id = parlay_legs.id):
+    pending -> fired    leg ganada / medio ganada, mensaje enviado una vez
+    pending -> settled  perdida, push o void: nada que enviar
+    fired -> pending    mensaje descartado por la cola de entrega
+odds_move (leg_id = 0, todo el parlay):
+    armed -> fired      cambio >= umbral y pasó ODDS_ALERT_COOLDOWN
+    fired -> armed      cambio bajo umbral * ODDS_REARM_RATIO (histéresis)
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+ODDS_ALERT_COOLDOWN = float(os.getenv("ODDS_ALERT_COOLDOWN", "1800"))
+ODDS_REARM_RATIO = float(os.getenv("ODDS_REARM_RATIO", "0.5"))
+
+EVENT_LEG_WON = "leg_won"
+EVENT_ODDS_MOVE = "odds_move"
+
+STATE_PENDING = "pending"
+STATE_ARMED = "armed"
+STATE_FIRED = "fired"
+STATE_SETTLED = "settled"
+
+EventKey = Tuple[str, int, str]  # (notification_id, leg_id, event_type)
+
+_UPSERT_SQL = """
+INSERT INTO notification_events (notification_id, leg_id, event_type, state, last_value, fired_at, updated_at)
+VALUES ($1, $2, $3, $4, $5, $6, now())
+ON CONFLICT (notification_id, leg_id, event_type) DO UPDATE
+  SET state = EXCLUDED.state, last_value = EXCLUDED.last_value, fired_at = EXCLUDED.fired_at, updated_at = now()
+"""
+
+@dataclass
+class EventState:
+    state: str
+    last_value: Optional[float] = None
+    fired_at: Optional[float] = None  # epoch seconds
+
+def event_key(notification_id: Any, leg_id: Any, event_type: str) -> EventKey:
+    return (str(notification_id), int(leg_id or 0), event_type)
+
+class NotificationStateStore:
+    def __init__(self, cooldown: float = ODDS_ALERT_COOLDOWN, rearm_ratio: float = ODDS_REARM_RATIO, clock=time.time):
+        self.cooldown = cooldown
+        self.rearm_ratio = rearm_ratio
+        self.clock = clock
+        self._states: Dict[EventKey, EventState] = {}
+        self._dirty: Set[EventKey] = set()
+        self.suppressed = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _set(self, key: EventKey, st: EventState) -> None:
+        self._states[key] = st
+        self._dirty.add(key)
+
+    # --- leg_won -----------------------------------------------------------
+    def leg_done(self, notification_id: Any, leg_id: Any) -> bool:
+        st = self._states.get(event_key(notification_id, leg_id, EVENT_LEG_WON))
+        return st is not None and st.state in (STATE_FIRED, STATE_SETTLED)
+
+    def leg_won(self, notification_id: Any, leg_id: Any) -> bool:
+        """True exactly once per (notification, leg): the caller sends the message."""
+        key = event_key(notification_id, leg_id, EVENT_LEG_WON)
+        st = self._states.get(key)
+        if st is not None and st.state in (STATE_FIRED, STATE_SETTLED):
+            self.suppressed += 1
+            return False
+        self._set(key, EventState(STATE_FIRED, None, self.clock()))
+        return True
+
+    def leg_unsent(self, notification_id: Any, leg_id: Any) -> None:
+        """The leg-won message was dropped before delivery: back to pending."""
+        key = event_key(notification_id, leg_id, EVENT_LEG_WON)
+        st = self._states.get(key)
+        if st is not None and st.state == STATE_FIRED:
+            self._set(key, EventState(STATE_PENDING))
+
+    def leg_settled(self, notification_id: Any, leg_id: Any) -> None:
+        """Leg decided without a message (loss, push, void)."""
+        key = event_key(notification_id, leg_id, EVENT_LEG_WON)
+        if key not in self._states:
+            self._set(key, EventState(STATE_SETTLED))
+
+    # --- odds_move ---------------------------------------------------------
+    def odds_move(self, notification_id: Any, pct_change: float, threshold: float, current_odds: Optional[float] = None) -> bool:
+        """Feed the current change; True when an alert should be sent now."""
+        key = event_key(notification_id, 0, EVENT_ODDS_MOVE)
+        st = self._states.get(key) or EventState(STATE_ARMED)
+        now = self.clock()
+        cooled = st.fired_at is None or now - st.fired_at >= self.cooldown
+        if st.state == STATE_FIRED:
+            if pct_change < threshold * self.rearm_ratio:
+                self._set(key, EventState(STATE_ARMED, current_odds, st.fired_at))
+                return False
+            moved_again = (
+                current_odds is not None and st.last_value
+                and abs(current_odds - st.last_value) / st.last_value * 100 >= threshold
+            )
+            if not (moved_again and cooled):
+                if pct_change >= threshold:
+                    self.suppressed += 1
+                return False
+        elif pct_change < threshold or not cooled:
+            if pct_change >= threshold:
+                self.suppressed += 1
+            return False
+        self._set(key, EventState(STATE_FIRED, current_odds, now))
+        return True
+
+    # --- persistence ---------------------------------------------------------
+    def load_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for r in rows:
+            fired_at = _epoch(r.get("fired_at"))
+            last_value = r.get("last_value")
+            self._states[event_key(r["notification_id"], r.get("leg_id"), r["event_type"])] = EventState(
+                r["state"], float(last_value) if last_value is not None else None, fired_at
+            )
+
+    async def load(self, conn) -> None:
+        """Mirror notification_events of active notifications."""
+        rows = await conn.fetch(
+            """
+            SELECT e.notification_id, e.leg_id, e.event_type, e.state, e.last_value, e.fired_at
+            FROM notification_events e
+            JOIN notifications n ON n.id = e.notification_id
+            WHERE n.active = true
+            """
+        )
+        self.load_rows([dict(r) for r in rows])
+
+    def dirty_records(self) -> List[Tuple[Any, ...]]:
+        out = []
+        for key in sorted(self._dirty):
+            st = self._states[key]
+            fired = datetime.fromtimestamp(st.fired_at, tz=timezone.utc) if st.fired_at else None
+            out.append((_db_id(key[0]), key[1], key[2], st.state, st.last_value, fired))
+        return out
+
+    async def flush(self, conn) -> int:
+        records = self.dirty_records()
+        if records:
+            await conn.executemany(_UPSERT_SQL, records)
+        self._dirty.clear()
+        return len(records)
+
+    def mark_clean(self) -> None:
+        self._dirty.clear()
+
+    def retain(self, active_ids: Iterable[Any]) -> None:
+        """Keep only the states of the given (active) notifications."""
+        keep = {str(i) for i in active_ids}
+        self.forget({k[0] for k in self._states if k[0] not in keep})
+
+    def forget(self, notification_ids: Iterable[Any]) -> None:
+        """Drop states of notifications that are no longer active."""
+        ids = {str(i) for i in notification_ids}
+        for key in [k for k in self._states if k[0] in ids]:
+            self._states.pop(key, None)
+            self._dirty.discard(key)
+
+def _epoch(value: Any) -> Optional[float]:
+    """fired_at as epoch seconds: datetime (asyncpg) or ISO string (Supabase REST)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    return float(value)
+
+def _db_id(value: str) -> Any:
+    return int(value) if value.isdigit() else value
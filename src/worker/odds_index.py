@@ -0,0 +1,116 @@
+# src/worker/odds_index.py
+"""
+Índice match_id -> notificaciones para alertas de cambio de cuota por eventos.
+Los deltas de la ingesta solo re-resuelven las legs de partidos cuyas cuotas se
+movieron y actualizan el total del parlay de forma incremental. Se reconstruye
+cada ODDS_INDEX_REFRESH s (suscripciones nuevas, deriva de punto flotante).
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.worker.notifications import (
+    MarketLookup, NotificationPass, leg_odds, odds_change_pct, odds_change_text, should_alert_odds, trigger_settings,
+)
+
+ODDS_INDEX_REFRESH = float(os.getenv("ODDS_INDEX_REFRESH", "300"))
+
+@dataclass
+class TrackedParlay:
+    notif_id: Any
+    user_id: int
+    parlay_id: int
+    threshold: float
+    saved_total_odds: float
+    current_total_odds: float
+    legs: List[Dict[str, Any]]
+    leg_odds: List[float]
+
+class OddsIndex:
+    def __init__(self, refresh_seconds: float = ODDS_INDEX_REFRESH):
+        self.refresh_seconds = refresh_seconds
+        self.built_at: Optional[float] = None
+        self.tracked: List[TrackedParlay] = []
+        # match_id -> [(tracked position, leg position)]
+        self.by_match: Dict[str, List[Tuple[int, int]]] = {}
+        self.repriced = 0
+
+    def stale(self) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at >= self.refresh_seconds
+
+    def invalidate(self) -> None:
+        """Force a rebuild on the next pass (e.g. the worker's shards changed)."""
+        self.built_at = None
+
+    def rebuild(self, notifs: Iterable[Dict[str, Any]], legs: Iterable[Dict[str, Any]], matches: Dict[str, Dict[str, Any]]) -> None:
+        """Same inputs as build_notification_pass: notifications+parlays, their legs, match_cache rows."""
+        legs_by_parlay: Dict[str, List[Dict[str, Any]]] = {}
+        for leg in legs:
+            legs_by_parlay.setdefault(str(leg.get("parlay_id")), []).append(leg)
+        lookups: Dict[str, MarketLookup] = {}
+        self.tracked = []
+        self.by_match = {}
+        for n in notifs:
+            parlay_id = int(n.get("parlay_id"))
+            parlay_legs = legs_by_parlay.get(str(parlay_id), [])
+            odds = []
+            for j, leg in enumerate(parlay_legs):
+                mid = str(leg.get("match_id"))
+                if mid not in lookups and (matches.get(mid) or {}).get("markets"):
+                    lookups[mid] = MarketLookup(matches[mid]["markets"])
+                odds.append(leg_odds(leg, lookups.get(mid)))
+                self.by_match.setdefault(mid, []).append((len(self.tracked), j))
+            total = 1.0
+            for o in odds:
+                total *= o
+            threshold, _ = trigger_settings(n)
+            self.tracked.append(TrackedParlay(
+                n.get("id"), int(n.get("user_id")), parlay_id, threshold,
+                float(n.get("parlay_total_odds") or 0.0), float(total), parlay_legs, odds,
+            ))
+        self.built_at = time.monotonic()
+
+    def apply(self, changed_matches: Iterable[Dict[str, Any]], deltas: Iterable[Any], state=None) -> NotificationPass:
+        """
+        Push one ingest pass through the index. changed_matches are the rows written
+        (with their new markets), deltas the OddsDelta list for them. Returns the
+        odds-change alerts of the affected parlays (gated by the optional
+        NotificationStateStore).
+        """
+        out = NotificationPass()
+        moved = {str(d.match_id) for d in deltas} & self.by_match.keys()
+        if not moved:
+            return out
+        markets = {str(m.get("match_id")): m.get("markets") for m in changed_matches}
+        touched = set()
+        for mid in moved:
+            lookup = MarketLookup(markets.get(mid)) if markets.get(mid) else None
+            for pos, j in self.by_match[mid]:
+                tp = self.tracked[pos]
+                new = leg_odds(tp.legs[j], lookup)
+                old = tp.leg_odds[j]
+                if new == old:
+                    continue
+                tp.current_total_odds = tp.current_total_odds * new / old if old > 0 else _product(tp.leg_odds[:j] + [new] + tp.leg_odds[j + 1:])
+                tp.leg_odds[j] = new
+                touched.add(pos)
+        self.repriced += len(touched)
+        for pos in sorted(touched):
+            tp = self.tracked[pos]
+            pct_change = odds_change_pct(tp.saved_total_odds, tp.current_total_odds)
+            if should_alert_odds(state, tp.notif_id, pct_change, tp.threshold, tp.current_total_odds):
+                out.messages.append((tp.user_id, odds_change_text(tp.parlay_id, tp.saved_total_odds, tp.current_total_odds, pct_change)))
+                out.notified_ids.append(tp.notif_id)
+                out.odds_changes += 1
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {"notifications": len(self.tracked), "matches": len(self.by_match), "repriced": self.repriced}
+
+def _product(values: List[float]) -> float:
+    total = 1.0
+    for v in values:
+        total *= v
+    return total
@@ -0,0 +1,149 @@
+# src/worker/oddsapi.py
+"""
+Ingesta de the-odds-api (v4) en paralelo y con control de cuota.
+- slugs desde config/markets_sources.json; a lo sumo ODDSAPI_CONCURRENCY requests a la vez
+- créditos en el limitador compartido; OddsApiQuota rota los slugs según el presupuesto
+- respuestas parseadas en streaming; un slug que falla no descarta los demás
+"""
+
+import os
+import json
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import aiohttp
+
+from src.utils.ratelimit import QuotaLimiter, retry_after, shared_limiter
+from src.worker.streaming import iter_json_items, merge_streams
+
+ODDSAPI_BASE = "https://api.the-odds-api.com/v4/sports"
+PROVIDER = "oddsapi"  # name in the shared limiter
+ODDSAPI_CONCURRENCY = int(os.getenv("ODDSAPI_CONCURRENCY", "4"))
+ODDSAPI_PARAMS = {"regions": "us,eu", "markets": "h2h,spreads,totals", "oddsFormat": "decimal"}
+MARKETS_SOURCES_PATH = os.getenv(
+    "MARKETS_SOURCES_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "config", "markets_sources.json"),
+)
+# used when the config file is missing or lists no slugs
+DEFAULT_ODDSAPI_SLUGS = ["soccer_epl", "soccer_spain_laliga", "basketball_nba", "americanfootball_nfl", "tennis_atp"]
+
+def load_oddsapi_slugs(path: str = MARKETS_SOURCES_PATH) -> List[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    except (OSError, ValueError) as e:
+        print("markets_sources.json not readable, using default oddsapi slugs:", e)
+        return list(DEFAULT_ODDSAPI_SLUGS)
+    slugs: List[str] = []
+    for sport, entry in cfg.items():
+        if not isinstance(entry, dict) or not entry.get("enabled", True):
+            continue
+        for slug in entry.get("oddsapi_slugs") or []:
+            if slug not in slugs:
+                slugs.append(slug)
+    return slugs or list(DEFAULT_ODDSAPI_SLUGS)
+
+class OddsApiQuota:
+    """Slug planning on the shared limiter's "oddsapi" quota."""
+
+    def __init__(self, limiter: Optional[QuotaLimiter] = None):
+        self.limiter = limiter if limiter is not None else shared_limiter()
+        self._offset = 0
+
+    def update(self, headers) -> None:
+        self.limiter.update(PROVIDER, headers)
+
+    @property
+    def remaining(self) -> Optional[int]:
+        return self.limiter.remaining(PROVIDER)
+
+    @property
+    def last_cost(self) -> int:
+        return self.limiter.cost(PROVIDER)
+
+    def budget(self) -> Optional[int]:
+        """Requests this pass may spend (None = unknown yet, no limit)."""
+        return self.limiter.budget(PROVIDER)
+
+    def plan(self, slugs: Sequence[str]) -> List[str]:
+        """Slugs to fetch this pass, rotating when the budget is smaller than the list."""
+        budget = self.budget()
+        if budget is None or budget >= len(slugs):
+            return list(slugs)
+        if budget == 0:
+            return []
+        start = self._offset % len(slugs)
+        rotated = list(slugs[start:]) + list(slugs[:start])
+        self._offset = (start + budget) % len(slugs)
+        return rotated[:budget]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"remaining": self.remaining, "last_cost": self.last_cost, "budget": self.budget()}
+
+def normalize_event(match: Dict[str, Any]) -> Dict[str, Any]:
+    # match has: id, sport_key, commence_time, home_team, away_team, bookmakers -> markets
+    match_id = str(match.get("id") or f"{match.get('sport_key')}_{match.get('commence_time')}_{match.get('home_team')}")
+    markets: Dict[str, List[Dict[str, Any]]] = {}
+    for book in match.get("bookmakers", []):
+        prov = book.get("title")
+        for market in book.get("markets", []):
+            mkey = market.get("key")
+            for outcome in market.get("outcomes", []):
+                odd = outcome.get("price")
+                if odd is None:
+                    continue
+                try:
+                    oddf = float(odd)
+                except Exception:
+                    continue
+                markets.setdefault(mkey, []).append({"selection": outcome.get("name"), "odds": oddf, "provider": prov, "metadata": outcome})
+    return {
+        "match_id": match_id,
+        "sport": match.get("sport_key"),
+        "home": match.get("home_team"),
+        "away": match.get("away_team"),
+        "start_time": match.get("commence_time"),
+        "markets": markets,
+        "source": "oddsapi",
+    }
+
+async def stream_slug(session: aiohttp.ClientSession, slug: str, api_key: str, quota: OddsApiQuota,
+                      sem: asyncio.Semaphore, timeout=None, headers: Optional[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Normalized events of one slug, parsed from the response stream."""
+    params = dict(ODDSAPI_PARAMS, apiKey=api_key)
+    async with sem:
+        await quota.limiter.acquire(PROVIDER)
+        async with session.get(f"{ODDSAPI_BASE}/{slug}/odds", params=params, timeout=timeout, headers=headers) as r:
+            quota.update(r.headers)
+            if r.status == 429:
+                quota.limiter.penalize(PROVIDER, retry_after(r.headers))
+            if r.status != 200:
+                txt = await r.text()
+                raise RuntimeError(f"oddsapi {slug}: HTTP {r.status} {txt[:200]}")
+            async for m in iter_json_items(r.content, "item"):
+                yield normalize_event(m)
+
+def slug_streams(session: aiohttp.ClientSession, api_key: str, slugs: Sequence[str], quota: OddsApiQuota,
+                 concurrency: int = ODDSAPI_CONCURRENCY, timeout=None, headers: Optional[Dict[str, str]] = None) -> Dict[str, AsyncIterator[Dict[str, Any]]]:
+    """One stream per planned slug, all behind one semaphore; slugs left out by the quota plan are not in the result."""
+    planned = quota.plan(slugs)
+    if len(planned) < len(slugs):
+        print(f"oddsapi quota: fetching {len(planned)}/{len(slugs)} slugs ({quota.stats()})")
+    sem = asyncio.Semaphore(max(1, concurrency))
+    return {slug: stream_slug(session, slug, api_key, quota, sem, timeout, headers) for slug in planned}
+
+async def stream_odds(session: aiohttp.ClientSession, api_key: str, slugs: Sequence[str], quota: OddsApiQuota,
+                      concurrency: int = ODDSAPI_CONCURRENCY, timeout=None, headers: Optional[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Concurrent fan-out over the planned slugs; one failing slug is logged and does not drop the others."""
+    sources = slug_streams(session, api_key, slugs, quota, concurrency, timeout, headers)
+    if not sources:
+        return
+    async for slug, item in merge_streams(sources):
+        if isinstance(item, Exception):
+            print("oddsapi fetch error:", slug, item)
+            continue
+        yield item
+
+async def fetch_odds(session: aiohttp.ClientSession, api_key: str, slugs: Sequence[str], quota: OddsApiQuota,
+                     concurrency: int = ODDSAPI_CONCURRENCY, timeout=None, headers: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    return [m async for m in stream_odds(session, api_key, slugs, quota, concurrency, timeout, headers)]
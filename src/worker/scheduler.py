@@ -0,0 +1,202 @@
+# src/worker/scheduler.py
+"""
+Planificador de refrescos por proveedor para el worker de ingesta.
+Cada objetivo (feed o slug de the-odds-api) se refresca según el inicio de sus partidos:
+
+    live      ya empezó, dentro de POLL_LIVE_WINDOW    -> POLL_LIVE_INTERVAL
+    prematch  empieza dentro de POLL_PREMATCH_WINDOW   -> POLL_PREMATCH_INTERVAL
+    today     empieza dentro de 24h                    -> POLL_TODAY_INTERVAL
+    far/idle  más adelante o nada programado           -> POLL_FAR_INTERVAL
+
+due() respeta POLL_BUDGETS (requests/hora por proveedor) y espera mientras el
+limitador compartido reporte la cuota agotada.
+"""
+
+import os
+import json
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.ratelimit import QuotaLimiter, TokenBucket
+
+POLL_LIVE_INTERVAL = float(os.getenv("POLL_LIVE_INTERVAL", "15"))
+POLL_PREMATCH_INTERVAL = float(os.getenv("POLL_PREMATCH_INTERVAL", "60"))
+POLL_TODAY_INTERVAL = float(os.getenv("POLL_TODAY_INTERVAL", "600"))
+POLL_FAR_INTERVAL = float(os.getenv("POLL_FAR_INTERVAL", "3600"))
+POLL_LIVE_WINDOW = float(os.getenv("POLL_LIVE_WINDOW", str(3 * 3600)))
+POLL_PREMATCH_WINDOW = float(os.getenv("POLL_PREMATCH_WINDOW", "3600"))
+POLL_RETRY_BASE = float(os.getenv("POLL_RETRY_BASE", "30"))
+# pacing in requests per hour per provider; providers not listed are not paced
+# (the-odds-api is planned on its credits by src/worker/oddsapi.py)
+POLL_BUDGETS = json.loads(os.getenv("POLL_BUDGETS", '{"apisports": 60, "pandascore": 600}'))
+
+TIER_LIVE = "live"
+TIER_PREMATCH = "prematch"
+TIER_TODAY = "today"
+TIER_FAR = "far"
+TIER_IDLE = "idle"
+_TIER_RANK = {TIER_LIVE: 0, TIER_PREMATCH: 1, TIER_TODAY: 2, TIER_FAR: 3, TIER_IDLE: 4}
+
+FINISHED_STATUSES = {"finished", "ft", "aet", "pen", "cancelled", "canceled", "postponed"}
+
+def start_epoch(value: Any) -> Optional[float]:
+    """start_time as epoch seconds (ISO string, datetime or number)."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+def match_tier(start: Optional[float], now: float) -> str:
+    if start is None:
+        return TIER_IDLE
+    delta = start - now
+    if delta <= 0:
+        return TIER_LIVE if -delta < POLL_LIVE_WINDOW else TIER_IDLE
+    if delta <= POLL_PREMATCH_WINDOW:
+        return TIER_PREMATCH
+    if delta <= 24 * 3600:
+        return TIER_TODAY
+    return TIER_FAR
+
+def tier_interval(tier: str) -> float:
+    return {
+        TIER_LIVE: POLL_LIVE_INTERVAL,
+        TIER_PREMATCH: POLL_PREMATCH_INTERVAL,
+        TIER_TODAY: POLL_TODAY_INTERVAL,
+    }.get(tier, POLL_FAR_INTERVAL)
+
+@dataclass
+class PollTarget:
+    key: str
+    provider: str
+    tier: str = TIER_IDLE
+    due_at: float = 0.0
+    starts: List[float] = field(default_factory=list)
+    failures: int = 0
+    polls: int = 0
+    generation: int = 0
+    in_flight: bool = False
+
+class PollScheduler:
+    def __init__(self, budgets: Optional[Dict[str, float]] = None, clock: Callable[[], float] = time.time,
+                 limiter: Optional[QuotaLimiter] = None):
+        self.clock = clock
+        self.limiter = limiter
+        budgets = POLL_BUDGETS if budgets is None else budgets
+        # capacity: one minute worth of requests (at least one)
+        self.budgets = {
+            p: TokenBucket(per_hour / 3600.0, capacity=max(1.0, per_hour / 60.0), clock=clock)
+            for p, per_hour in budgets.items()
+        }
+        self.targets: Dict[str, PollTarget] = {}
+        self._heap: List[Tuple[float, int, int, str, int]] = []
+        self._seq = itertools.count()
+        self.deferred = 0
+
+    def _push(self, t: PollTarget, due_at: float) -> None:
+        t.generation += 1
+        t.due_at = due_at
+        heapq.heappush(self._heap, (due_at, _TIER_RANK[t.tier], next(self._seq), t.key, t.generation))
+
+    def add(self, key: str, provider: str, due_at: Optional[float] = None) -> None:
+        """Register a target (due immediately by default); no-op if it already exists."""
+        if key in self.targets:
+            return
+        t = PollTarget(key, provider)
+        self.targets[key] = t
+        self._push(t, self.clock() if due_at is None else due_at)
+
+    def remove(self, key: str) -> None:
+        self.targets.pop(key, None)  # its heap entries are skipped lazily
+
+    def due(self, limit: Optional[int] = None) -> List[str]:
+        """Pop the targets to refresh now; each must be answered with observe(), failed() or defer()."""
+        now = self.clock()
+        out: List[str] = []
+        deferred: List[Tuple[PollTarget, float]] = []
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(out) < limit):
+            _, _, _, key, gen = heapq.heappop(self._heap)
+            t = self.targets.get(key)
+            if t is None or gen != t.generation or t.in_flight:
+                continue
+            resume = self.limiter.resume_at(t.provider) if self.limiter is not None else None
+            if resume is not None:
+                self.deferred += 1
+                deferred.append((t, max(resume, now + POLL_RETRY_BASE)))
+                continue
+            bucket = self.budgets.get(t.provider)
+            wait = bucket.try_acquire() if bucket else 0.0
+            if wait > 0:
+                self.deferred += 1
+                deferred.append((t, now + wait))
+                continue
+            t.in_flight = True
+            out.append(key)
+        for t, due_at in deferred:
+            self._push(t, due_at)
+        return out
+
+    def observe(self, key: str, matches: Iterable[Dict[str, Any]]) -> None:
+        """Reschedule a target from the matches its refresh returned."""
+        t = self.targets.get(key)
+        if t is None:
+            return
+        now = self.clock()
+        starts = [
+            s for s in (start_epoch(m.get("start_time")) for m in matches
+                        if str(m.get("status") or "").lower() not in FINISHED_STATUSES)
+            if s is not None
+        ]
+        if starts:
+            t.starts = starts
+        t.tier = min((match_tier(s, now) for s in t.starts), key=_TIER_RANK.get, default=TIER_IDLE)
+        if t.tier == TIER_IDLE:
+            t.starts = []
+        t.failures = 0
+        t.polls += 1
+        t.in_flight = False
+        self._push(t, now + tier_interval(t.tier))
+
+    def failed(self, key: str) -> None:
+        """Retry with exponential backoff, never later than the target's normal cadence."""
+        t = self.targets.get(key)
+        if t is None:
+            return
+        t.failures += 1
+        t.in_flight = False
+        delay = min(tier_interval(t.tier), POLL_RETRY_BASE * 2 ** (t.failures - 1))
+        self._push(t, self.clock() + delay)
+
+    def defer(self, key: str, delay: float = POLL_RETRY_BASE) -> None:
+        """Hand back a due target that was not polled (no budget for it): due again after delay, no backoff."""
+        t = self.targets.get(key)
+        if t is None:
+            return
+        self.deferred += 1
+        t.in_flight = False
+        self._push(t, self.clock() + delay)
+
+    def next_due(self) -> Optional[float]:
+        while self._heap:
+            _, _, _, key, gen = self._heap[0]
+            t = self.targets.get(key)
+            if t is not None and gen == t.generation and not t.in_flight:
+                return self._heap[0][0]
+            heapq.heappop(self._heap)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        tiers: Dict[str, int] = {}
+        for t in self.targets.values():
+            tiers[t.tier] = tiers.get(t.tier, 0) + 1
+        return {"targets": len(self.targets), "tiers": tiers, "deferred": self.deferred}
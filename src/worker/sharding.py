@@ -0,0 +1,196 @@
+# src/worker/sharding.py
+"""
+Reparto del trabajo de notificaciones entre varios workers (cron_notify.py).
+- shard = parlay_id % WORKER_SHARDS, arrendado a un worker en shard_leases
+- heartbeat() renueva los leases y toma su parte, ceil(shards / workers vivos)
+- los leases de un worker caído expiran tras SHARD_LEASE_TTL
+- el dueño del shard 0 es el líder: ingesta, upsert de match_cache y catálogo
+PgLeaseStore usa Postgres; InMemoryLeaseStore sirve a un solo worker (REST) y a los tests.
+"""
+
+import os
+import math
+import socket
+import time
+from typing import Any, Callable, Dict, Iterable, List, Set
+
+WORKER_SHARDS = int(os.getenv("WORKER_SHARDS", "16"))
+SHARD_LEASE_TTL = float(os.getenv("SHARD_LEASE_TTL", "90"))
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEADER_SHARD = 0
+
+_ENSURE_SQL = "INSERT INTO shard_leases (shard_id) SELECT generate_series(0, $1::int - 1) ON CONFLICT (shard_id) DO NOTHING"
+
+_BEAT_SQL = """
+INSERT INTO worker_heartbeats (owner, seen_at) VALUES ($1, now())
+ON CONFLICT (owner) DO UPDATE SET seen_at = now()
+"""
+
+_LIVE_SQL = "SELECT count(*) FROM worker_heartbeats WHERE seen_at > now() - make_interval(secs => $1)"
+
+_RENEW_SQL = """
+UPDATE shard_leases SET expires_at = now() + make_interval(secs => $2)
+WHERE owner = $1 AND shard_id < $3
+RETURNING shard_id
+"""
+
+_CLAIM_SQL = """
+WITH free AS (
+  SELECT shard_id FROM shard_leases
+  WHERE (owner IS NULL OR expires_at <= now()) AND shard_id < $3
+  ORDER BY shard_id
+  LIMIT $4
+  FOR UPDATE SKIP LOCKED
+)
+UPDATE shard_leases l
+SET owner = $1, expires_at = now() + make_interval(secs => $2)
+FROM free
+WHERE l.shard_id = free.shard_id
+RETURNING l.shard_id
+"""
+
+_RELEASE_SQL = "UPDATE shard_leases SET owner = NULL, expires_at = now() WHERE owner = $1 AND shard_id = ANY($2::int[])"
+
+_LEAVE_SQL = "DELETE FROM worker_heartbeats WHERE owner = $1"
+
+def shard_of(parlay_id: Any, shards: int = WORKER_SHARDS) -> int:
+    return int(parlay_id) % max(1, shards)
+
+class PgLeaseStore:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def ensure(self, shards: int) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute(_ENSURE_SQL, shards)
+
+    async def beat(self, owner: str, ttl: float) -> int:
+        """Record the heartbeat; returns the number of live workers (including this one)."""
+        async with self.pool.acquire() as conn:
+            await conn.execute(_BEAT_SQL, owner)
+            return int(await conn.fetchval(_LIVE_SQL, float(ttl)))
+
+    async def renew(self, owner: str, ttl: float, shards: int) -> Set[int]:
+        async with self.pool.acquire() as conn:
+            return {r["shard_id"] for r in await conn.fetch(_RENEW_SQL, owner, float(ttl), shards)}
+
+    async def claim(self, owner: str, ttl: float, shards: int, limit: int) -> Set[int]:
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                return {r["shard_id"] for r in await conn.fetch(_CLAIM_SQL, owner, float(ttl), shards, limit)}
+
+    async def release(self, owner: str, shard_ids: Iterable[int]) -> None:
+        ids = sorted(shard_ids)
+        if ids:
+            async with self.pool.acquire() as conn:
+                await conn.execute(_RELEASE_SQL, owner, ids)
+
+    async def leave(self, owner: str) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute(_LEAVE_SQL, owner)
+
+class InMemoryLeaseStore:
+    """Same contract as PgLeaseStore, shared by the ShardManagers of one process."""
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.leases: Dict[int, List[Any]] = {}  # shard_id -> [owner, expires_at]
+        self.heartbeats: Dict[str, float] = {}
+
+    async def ensure(self, shards: int) -> None:
+        for sid in range(shards):
+            self.leases.setdefault(sid, [None, 0.0])
+
+    async def beat(self, owner: str, ttl: float) -> int:
+        now = self.clock()
+        self.heartbeats[owner] = now
+        return sum(1 for seen in self.heartbeats.values() if seen > now - ttl)
+
+    async def renew(self, owner: str, ttl: float, shards: int) -> Set[int]:
+        held = set()
+        for sid, lease in self.leases.items():
+            if lease[0] == owner and sid < shards:
+                lease[1] = self.clock() + ttl
+                held.add(sid)
+        return held
+
+    async def claim(self, owner: str, ttl: float, shards: int, limit: int) -> Set[int]:
+        now = self.clock()
+        got = set()
+        for sid in sorted(self.leases):
+            if len(got) >= limit:
+                break
+            lease = self.leases[sid]
+            if sid < shards and (lease[0] is None or lease[1] <= now):
+                self.leases[sid] = [owner, now + ttl]
+                got.add(sid)
+        return got
+
+    async def release(self, owner: str, shard_ids: Iterable[int]) -> None:
+        for sid in shard_ids:
+            lease = self.leases.get(sid)
+            if lease and lease[0] == owner:
+                self.leases[sid] = [None, self.clock()]
+
+    async def leave(self, owner: str) -> None:
+        self.heartbeats.pop(owner, None)
+
+def local_lease_store(environ=None) -> InMemoryLeaseStore:
+    """Lease store without Postgres; only valid when this is the only worker."""
+    env = os.environ if environ is None else environ
+    configured = [name for name in ("WORKER_ID", "WORKER_SHARDS") if env.get(name)]
+    if configured:
+        # every process would hold all shards in its own memory: double sends and upserts
+        raise RuntimeError(
+            f"{'/'.join(configured)} set for a multi-worker deployment but there is no Postgres pool "
+            "(DATABASE_URL) for shard leases; run a single REST-only worker without them"
+        )
+    print("WARNING: no Postgres pool, shard leases are in memory: run only ONE worker")
+    return InMemoryLeaseStore()
+
+class ShardManager:
+    def __init__(self, store, owner: str = WORKER_ID, shards: int = WORKER_SHARDS, ttl: float = SHARD_LEASE_TTL):
+        self.store = store
+        self.owner = owner
+        self.shards = max(1, shards)
+        self.ttl = ttl
+        self.held: Set[int] = set()
+        self.live_workers = 1
+        self._ready = False
+
+    async def heartbeat(self) -> bool:
+        """Renew / rebalance the leases; True when the set of held shards changed."""
+        if not self._ready:
+            await self.store.ensure(self.shards)
+            self._ready = True
+        before = set(self.held)
+        self.live_workers = max(1, await self.store.beat(self.owner, self.ttl))
+        held = await self.store.renew(self.owner, self.ttl, self.shards)
+        share = math.ceil(self.shards / self.live_workers)
+        if len(held) > share:
+            # keep the lowest ids (the leader keeps shard 0), hand the rest back
+            extra = sorted(held)[share:]
+            await self.store.release(self.owner, extra)
+            held -= set(extra)
+        elif len(held) < share:
+            held |= await self.store.claim(self.owner, self.ttl, self.shards, share - len(held))
+        self.held = held
+        return held != before
+
+    def owns(self, parlay_id: Any) -> bool:
+        return shard_of(parlay_id, self.shards) in self.held
+
+    @property
+    def leader(self) -> bool:
+        return LEADER_SHARD in self.held
+
+    def filter(self, notifs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [n for n in notifs if self.owns(n.get("parlay_id"))]
+
+    async def stop(self) -> None:
+        """Hand every shard back right away instead of waiting for the TTL."""
+        await self.store.release(self.owner, self.held)
+        await self.store.leave(self.owner)
+        self.held = set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"owner": self.owner, "held": len(self.held), "shards": self.shards, "live_workers": self.live_workers, "leader": self.leader}
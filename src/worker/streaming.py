@@ -0,0 +1,70 @@
+# src/worker/streaming.py
+"""
+Ingesta en streaming: parseo incremental de respuestas JSON grandes.
+- iter_json_items(stream, prefix): elementos uno a uno con ijson
+- merge_streams(sources): corre varios generadores y entrega (key, item); cola
+  acotada a STREAM_QUEUE_MAX (backpressure), un error llega como (key, exception)
+- batches(items, size): agrupa para el escritor de la DB
+"""
+
+import os
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import ijson
+
+STREAM_CHUNK = int(os.getenv("STREAM_CHUNK", str(64 * 1024)))
+STREAM_QUEUE_MAX = int(os.getenv("STREAM_QUEUE_MAX", "500"))
+STREAM_BATCH = int(os.getenv("STREAM_BATCH", "200"))
+
+_DONE = object()
+
+class _ChunkReader:
+    """Async file-like view over aiohttp's StreamReader (anything with async read(n))."""
+    def __init__(self, stream, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+
+    async def read(self, n: int = -1) -> bytes:
+        return await self.stream.read(self.chunk_size if n is None or n < 0 else n)
+
+async def iter_json_items(stream, prefix: str, chunk_size: int = STREAM_CHUNK) -> AsyncIterator[Any]:
+    """Yield the elements under `prefix` of a JSON body read from `stream` (floats, not Decimal)."""
+    async for item in ijson.items(_ChunkReader(stream, chunk_size), prefix, use_float=True, buf_size=chunk_size):
+        yield item
+
+async def merge_streams(sources: Dict[str, AsyncIterator[Any]], maxsize: int = STREAM_QUEUE_MAX) -> AsyncIterator[Tuple[str, Any]]:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, maxsize))
+
+    async def pump(key: str, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                await queue.put((key, item))
+        except Exception as e:
+            await queue.put((key, e))
+        finally:
+            await queue.put((key, _DONE))
+
+    tasks = [asyncio.create_task(pump(key, src)) for key, src in sources.items()]
+    pending = len(tasks)
+    try:
+        while pending:
+            key, item = await queue.get()
+            if item is _DONE:
+                pending -= 1
+                continue
+            yield key, item
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def batches(items: AsyncIterator[Any], size: int = STREAM_BATCH) -> AsyncIterator[List[Any]]:
+    batch: List[Any] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
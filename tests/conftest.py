@@ -0,0 +1,13 @@
+# tests/conftest.py
+import pytest
+
+class FakeClock:
+    """Manual clock for the clock= parameters (time.time / time.monotonic)."""
+    def __init__(self, now=1_700_000_000.0):  # 2023-11-14 22:13 UTC
+        self.now = now
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -1,8 +1,14 @@
+import asyncio
 import pytest
 from unittest import mock
 
 import src.ingest.api_sports_client as client
 
+@pytest.fixture(autouse=True)
+def no_http_cache(monkeypatch):
+    # sin caché compartida: cada test llega a _fetch
+    monkeypatch.setenv("HTTP_CACHE_PATH", "")
+
 def test_sport_host_map_contains_football():
     assert "football" in client.SPORT_HOST
 
@@ -10,13 +16,63 @@ def test_get_for_sport_invalid():
     with pytest.raises(ValueError):
         client.get_for_sport("sport_que_no_existe", "/fixtures")
 
-@mock.patch("src.ingest.api_sports_client.requests.get")
-def test_do_get_success(mock_get):
-    class DummyResp:
-        status_code = 200
-        def raise_for_status(self): pass
-        def json(self): return {"response": [{"id": 1}]}
-    mock_get.return_value = DummyResp()
+@mock.patch("src.ingest.api_sports_client.AsyncAPISportsClient._fetch")
+def test_do_get_success(mock_fetch):
+    async def fake_fetch(url, params, headers=None):
+        return 200, {"response": [{"id": 1}]}, {}
+    mock_fetch.side_effect = fake_fetch
     res = client.get_for_sport("football", "/fixtures", params={"league": 1})
     assert isinstance(res, dict)
     assert "response" in res
+    mock_fetch.assert_called_once_with("https://v3.football.api-sports.io/fixtures", {"league": 1}, None)
+
+def test_gather_fixtures_bounded_per_host_and_retries(monkeypatch):
+    monkeypatch.setattr(client, "HTTP_BACKOFF", 0.001)
+    active, peak, calls = {}, {}, []
+
+    async def fake_fetch(self, url, params, headers=None):
+        host = url.split("/")[2]
+        async with self._host_sem(url):
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+            calls.append((host, params.get("league")))
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+        if params.get("league") == 3 and calls.count((host, 3)) == 1:
+            return 429, None, {}
+        if params.get("league") == 99:
+            return 404, None, {}
+        return 200, {"response": [params["league"]]}, {}
+
+    monkeypatch.setattr(client.AsyncAPISportsClient, "_fetch", fake_fetch)
+    specs = [{"sport": "football", "league": i, "season": 2025} for i in range(6)]
+    specs += [{"sport": "basketball", "league": 99}]
+
+    async def run():
+        async with client.AsyncAPISportsClient(host_concurrency=2) as c:
+            return await c.gather_fixtures(specs)
+
+    out = asyncio.run(run())
+    assert [r["response"] for r in out[:6]] == [[i] for i in range(6)]
+    assert isinstance(out[6], client.APIClientError)
+    assert peak["v3.football.api-sports.io"] == 2
+    assert calls.count(("v3.football.api-sports.io", 3)) == 2
+
+def test_coalesced_callers_get_their_own_copy(monkeypatch):
+    calls = []
+
+    async def fake_fetch(self, url, params, headers=None):
+        calls.append(params)
+        await asyncio.sleep(0.01)
+        return 200, {"response": [{"id": 1}]}, {}
+
+    monkeypatch.setattr(client.AsyncAPISportsClient, "_fetch", fake_fetch)
+
+    async def run():
+        async with client.AsyncAPISportsClient() as c:
+            return await asyncio.gather(*(c.get_fixtures("football", league=7) for _ in range(3)))
+
+    a, b, c = asyncio.run(run())
+    assert len(calls) == 1
+    a["response"].append({"id": 2})
+    assert b == c == {"response": [{"id": 1}]}
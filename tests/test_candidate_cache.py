@@ -0,0 +1,53 @@
+# tests/test_candidate_cache.py
+import asyncio
+import numpy as np
+import pytest
+from src.parlay.cache import CandidateCache
+
+class FakeTable:
+    def __init__(self, n):
+        self.odds = np.ones(n)
+
+def _loader(calls):
+    async def load(conn, sports, window_hours):
+        calls.append((sports, window_hours))
+        await asyncio.sleep(0.01)
+        return FakeTable(len(calls))
+    return load
+
+def test_hits_share_one_snapshot():
+    calls = []
+    cache = CandidateCache(_loader(calls), ttl=60, max_size=4)
+    async def run():
+        a, b = await asyncio.gather(cache.get(None), cache.get(None))
+        c = await cache.get(None)
+        return a, b, c
+    a, b, c = asyncio.run(run())
+    assert a is b is c
+    assert len(calls) == 1
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 2
+    with pytest.raises(ValueError):
+        a.odds[0] = 2.0  # shared snapshot is read-only
+
+def test_key_is_sports_and_window():
+    calls = []
+    cache = CandidateCache(_loader(calls), ttl=60, max_size=4)
+    async def run():
+        await cache.get(None, ["Soccer", "tennis"], 24)
+        await cache.get(None, ["tennis", "soccer"], 24)
+        await cache.get(None, ["tennis", "soccer"], 48)
+    asyncio.run(run())
+    assert calls == [(["soccer", "tennis"], 24), (["soccer", "tennis"], 48)]
+
+def test_ttl_lru_and_invalidate():
+    calls = []
+    cache = CandidateCache(_loader(calls), ttl=0, max_size=1)
+    asyncio.run(cache.get(None))
+    asyncio.run(cache.get(None))  # expired immediately
+    assert len(calls) == 2
+    cache = CandidateCache(_loader(calls), ttl=60, max_size=1)
+    asyncio.run(cache.get(None, ["a"]))
+    asyncio.run(cache.get(None, ["b"]))
+    assert cache.stats()["size"] == 1
+    cache.invalidate()
+    assert cache.stats()["size"] == 0 and cache.stats()["invalidations"] == 1
@@ -0,0 +1,73 @@
+# tests/test_delivery_queue.py
+import asyncio
+from src.utils.ratelimit import TokenBucket
+from src.worker.delivery import DeliveryQueue, RetryAfter, coalesce
+
+def test_token_bucket_refill_and_pause(clock):
+    b = TokenBucket(rate=2, capacity=2, clock=clock)
+    assert b.try_acquire() == 0 and b.try_acquire() == 0
+    assert abs(b.try_acquire() - 0.5) < 1e-9
+    clock.now += 0.5
+    assert b.try_acquire() == 0
+    b.pause(3)
+    assert abs(b.try_acquire() - 3.0) < 1e-9
+    clock.now += 3.5
+    assert b.try_acquire() == 0
+
+def test_coalesce_per_chat_and_split():
+    out = coalesce([(1, "a"), (2, "b"), (1, "c"), (1, "x" * 10)], max_len=8)
+    assert out == [(1, "a\n\nc"), (1, "x" * 10), (2, "b")]
+
+def test_queue_retries_429_and_reports_metrics():
+    sent, calls = [], {"n": 0}
+
+    async def send(chat_id, text):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise RetryAfter(0.01)
+        if chat_id == 3:
+            raise RuntimeError("chat not found")
+        sent.append((chat_id, text))
+
+    async def run():
+        q = DeliveryQueue(send, workers=2, global_rate=1000, chat_rate=1000)
+        q.start()
+        q.enqueue_batch([(1, "a"), (1, "b"), (2, "c"), (3, "d")])
+        await q.join()
+        m = q.metrics()
+        await q.stop()
+        return m
+
+    m = asyncio.run(run())
+    assert sorted(sent) == [(1, "a\n\nb"), (2, "c")]
+    assert m["sent"] == 2 and m["failed"] == 1 and m["retried"] == 1 and m["coalesced"] == 1
+    assert m["queue_depth"] == 0
+
+def test_retry_on_full_queue_is_dropped_not_blocking():
+    sent = []
+
+    async def run():
+        in_send = asyncio.Event()
+        release = asyncio.Event()
+
+        async def send(chat_id, text):
+            if chat_id == 1:
+                in_send.set()
+                await release.wait()
+                raise RetryAfter(0)
+            sent.append((chat_id, text))
+
+        q = DeliveryQueue(send, workers=1, global_rate=1000, chat_rate=1000, max_queue=1)
+        q.start()
+        assert q.enqueue(1, "a")
+        await in_send.wait()
+        assert q.enqueue(2, "b")  # the queue is full while "a" gets its 429
+        release.set()
+        await asyncio.wait_for(q.join(), 1.0)
+        m = q.metrics()
+        await q.stop()
+        return m
+
+    m = asyncio.run(run())
+    assert sent == [(2, "b")]
+    assert m["dropped"] == 1 and m["retried"] == 0 and m["sent"] == 1
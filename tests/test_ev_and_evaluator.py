@@ -39,3 +39,128 @@ def test_evaluator_correct_score():
     match_final = {"status":"finished","home":"A","away":"B","home_score":2,"away_score":1}
     leg = {"market":"Correct Score","selection":"2-1"}
     assert evaluate_leg(leg, match_final) is True
+
+def test_parse_leg_is_memoized_and_json_safe():
+    import json
+    from src.parlay.evaluator import parse_leg, _parse_leg_cached
+    a = parse_leg("Match Winner", "Team A", "Team A", "Team B")
+    b = parse_leg("Match Winner", "Team A", "Team A", "Team B")
+    assert a == b == {"type": "moneyline", "side": "home"}
+    a["side"] = "away"  # callers get copies, the cache is not mutated
+    assert parse_leg("Match Winner", "Team A", "Team A", "Team B")["side"] == "home"
+    assert _parse_leg_cached.cache_info().hits >= 2
+    assert json.loads(json.dumps(parse_leg("Over/Under 2.5", "Over 2.5"))) == {"type": "over_under", "side": "over", "line": 2.5}
+
+def test_evaluator_uses_stored_parsed_metadata():
+    match_final = {"status":"finished","home":"A","away":"B","home_score":0,"away_score":3}
+    # selection text would not parse; the stored representation is used instead
+    leg = {"market":"???","selection":"???","metadata":'{"parsed": {"type": "moneyline", "side": "away"}}'}
+    assert evaluate_leg(leg, match_final) is True
+
+def _random_cases(n, seed=3):
+    import random
+    rng = random.Random(seed)
+    markets = [
+        ("Moneyline", ["Home", "Away", "Draw", "Team A", "Team B", "Nobody"]),
+        ("Match Winner", ["home", "away", "draw"]),
+        ("Over/Under 2.5", ["Over 2.5", "Under 2.5", "Over 3", "Under 1"]),
+        ("Totals", ["o2.5", "u3.5", "Over 0.5"]),
+        ("Both Teams To Score", ["Yes", "No", "si"]),
+        ("Correct Score", ["2-1", "0:0", "1 - 3"]),
+        ("Handicap", ["Home -1", "Away +1.5", "Team A -0.5", "+2", "Away -2", "Home -0.25", "Team B +0.75", "Home 0, -0.5"]),
+        ("Team Totals", ["Home Over 1.5", "Away Under 0.5", "Team A Over 1", "Zzz Over 2.5", "Away Over 1.25"]),
+        ("Draw No Bet", ["Team A", "Team B", "Draw"]),
+        ("Weird market", ["???"]),
+        ("Map 2 Winner", ["Team A", "Team B", "Home"]),
+        ("Map 3 Winner", ["Team A", "Away"]),
+        ("Map Handicap", ["Team A -1.5", "Away +1.5", "Home -0.5"]),
+        ("Total Maps", ["Over 2.5", "Under 2.5", "Over 4.5"]),
+        ("Correct Map Score", ["2-1", "2-0", "1-2"]),
+    ]
+    map_scores = [(1, 0), (0, 1), (13, 9), (7, 7), (None, None)]
+    statuses = ["finished", "Finished", "post", "inplay", "postponed", "Cancelled", None]
+    winners = [None, None, None, "home", "away", "draw", "Home"]
+    scores = [0, 1, 2, 3, 4, None, "x"]
+    legs, finals = [], []
+    for _ in range(n):
+        market, sels = rng.choice(markets)
+        legs.append({"market": market, "selection": rng.choice(sels)})
+        finals.append({
+            "status": rng.choice(statuses), "home": "Team A", "away": "Team B",
+            "home_score": rng.choice(scores), "away_score": rng.choice(scores), "winner": rng.choice(winners),
+        })
+        if rng.random() < 0.3:
+            finals[-1]["maps"] = [
+                {"home_score": h, "away_score": a, "status": rng.choice(["finished", "running", None]),
+                 "winner": rng.choice([None, None, "home", "away"])}
+                for h, a in (rng.choice(map_scores) for _ in range(rng.randint(0, 4)))
+            ]
+    return legs, finals
+
+def test_bulk_settlement_matches_settle_leg():
+    from src.parlay.evaluator import evaluate_legs, settle_leg, RESULT_WIN, RESULT_LOSS, RESULT_UNKNOWN, RESULT_PUSH, RESULT_VOID
+    legs, finals = _random_cases(3000)
+    bulk = evaluate_legs(legs, finals)
+    for i, (leg, mf) in enumerate(zip(legs, finals)):
+        assert bulk[i] == settle_leg(leg, mf), (leg, mf, bulk[i])
+    assert {RESULT_WIN, RESULT_LOSS, RESULT_UNKNOWN, RESULT_PUSH, RESULT_VOID} <= set(bulk.tolist())
+
+@pytest.mark.parametrize("market,selection,home_score,away_score,expected", [
+    ("Asian Handicap", "Home -0.25", 1, 1, "half_loss"),
+    ("Asian Handicap", "Home -0.25", 2, 1, "win"),
+    ("Asian Handicap", "Away +0.75", 1, 2, "win"),
+    ("Asian Handicap", "Away +0.75", 2, 1, "half_loss"),
+    ("Asian Handicap", "Home -1", 2, 1, "push"),
+    ("Asian Handicap", "Team A -0.5, -1", 2, 1, "half_win"),
+    ("Asian Handicap", "Team B +1.25", 2, 1, "half_win"),
+    ("Over/Under", "Over 2.25", 1, 1, "half_loss"),
+    ("Over/Under", "Over 2.75", 2, 1, "half_win"),
+    ("Over/Under", "Under 3", 2, 1, "push"),
+    ("Draw No Bet", "Team A", 1, 1, "push"),
+    ("Draw No Bet", "Team B", 0, 1, "win"),
+])
+def test_settle_leg_quarter_lines_and_push(market, selection, home_score, away_score, expected):
+    from src.parlay.evaluator import settle_leg, evaluate_legs, RESULT_NAMES
+    mf = {"status": "finished", "home": "Team A", "away": "Team B", "home_score": home_score, "away_score": away_score}
+    leg = {"market": market, "selection": selection}
+    assert RESULT_NAMES[settle_leg(leg, mf)] == expected
+    assert RESULT_NAMES[int(evaluate_legs([leg], [mf])[0])] == expected
+
+def test_settle_leg_void_and_payout():
+    from src.parlay.evaluator import settle_leg, payout_multiplier, RESULT_VOID, RESULT_WIN, RESULT_HALF_WIN, RESULT_PUSH, RESULT_HALF_LOSS, RESULT_LOSS
+    mf = {"status": "Postponed", "home": "A", "away": "B"}
+    leg = {"market": "Moneyline", "selection": "Home"}
+    assert settle_leg(leg, mf) == RESULT_VOID
+    assert evaluate_leg(leg, mf) is None
+    got = payout_multiplier([RESULT_WIN, RESULT_HALF_WIN, RESULT_PUSH, RESULT_VOID, RESULT_HALF_LOSS, RESULT_LOSS], 1.9)
+    assert got.tolist() == pytest.approx([1.9, 1.45, 1.0, 1.0, 0.5, 0.0])
+
+def test_handicap_unknown_side_is_undecided():
+    mf = {"status": "finished", "home": "A", "away": "B", "home_score": 2, "away_score": 0}
+    assert evaluate_leg({"market": "Handicap", "selection": "+2"}, mf) is None
+
+def test_esports_map_markets():
+    from src.parlay.evaluator import settle_leg, evaluate_legs, RESULT_NAMES
+    maps = [{"home_score": 13, "away_score": 9}, {"home_score": 5, "away_score": 13}, {"home_score": 13, "away_score": 11}]
+    done = {"status": "finished", "home": "Team A", "away": "Team B", "home_score": 2, "away_score": 1, "maps": maps}
+    live = {"status": "inplay", "home": "Team A", "away": "Team B", "maps": [
+        {"home_score": 13, "away_score": 9, "status": "finished"}, {"home_score": 3, "away_score": 4, "status": "running"}]}
+    cases = [
+        ({"market": "Map 1 Winner", "selection": "Team A"}, done, "win"),
+        ({"market": "Map 2 Winner", "selection": "Team A"}, done, "loss"),
+        ({"market": "Map 4 Winner", "selection": "Team B"}, done, "void"),
+        ({"market": "Map Handicap", "selection": "Team A -1.5"}, done, "loss"),
+        ({"market": "Map Handicap", "selection": "Team B +1.5"}, done, "win"),
+        ({"market": "Total Maps", "selection": "Over 2.5"}, done, "win"),
+        ({"market": "Correct Map Score", "selection": "2-1"}, done, "win"),
+        # in play: map 1 is over, map 2 and series markets wait
+        ({"market": "Map 1 Winner", "selection": "Team A"}, live, "win"),
+        ({"market": "Map 2 Winner", "selection": "Team A"}, live, "unknown"),
+        ({"market": "Total Maps", "selection": "Under 2.5"}, live, "unknown"),
+        # no per-map data: the match score counts maps (PandaScore)
+        ({"market": "Total Maps", "selection": "Under 2.5"}, {"status": "finished", "home_score": 2, "away_score": 0}, "win"),
+    ]
+    bulk = evaluate_legs([c[0] for c in cases], [c[1] for c in cases])
+    for (leg, mf, expected), b in zip(cases, bulk):
+        assert RESULT_NAMES[settle_leg(leg, mf)] == expected, leg
+        assert RESULT_NAMES[int(b)] == expected, leg
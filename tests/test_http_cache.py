@@ -0,0 +1,66 @@
+# tests/test_http_cache.py
+import pytest
+import requests
+from src.ingest.http_cache import CacheMiss, HTTPCache, cache_key, cached_get_json, endpoint_ttl
+
+class FakeResponse:
+    def __init__(self, status, data=None, headers=None):
+        self.status_code = status
+        self._data = data
+        self.headers = headers or {}
+    def json(self):
+        return self._data
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append((url, params, headers))
+        return self.responses.pop(0)
+
+URL = "https://v3.football.api-sports.io/fixtures"
+
+def test_key_ignores_auth_and_param_order():
+    assert cache_key(URL, {"league": 1, "date": "2025-01-01"}) == cache_key(URL + "?date=2025-01-01", {"league": "1"})
+    assert cache_key("https://api.pandascore.co/matches", {"token": "a"}) == cache_key("https://api.pandascore.co/matches", {"token": "b"})
+    assert endpoint_ttl(URL + "/lineups") == 1800
+    assert endpoint_ttl("https://v1.basketball.api-sports.io/teams") == 7 * 86400
+
+def test_ttl_then_etag_revalidation(tmp_path, clock):
+    cache = HTTPCache(str(tmp_path / "c.sqlite"), clock=clock)
+    body = {"response": [{"fixture": {"id": 1}}]}
+    sess = FakeSession([FakeResponse(200, body, {"ETag": '"v1"'}), FakeResponse(304)])
+    params = {"league": 39}
+    assert cached_get_json(URL, params, cache=cache, session=sess) == body
+    clock.now += 60
+    assert cached_get_json(URL, params, cache=cache, session=sess) == body  # fresh: no request
+    assert len(sess.calls) == 1
+    clock.now += 600
+    assert cached_get_json(URL, params, cache=cache, session=sess) == body
+    assert sess.calls[1][2]["If-None-Match"] == '"v1"'
+    assert cache.lookup(URL, params).fresh  # the 304 renewed the TTL
+    assert cache.stats()["revalidated"] == 1
+
+def test_lru_eviction_and_offline_replay(tmp_path, clock):
+    path = str(tmp_path / "c.sqlite")
+    cache = HTTPCache(path, clock=clock)
+    for league in range(4):
+        cache.store(URL, {"league": league}, {"league": league, "response": list(range(league, league + 500))})
+        clock.now += 1
+        cache.lookup(URL, {"league": 0})  # league 0 stays recently used
+        if league == 0:
+            cache.max_bytes = int(cache.stats()["bytes"] * 2.5)  # room for two entries
+    assert cache.stats()["bytes"] <= cache.max_bytes
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(URL, {"league": 0}) is not None
+    assert cache.lookup(URL, {"league": 1}) is None
+    clock.now += 86400
+    offline = HTTPCache(path, offline=True, clock=clock)
+    assert offline.lookup(URL, {"league": 0}).fresh is False
+    assert cached_get_json(URL, {"league": 0}, cache=offline, session=FakeSession([]))["league"] == 0
+    with pytest.raises(CacheMiss):
+        cached_get_json(URL, {"league": 1}, cache=offline, session=FakeSession([]))
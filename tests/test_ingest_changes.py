@@ -0,0 +1,39 @@
+# tests/test_ingest_changes.py
+from src.worker.changes import MarketsDigests, markets_digest, OddsDelta
+
+def _match(odds_home, start="2024-06-01T18:00:00Z", provider="A"):
+    return {"match_id": "m1", "sport": "soccer", "start_time": start,
+            "markets": {"Match Winner": [{"selection": "Home", "odds": odds_home, "provider": provider},
+                                         {"selection": "Away", "odds": 2.9, "provider": provider}]}}
+
+def test_digest_ignores_order_provider_and_case():
+    a = {"Match Winner": [{"selection": "Home", "odds": 1.8, "provider": "x"}, {"selection": "Away", "odds": 2.9}]}
+    b = {"match winner ": [{"selection": "Away", "odds": 2.9000001}, {"selection": "HOME", "odds": 1.8, "provider": "y"}]}
+    assert markets_digest(a) == markets_digest(b)
+    assert markets_digest(a) != markets_digest({"Match Winner": [{"selection": "Home", "odds": 1.85}]})
+
+def test_diff_skips_unchanged_and_emits_deltas():
+    store = MarketsDigests()
+    changed, deltas = store.diff([_match(1.8)])
+    assert len(changed) == 1 and changed[0]["markets_hash"]
+    assert {d.old_odds for d in deltas} == {None}  # first sighting: every selection is new
+    store.commit(changed)
+
+    changed, deltas = store.diff([_match(1.8, provider="B")])
+    assert changed == [] and deltas == []
+
+    changed, deltas = store.diff([_match(1.95)])
+    assert len(changed) == 1
+    assert deltas == [OddsDelta("m1", "match winner", "home", 1.8, 1.95)]
+
+    # kickoff moved: rewritten, no odds moves
+    changed, deltas = store.diff([_match(1.8, start="2024-06-01T19:00:00Z")])
+    assert len(changed) == 1 and deltas == []
+
+def test_primed_digest_skips_write_after_restart():
+    store = MarketsDigests()
+    m = _match(1.8)
+    store.prime([{"match_id": "m1", "markets_hash": markets_digest(m["markets"]), "sport": "soccer", "start_time": "2024-06-01T18:00:00+00:00"}])
+    assert store.diff([m]) == ([], [])
+    changed, deltas = store.diff([_match(2.0)])
+    assert len(changed) == 1 and deltas == []  # no remembered odds yet
@@ -0,0 +1,98 @@
+# tests/test_match_cache_upsert.py
+import asyncio
+from datetime import datetime, timezone
+from src.worker.match_cache import bulk_upsert_match_cache, stage_records, classify_records
+
+class FakeConn:
+    def __init__(self, copy_fails=False):
+        self.calls = []
+        self.copy_fails = copy_fails
+
+    def transaction(self):
+        class Tx:
+            async def __aenter__(self):
+                return None
+            async def __aexit__(self, *exc):
+                return False
+        return Tx()
+
+    async def execute(self, sql, *args):
+        self.calls.append(("execute", sql))
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.copy_fails:
+            raise RuntimeError("COPY not allowed")
+        self.calls.append(("copy", table, list(records), columns))
+
+    async def fetchrow(self, sql, *args):
+        self.calls.append(("fetchrow", sql, args))
+        n = len(args[0]) if args else len(self.calls[-2][2])
+        return {"inserted": 1, "updated": n - 2}
+
+def _matches(n):
+    return [{"match_id": i % (n - 1), "sport": "soccer", "home": "A", "away": "B",
+             "start_time": "2024-06-01T18:00:00Z", "markets": {"Moneyline": [{"selection": "Home", "odds": 1.8}]}}
+            for i in range(n)]
+
+def test_copy_merge_single_round_trip():
+    conn = FakeConn()
+    counts = asyncio.run(bulk_upsert_match_cache(conn, _matches(6)))
+    kinds = [c[0] for c in conn.calls]
+    assert kinds == ["execute", "copy", "fetchrow"]
+    staged = conn.calls[1][2]
+    assert len(staged) == 5  # duplicate match_id collapsed
+    assert staged[0][4] == datetime(2024, 6, 1, 18, tzinfo=timezone.utc)
+    assert counts == {"inserted": 1, "updated": 3, "unchanged": 1}
+
+def test_chunked_merge_when_copy_fails(monkeypatch):
+    import src.worker.match_cache as mc
+    monkeypatch.setattr(mc, "MATCH_CACHE_CHUNK", 2)
+    conn = FakeConn(copy_fails=True)
+    counts = asyncio.run(bulk_upsert_match_cache(conn, _matches(6)))
+    merges = [c for c in conn.calls if c[0] == "fetchrow"]
+    assert [len(c[2][0]) for c in merges] == [2, 2, 1]
+    assert sum(counts.values()) == 5
+
+def test_classify_records_for_rest():
+    records = stage_records(_matches(4))
+    existing = {
+        "0": {"match_id": "0", "sport": "soccer", "start_time": "2024-06-01T18:00:00+00:00", "markets": '{"Moneyline": [{"selection": "Home", "odds": 1.8}]}'},
+        "1": {"match_id": "1", "sport": "soccer", "start_time": "2024-06-01T18:00:00+00:00", "markets": {"Moneyline": []}},
+    }
+    to_write, counts = classify_records(records, existing)
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1}
+    assert [r[0] for r in to_write] == ["1", "2"]
+
+def test_rest_upsert_reads_markets_only_for_unhashed_rows(monkeypatch):
+    import scripts.cron_notify as cn
+    records = stage_records(_matches(4))
+    stored = {
+        "0": {"match_id": "0", "sport": "soccer", "start_time": "2024-06-01T18:00:00+00:00", "markets_hash": records[0][7]},
+        "1": {"match_id": "1", "sport": "soccer", "start_time": "2024-06-01T18:00:00+00:00", "markets_hash": None},
+    }
+    selects = []
+
+    async def fake_fetch_in(self, table, column, values, select="*"):
+        selects.append((select, sorted(values)))
+        if select == "match_id,markets":
+            return [{"match_id": v, "markets": {"Moneyline": [{"selection": "Home", "odds": 1.8}]}} for v in values]
+        return [dict(stored[v]) for v in values if v in stored]
+
+    class Session:
+        posted = []
+        def post(self, url, headers=None, json=None):
+            Session.posted.extend(row["match_id"] for row in json)
+            class Resp:
+                status = 201
+                async def __aenter__(self):
+                    return self
+                async def __aexit__(self, *exc):
+                    return False
+            return Resp()
+
+    monkeypatch.setattr(cn.DBClient, "_rest_fetch_in", fake_fetch_in)
+    db = cn.DBClient(None, "http://supabase", "key")
+    db.session = Session()
+    counts = asyncio.run(db.upsert_match_cache_bulk(_matches(4)))
+    assert selects == [("match_id,sport,start_time,markets_hash", ["0", "1", "2"]), ("match_id,markets", ["1"])]
+    assert counts["unchanged"] == 2 and counts["inserted"] == 1 and Session.posted == ["2"]
@@ -0,0 +1,62 @@
+# tests/test_notification_pass.py
+import json
+from src.worker.notifications import build_notification_pass, MarketLookup
+
+def _fixture(n_notifs):
+    matches = {
+        "m1": {"match_id": "m1", "home": "A", "away": "B", "status": "finished", "home_score": 2, "away_score": 0,
+               "markets": json.dumps({"Match Winner": [{"selection": "Home", "odds": 1.5}, {"selection": "Away", "odds": 3.0}]})},
+        "m2": {"match_id": "m2", "home": "C", "away": "D", "status": "not_started", "home_score": None, "away_score": None,
+               "markets": {"Over/Under": [{"selection": "Over 2.5", "odds": 2.4}]}},
+    }
+    notifs, legs = [], []
+    for i in range(n_notifs):
+        notifs.append({"id": i, "user_id": 100 + i, "parlay_id": i, "parlay_total_odds": 3.0,
+                       "trigger_config": '{"threshold_pct": 10}' if i % 2 else None})
+        legs.append({"parlay_id": i, "match_id": "m1", "market": "Match Winner", "selection": "Home", "odds": 1.5})
+        legs.append({"parlay_id": i, "match_id": "m2", "market": "Over/Under", "selection": "Over 2.5", "odds": 2.0})
+    return notifs, legs, matches
+
+def test_notification_pass_odds_change_and_leg_won():
+    notifs, legs, matches = _fixture(4)
+    plan = build_notification_pass(notifs, legs, matches)
+    # 1.5 * 2.4 = 3.6 vs 3.0 saved: +20% (over both thresholds); the m1 Home leg is won
+    assert plan.odds_changes == 4
+    assert plan.legs_won == 4
+    assert sorted(plan.notified_ids) == [0, 1, 2, 3]
+    assert any("Cuota actual: 3.60" in text for _, text in plan.messages)
+    assert any(text.startswith("✅ ¡Una leg de tu Parlay #2 se ganó!") for _, text in plan.messages)
+
+def test_notification_pass_missing_match_falls_back_to_leg_odds():
+    notifs, legs, _ = _fixture(1)
+    plan = build_notification_pass(notifs, legs, {})
+    # 1.5 * 2.0 = saved odds: nothing to send
+    assert plan.messages == [] and plan.notified_ids == []
+
+def test_market_lookup_heuristic():
+    lk = MarketLookup({"Over/Under 2.5": [{"selection": "Under 2.5", "odds": 1.7}], "Goals Over/Under": [{"selection": "Over 2.5", "odds": 2.1}]})
+    assert lk.odds_for("Over/Under", "Over 2.5") == 2.1
+    assert lk.odds_for("Corners", "Over 9.5") == 1.7  # first odds available
+
+def test_odds_index_reprices_only_affected_parlays():
+    from src.worker.changes import MarketsDigests
+    from src.worker.odds_index import OddsIndex
+    notifs, legs, matches = _fixture(4)
+    legs[-1]["match_id"] = "m3"  # parlay 3 does not use m2
+    index = OddsIndex(refresh_seconds=3600)
+    index.rebuild(notifs, legs, matches)
+    assert not index.stale()
+    assert index.tracked[0].current_total_odds == 1.5 * 2.4
+
+    digests = MarketsDigests()
+    digests.commit(digests.diff([{"match_id": "m2", "markets": matches["m2"]["markets"]}])[0])
+    changed, deltas = digests.diff([{"match_id": "m2", "markets": {"Over/Under": [{"selection": "Over 2.5", "odds": 3.0}]}}])
+    plan = index.apply(changed, deltas)
+    assert index.repriced == 3
+    assert index.tracked[0].current_total_odds == 1.5 * 3.0
+    assert index.tracked[3].current_total_odds == 1.5 * 2.0
+    assert sorted(plan.notified_ids) == [0, 1, 2]
+    assert all("Cuota actual: 4.50" in text for _, text in plan.messages)
+
+    # nothing moved on indexed matches: no work
+    assert index.apply([], []).messages == []
@@ -0,0 +1,95 @@
+# tests/test_notify_state.py
+import asyncio
+from src.worker.notify_state import NotificationStateStore
+from src.worker.notifications import build_notification_pass
+
+def test_odds_move_cooldown_and_hysteresis(clock):
+    st = NotificationStateStore(cooldown=600, rearm_ratio=0.5, clock=clock)
+    assert st.odds_move(1, 12.0, 10.0, 3.36) is True
+    clock.now += 30
+    assert st.odds_move(1, 12.0, 10.0, 3.36) is False      # still above threshold: no re-fire
+    assert st.odds_move(1, 7.0, 10.0, 3.21) is False       # inside the hysteresis band: stays fired
+    assert st.odds_move(1, 4.0, 10.0, 3.12) is False       # re-armed
+    assert st.odds_move(1, 11.0, 10.0, 3.33) is False      # re-armed but still cooling down
+    clock.now += 600
+    assert st.odds_move(1, 11.0, 10.0, 3.33) is True
+    clock.now += 600
+    assert st.odds_move(1, 25.0, 10.0, 3.75) is True       # moved another threshold since the last alert
+
+def _pass_inputs():
+    notifs = [{"id": 7, "user_id": 1, "parlay_id": 3, "parlay_total_odds": 1.5, "trigger_config": {"threshold_pct": 50}}]
+    legs = [{"id": 70, "parlay_id": 3, "match_id": "m1", "market": "Moneyline", "selection": "Home", "odds": 1.5},
+            {"id": 71, "parlay_id": 3, "match_id": "m2", "market": "Moneyline", "selection": "Home", "odds": 1.0}]
+    matches = {"m1": {"status": "finished", "home": "A", "away": "B", "home_score": 1, "away_score": 0},
+               "m2": {"status": "finished", "home": "C", "away": "D", "home_score": 0, "away_score": 2}}
+    return notifs, legs, matches
+
+def test_leg_won_delivered_once_and_handled_legs_skipped(monkeypatch):
+    import src.worker.notifications as nmod
+    st = NotificationStateStore()
+    first = build_notification_pass(*_pass_inputs(), state=st)
+    assert first.legs_won == 1 and len(first.messages) == 1
+    assert st.leg_done(7, 70) and st.leg_done(7, 71)  # won leg fired, lost leg settled
+
+    seen = []
+    real = nmod.evaluate_legs
+    monkeypatch.setattr(nmod, "evaluate_legs", lambda legs, finals: seen.append(len(legs)) or real(legs, finals))
+    second = build_notification_pass(*_pass_inputs(), state=st)
+    assert second.messages == [] and seen == []
+
+def test_legs_settled_when_leg_won_alerts_are_off(monkeypatch):
+    import src.worker.notifications as nmod
+    notifs, legs, matches = _pass_inputs()
+    notifs[0]["trigger_config"] = {"threshold_pct": 50, "notify_on_leg_won": False}
+    st = NotificationStateStore()
+    first = build_notification_pass(notifs, legs, matches, state=st)
+    assert first.messages == [] and st.leg_done(7, 70) and st.leg_done(7, 71)
+
+    seen = []
+    real = nmod.evaluate_legs
+    monkeypatch.setattr(nmod, "evaluate_legs", lambda legs, finals: seen.append(len(legs)) or real(legs, finals))
+    build_notification_pass(notifs, legs, matches, state=st)
+    assert seen == []
+
+def test_state_flush_writes_dirty_rows_once():
+    class Conn:
+        def __init__(self):
+            self.batches = []
+        async def executemany(self, sql, records):
+            self.batches.append(list(records))
+    st = NotificationStateStore()
+    st.leg_won(7, 70)
+    st.leg_settled(7, 71)
+    conn = Conn()
+    assert asyncio.run(st.flush(conn)) == 2
+    assert asyncio.run(st.flush(conn)) == 0
+    assert [r[:4] for r in conn.batches[0]] == [(7, 70, "leg_won", "fired"), (7, 71, "leg_won", "settled")]
+
+def test_rest_rows_with_iso_fired_at_after_restart(clock):
+    class Conn:
+        async def executemany(self, sql, records):
+            self.records = list(records)
+    st = NotificationStateStore(cooldown=600, clock=clock)
+    # Supabase REST returns timestamptz as ISO strings
+    st.load_rows([{"notification_id": 7, "leg_id": 0, "event_type": "odds_move", "state": "fired",
+                   "last_value": "3.36", "fired_at": "2023-11-14T22:03:20Z"}])
+    assert st.odds_move(7, 30.0, 10.0, 4.5) is True  # 10 min after the stored alert: cooled
+    conn = Conn()
+    assert asyncio.run(st.flush(conn)) == 1
+    assert conn.records[0][3] == "fired"
+
+def test_dropped_leg_won_message_is_sent_next_pass():
+    from src.worker.delivery import DeliveryQueue
+    st = NotificationStateStore()
+    first = build_notification_pass(*_pass_inputs(), state=st)
+    assert first.leg_events == {0: (7, 70)}
+    released = []
+    q = DeliveryQueue(lambda chat_id, text: None, max_queue=1, on_dropped=released.extend)
+    q.enqueue(9, "fills the queue")
+    assert q.enqueue_batch(first.messages, first.leg_events) == 0
+    assert released == [(7, 70)]
+    for notif_id, leg_id in released:
+        st.leg_unsent(notif_id, leg_id)
+    assert not st.leg_done(7, 70)
+    again = build_notification_pass(*_pass_inputs(), state=st)
+    assert again.legs_won == 1 and again.leg_events == {0: (7, 70)}
@@ -0,0 +1,130 @@
+# tests/test_oddsapi_fanout.py
+import json
+import asyncio
+from src.utils.ratelimit import QuotaLimiter
+from src.worker.oddsapi import OddsApiQuota, fetch_odds, load_oddsapi_slugs
+
+def _quota(reserve, clock=lambda: 1000.0):
+    # the-odds-api credits live in the shared limiter; a private one per test
+    return OddsApiQuota(QuotaLimiter({"oddsapi": {"reserve": reserve, "probe_interval": 3600}}, clock=clock))
+
+class FakeStream:
+    def __init__(self, data):
+        self.data = data
+    async def read(self, n=-1):
+        chunk, self.data = self.data[:n], self.data[n:]
+        return chunk
+
+class FakeResponse:
+    def __init__(self, status, body, headers):
+        self.status = status
+        self._body = body
+        self.headers = headers
+        self.content = FakeStream(json.dumps(body).encode())
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, *exc):
+        return False
+    async def json(self):
+        return self._body
+    async def text(self):
+        return json.dumps(self._body)
+
+class FakeSession:
+    def __init__(self, remaining=500, fail=()):
+        self.remaining = remaining
+        self.fail = set(fail)
+        self.calls = []
+        self.active = self.peak = 0
+
+    def get(self, url, params=None, timeout=None, headers=None):
+        slug = url.rsplit("/", 2)[-2]
+        self.calls.append(slug)
+        session = self
+
+        class Ctx(FakeResponse):
+            async def __aenter__(self):
+                session.active += 1
+                session.peak = max(session.peak, session.active)
+                await asyncio.sleep(0.01)
+                session.active -= 1
+                return self
+
+        self.remaining -= 3
+        headers = {"x-requests-remaining": str(self.remaining), "x-requests-used": "10", "x-requests-last": "3"}
+        if slug in self.fail:
+            return Ctx(500, {"message": "boom"}, headers)
+        event = {"id": f"{slug}-1", "sport_key": slug, "home_team": "A", "away_team": "B",
+                 "bookmakers": [{"title": "bk", "markets": [{"key": "h2h", "outcomes": [{"name": "A", "price": 1.9}]}]}]}
+        return Ctx(200, [event], headers)
+
+def test_load_slugs_from_config(tmp_path):
+    cfg = {"soccer": {"enabled": True, "oddsapi_slugs": ["soccer_epl", "soccer_epl"]},
+           "tennis": {"enabled": False, "oddsapi_slugs": ["tennis_atp"]},
+           "basketball": {"enabled": True, "oddsapi_slugs": ["basketball_nba"]}}
+    p = tmp_path / "markets_sources.json"
+    p.write_text(json.dumps(cfg))
+    assert load_oddsapi_slugs(str(p)) == ["soccer_epl", "basketball_nba"]
+    assert "soccer_epl" in load_oddsapi_slugs(str(tmp_path / "missing.json"))
+
+def test_fanout_is_bounded_and_survives_failures():
+    session = FakeSession(fail={"b"})
+    quota = _quota(0)
+    out = asyncio.run(fetch_odds(session, "key", ["a", "b", "c", "d"], quota, concurrency=2))
+    assert sorted(session.calls) == ["a", "b", "c", "d"]
+    assert session.peak == 2
+    assert sorted(m["match_id"] for m in out) == ["a-1", "c-1", "d-1"]
+    assert out[0]["markets"]["h2h"][0]["odds"] == 1.9
+    assert quota.remaining == 488 and quota.last_cost == 3
+
+def test_quota_limits_and_rotates_slugs():
+    quota = _quota(10)
+    quota.update({"x-requests-remaining": "16", "x-requests-last": "3"})
+    assert quota.budget() == 2
+    assert quota.plan(["a", "b", "c"]) == ["a", "b"]
+    assert quota.plan(["a", "b", "c"]) == ["c", "a"]
+    quota.update({"x-requests-remaining": "9"})
+    session = FakeSession()
+    assert asyncio.run(fetch_odds(session, "key", ["a", "b"], quota)) == []
+    assert session.calls == []
+
+def test_spent_quota_is_reprobed():
+    now = [1000.0]
+    quota = _quota(10, clock=lambda: now[0])
+    quota.update({"x-requests-remaining": "9"})
+    assert quota.plan(["a", "b"]) == []
+    now[0] += 3600
+    session = FakeSession(remaining=503)  # credits reset by the provider
+    out = asyncio.run(fetch_odds(session, "key", ["a", "b"], quota))
+    assert len(session.calls) == 1 and len(out) == 1
+    assert quota.plan(["a", "b"]) == ["a", "b"]
+
+def test_due_slugs_share_one_plan_and_report_failures(monkeypatch, clock):
+    import scripts.cron_notify as cn
+    from src.worker.changes import MarketsDigests
+    from src.worker.scheduler import PollScheduler
+
+    quota = _quota(10, clock=clock)
+    quota.update({"x-requests-remaining": "25", "x-requests-last": "3"})  # 5 requests above the reserve
+    sched = PollScheduler(budgets={}, clock=clock)
+    monkeypatch.setattr(cn, "ODDSAPI_KEY", "key")
+    monkeypatch.setattr(cn, "ODDSAPI_SLUGS", ["a", "b", "c", "d", "e", "f"])
+    monkeypatch.setattr(cn, "ODDSAPI_QUOTA", quota)
+    monkeypatch.setattr(cn, "POLL_SCHEDULER", sched)
+    monkeypatch.setattr(cn, "MARKETS_DIGESTS", MarketsDigests())
+
+    class DB:
+        async def upsert_match_cache_bulk(self, rows):
+            return {"inserted": len(rows), "updated": 0, "unchanged": 0, "failed": 0}
+
+    targets = {k: v for k, v in cn.poll_targets().items() if k.startswith("oddsapi:")}
+    for key, (provider, _) in targets.items():
+        sched.add(key, provider)
+    session = FakeSession(fail={"b"})
+    changed, _, written = asyncio.run(cn.ingest_due_targets(DB(), session, targets))
+    assert sorted(session.calls) == ["a", "b", "c", "d", "e"]  # the quota plan covers 5 of 6
+    assert session.peak == 4  # ODDSAPI_CONCURRENCY, shared by every due slug
+    assert written == 4 and len(changed) == 4
+    t = sched.targets
+    assert t["oddsapi:b"].failures == 1 and t["oddsapi:a"].polls == 1
+    assert t["oddsapi:f"].polls == 0 and t["oddsapi:f"].failures == 0 and not t["oddsapi:f"].in_flight
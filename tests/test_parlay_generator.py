@@ -0,0 +1,180 @@
+# tests/test_parlay_generator.py
+import json
+import asyncio
+import numpy as np
+import pytest
+from src.parlay.generator import (
+    build_candidate_table, compute_ev, estimate_prob_from_market, fetch_candidate_table,
+    select_segurito_legs, select_sonador_legs, persist_parlay, persist_parlays_bulk,
+)
+
+def _rows():
+    return [
+        {"match_id": "m1", "sport": "soccer", "home": "A", "away": "B", "markets": {
+            "Moneyline": [{"selection": "Home", "odds": 1.4}, {"selection": "Away", "odds": 3.1}, {"selection": "Draw", "odds": None}],
+            "Over/Under 2.5": [{"selection": "Over 2.5", "odds": "1.9"}],
+        }},
+        # markets may arrive as JSON text (asyncpg without codec)
+        {"match_id": "m2", "sport": "soccer", "home": "C", "away": "D", "markets": json.dumps({
+            "Moneyline": [{"selection": "Home", "odds": 1.25}, {"selection": "Away", "odds": 6.0}],
+        })},
+        {"match_id": "m3", "sport": "basketball", "home": "E", "away": "F", "markets": {
+            "Moneyline": [{"pick": "Away", "odds": 1.6, "metadata": {"book": "x"}}],
+        }},
+    ]
+
+def test_candidate_table_matches_scalar_scoring():
+    table = build_candidate_table(_rows())
+    assert len(table) == 6  # the None odds selection is dropped
+    for i in range(len(table)):
+        leg = table.leg(i)
+        assert leg["p_hat"] == pytest.approx(estimate_prob_from_market(leg["market"], leg["odds"]))
+        assert leg["ev"] == pytest.approx(compute_ev(leg["p_hat"], leg["odds"]))
+    assert table.leg(5)["selection"] == "Away"
+    assert table.leg(5)["metadata"] == {"book": "x"}
+    assert table.leg(3)["match_id"] == "m2"
+
+def test_table_mask_filters():
+    table = build_candidate_table(_rows())
+    m = table.mask(min_ev=-1.0, max_odds=2.5)
+    assert np.all(table.odds[m] <= 2.5)
+    m = table.mask(min_ev=-1.0, min_odds=1.5)
+    assert np.all(table.odds[m] > 1.5)
+
+def test_segurito_relaxes_to_best_ev():
+    table = build_candidate_table(_rows())
+    chosen = table.legs(select_segurito_legs(table, target_total_odds=1.5, max_legs=3))
+    # no selection <= 2.5 has ev >= 0 with the heuristic p_hat -> fallback by ev desc
+    assert [c["odds"] for c in chosen] == [6.0, 3.1]
+
+def test_segurito_rejects_correlated_pick():
+    rows = [
+        {"match_id": "m1", "sport": "soccer", "home": "A", "away": "B",
+         "markets": {"Over/Under 2.5": [{"selection": "Over 2.5", "odds": 2.0}, {"selection": "Under 2.5", "odds": 2.05}]}},
+        {"match_id": "m2", "sport": "soccer", "home": "C", "away": "D",
+         "markets": {"Moneyline": [{"selection": "Home", "odds": 2.2}]}},
+    ]
+    table = build_candidate_table(rows)
+    # lowest odds first would be Over + Under of m1, which never both win
+    chosen = select_segurito_legs(table, target_total_odds=4.0, max_legs=3)
+    assert len(set(table.match_idx[chosen])) == len(chosen) == 2
+    assert np.prod(table.odds[chosen]) >= 4.0
+
+def test_sonador_reaches_target():
+    table = build_candidate_table(_rows())
+    chosen = table.legs(select_sonador_legs(table, target_total_odds=10.0, max_legs=4, beam_width=20))
+    total = np.prod([c["odds"] for c in chosen])
+    assert total >= 10.0
+
+class FakeConn:
+    """Records round trips; ids come from a counter like a serial column."""
+    def __init__(self):
+        self.calls = []
+        self.next_id = 100
+        self.in_tx = False
+
+    def transaction(self):
+        conn = self
+        class Tx:
+            async def __aenter__(self):
+                conn.in_tx = True
+            async def __aexit__(self, *exc):
+                conn.in_tx = False
+        return Tx()
+
+    async def fetchrow(self, sql, *args):
+        self.calls.append(("fetchrow", self.in_tx, args))
+        self.next_id += 1
+        return {"id": self.next_id}
+
+    async def fetch(self, sql, *args):
+        self.calls.append(("fetch", self.in_tx, args))
+        ids = []
+        for ord_ in range(1, len(args[0]) + 1):
+            self.next_id += 1
+            ids.append({"id": self.next_id, "ord": ord_})
+        return ids[::-1]  # RETURNING order is not guaranteed
+
+    async def executemany(self, sql, records):
+        self.calls.append(("executemany", self.in_tx, list(records)))
+
+def _legs(n):
+    return [{"match_id": f"m{i}", "sport": "soccer", "market": "Moneyline", "selection": "Home", "odds": 1.5, "ev": 0.01} for i in range(n)]
+
+def test_persist_parlay_two_round_trips_in_transaction():
+    conn = FakeConn()
+    res = asyncio.run(persist_parlay(conn, 7, "segurito", _legs(8), 2.0))
+    assert [c[0] for c in conn.calls] == ["fetchrow", "executemany"]
+    assert all(c[1] for c in conn.calls)
+    assert len(conn.calls[1][2]) == 8 and conn.calls[1][2][0][0] == res["id"]
+    assert res["total_odds"] == pytest.approx(1.5 ** 8)
+
+def test_persist_parlays_bulk_keeps_order():
+    conn = FakeConn()
+    items = [{"user_id": 1, "mode": "segurito", "legs": _legs(2), "stake": 1.0},
+             {"user_id": 2, "mode": "sonador", "legs": _legs(3), "stake": 2.0}]
+    res = asyncio.run(persist_parlays_bulk(conn, items))
+    assert [c[0] for c in conn.calls] == ["fetch", "executemany"]
+    legs = conn.calls[1][2]
+    assert [r[0] for r in legs] == [res[0]["id"]] * 2 + [res[1]["id"]] * 3
+    assert res[0]["id"] < res[1]["id"]  # mapped by input position
+    assert res[1]["expected_return"] == pytest.approx(1.5 ** 3 * 2.0)
+
+def test_catalogue_entries_and_lookup():
+    from datetime import datetime, timedelta, timezone
+    from src.parlay.catalogue import ParlayCatalogue
+    from src.parlay.generator import build_catalogue_entries
+    table = build_candidate_table(_rows())
+    entries = build_catalogue_entries(table, [1.5, 2.0], [10.0])
+    assert [(e["mode"], e["target_total_odds"]) for e in entries] == [("segurito", 1.5), ("segurito", 2.0), ("sonador", 10.0)]
+    assert all(0.0 <= e["joint_prob"] <= 1.0 for e in entries)
+    cat = ParlayCatalogue(max_age=60)
+    asyncio.run(cat.save(None, entries))
+    hit = asyncio.run(cat.lookup(None, "segurito", 1.50, 3))
+    assert hit is entries[0]
+    assert asyncio.run(cat.lookup(None, "segurito", 1.8, 3)) is None
+    # stale entries are ignored so the caller runs a live search
+    entries[2]["generated_at"] = datetime.now(timezone.utc) - timedelta(seconds=120)
+    assert asyncio.run(cat.lookup(None, "sonador", 10.0, 8)) is None
+    assert cat.stats()["hits"] == 1 and cat.stats()["misses"] == 2
+
+def test_catalogue_refresh_prices_a_private_copy(monkeypatch):
+    import src.parlay.generator as gen
+    table = build_candidate_table(_rows())
+    shared = table.pricer()
+    seen = []
+
+    class Pool:
+        def acquire(self):
+            class Ctx:
+                async def __aenter__(self):
+                    return None
+                async def __aexit__(self, *exc):
+                    return False
+            return Ctx()
+
+    async def get(conn):
+        return table
+    async def load_targets(conn):
+        return [1.5], [10.0]
+    async def save(conn, entries):
+        seen.extend(entries)
+    monkeypatch.setattr(gen.CANDIDATE_CACHE, "get", get)
+    monkeypatch.setattr(gen.PARLAY_CATALOGUE, "load_targets", load_targets)
+    monkeypatch.setattr(gen.PARLAY_CATALOGUE, "save", save)
+    entries = asyncio.run(gen.refresh_parlay_catalogue(Pool()))
+    assert len(seen) == 2 and entries == seen
+    assert table.pricer() is shared and not shared._packed  # shared caches untouched
+    # seeded draws: the private pricer gives the same prices as the shared one
+    direct = gen.build_catalogue_entries(table, [1.5], [10.0])
+    assert [e["joint_prob"] for e in entries] == pytest.approx([e["joint_prob"] for e in direct])
+
+def test_sports_filter_is_case_insensitive():
+    class Conn:
+        async def fetch(self, sql, *args):
+            self.sql, self.args = sql, args
+            return []
+    conn = Conn()
+    asyncio.run(fetch_candidate_table(conn, ["Soccer", "tennis", "SOCCER"], 48))
+    assert "lower(sport) = ANY($2" in conn.sql
+    assert conn.args == (48, ["soccer", "tennis"])
@@ -0,0 +1,55 @@
+# tests/test_parlay_pricing.py
+import numpy as np
+import pytest
+from src.parlay.generator import build_candidate_table
+from src.parlay.pricing import ParlayPricer, fit_total_rate, fit_home_share
+
+def _table():
+    markets = {
+        "Moneyline": [{"selection": "Home", "odds": 1.6}, {"selection": "Draw", "odds": 4.0}, {"selection": "Away", "odds": 5.5}],
+        "Over/Under 2.5": [{"selection": "Over 2.5", "odds": 1.8}, {"selection": "Under 2.5", "odds": 2.0}],
+        "Both Teams To Score": [{"selection": "Yes", "odds": 1.9}],
+    }
+    rows = [{"match_id": mid, "sport": "soccer", "home": "H" + mid, "away": "A" + mid, "markets": markets} for mid in ("m1", "m2")]
+    return build_candidate_table(rows)
+
+def test_fit_total_rate_matches_even_line():
+    mu = fit_total_rate(2.5, 0.5)
+    assert 2.5 < mu < 2.9
+    assert fit_home_share(2.6, 0.5) == pytest.approx(0.5, abs=0.01)
+    assert fit_home_share(2.6, 0.8) > 0.6
+
+def test_same_match_legs_are_correlated():
+    table = _table()
+    pricer = ParlayPricer(table, n_sims=20000)
+    # rows: 0 home, 1 draw, 2 away, 3 over, 4 under, 5 btts (match m1); 6.. match m2
+    p_home, p_over, p_under = pricer.leg_probability([0, 3, 4])
+    p, odds, ev = pricer.price([(0, 3), (0, 4), (3, 4), (0, 9)])
+    assert p[0] > p_home * p_over            # home win and goals go together
+    assert p[2] == 0.0                       # over and under on one fixture never both hit
+    assert p[3] == pytest.approx(p_home * pricer.leg_probability([9])[0], abs=0.02)
+    assert odds[0] == pytest.approx(1.6 * 1.8)
+    assert ev[0] == pytest.approx(p[0] * odds[0] - 1)
+
+def test_prices_are_reproducible_and_order_free():
+    a = ParlayPricer(_table(), n_sims=1024).price([(0, 3), (6, 9, 11)])
+    pricer = ParlayPricer(_table(), n_sims=1024)
+    pricer.price([(11,)])
+    b = pricer.price([(0, 3), (6, 9, 11)])
+    assert np.array_equal(a[0], b[0])
+
+def test_quarter_and_whole_lines_priced_on_payout():
+    markets = {
+        "Moneyline": [{"selection": "Home", "odds": 1.6}, {"selection": "Away", "odds": 5.5}],
+        "Asian Handicap": [{"selection": "Home -0.25", "odds": 1.9}, {"selection": "Home -1", "odds": 2.6}],
+    }
+    table = build_candidate_table([{"match_id": "m1", "sport": "soccer", "home": "H", "away": "A", "markets": markets}])
+    pricer = ParlayPricer(table, n_sims=8192)
+    p, _, ev = pricer.price([(2,), (3,)])
+    home, away = pricer.match_scores(0)
+    margin = home - away
+    # -0.25: half of the stake lost on a draw; -1: stake back when home wins by exactly one
+    assert ev[0] == pytest.approx(np.mean(np.where(margin > 0, 1.9, np.where(margin == 0, 0.5, 0.0))) - 1)
+    assert ev[0] > np.mean(margin > 0) * 1.9 - 1
+    assert ev[1] == pytest.approx(np.mean(np.where(margin > 1, 2.6, np.where(margin == 1, 1.0, 0.0))) - 1)
+    assert p[1] == pytest.approx(np.mean(margin >= 1))  # pushes do not lose the stake
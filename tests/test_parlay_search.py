@@ -0,0 +1,62 @@
+# tests/test_parlay_search.py
+import numpy as np
+from src.parlay.search import beam_search
+
+def _pool(n, seed=7):
+    rng = np.random.default_rng(seed)
+    odds = np.round(rng.uniform(1.25, 4.0, n), 2)
+    ev = np.round(rng.uniform(0.0, 0.3, n), 4)
+    match_idx = rng.integers(0, max(1, n // 2), n)
+    return odds, ev, match_idx
+
+def test_reaches_target_one_leg_per_match():
+    odds, ev, match_idx = _pool(60)
+    combo = beam_search(odds, ev, match_idx, target_total_odds=50.0, max_legs=8, beam_width=50)
+    assert list(combo) == sorted(set(combo))
+    assert np.prod(odds[list(combo)]) >= 50.0
+    assert len(set(match_idx[list(combo)])) == len(combo)
+
+def test_reproducible_and_input_order_independent():
+    odds, ev, match_idx = _pool(120)
+    a = beam_search(odds, ev, match_idx, 200.0, 8, 40)
+    b = beam_search(odds, ev, match_idx, 200.0, 8, 40)
+    assert a == b
+    # permuting candidates yields the same leg set (ties broken canonically by position only)
+    perm = np.random.default_rng(1).permutation(len(odds))
+    c = beam_search(odds[perm], ev[perm], match_idx[perm], 200.0, 8, 40)
+    assert np.isclose(np.prod(odds[list(a)]), np.prod(odds[perm][list(c)]))
+
+def test_beam_has_no_duplicate_sets():
+    odds, ev, match_idx = _pool(30)
+    best, hits, beam = beam_search(odds, ev, match_idx, 1e9, 3, 25, return_beam=True)
+    assert hits == []
+    assert len(beam) == len(set(beam)) == 25
+    assert best == beam[0]
+
+def test_unreachable_target_falls_back_to_best_beam():
+    odds = np.array([1.3, 1.5, 1.4])
+    ev = np.array([0.1, 0.05, 0.2])
+    combo = beam_search(odds, ev, None, target_total_odds=100.0, max_legs=2, beam_width=10)
+    assert len(combo) == 2
+
+def test_ev_bound_keeps_the_best_set():
+    from itertools import combinations
+    odds, ev, match_idx = _pool(14, seed=3)
+    # unreachable target: the best scoring set of the last beam, with a beam wide enough to be exact
+    best = beam_search(odds, ev, match_idx, 1e9, 3, 10_000)
+    score = lambda c: np.prod(odds[list(c)]) * (1 + ev[list(c)].sum())
+    valid = [c for c in combinations(range(14), 3) if len(set(match_idx[list(c)])) == 3]
+    assert np.isclose(score(best), max(score(c) for c in valid))
+
+def test_rescore_reranks_the_beam():
+    odds = np.full(4, 3.0)
+    ev = np.array([0.3, 0.2, 0.1, 0.0])
+    _, _, beam = beam_search(odds, ev, None, 1e9, 2, 2, return_beam=True)
+    assert beam == [(0, 1), (0, 2)]
+    # e.g. a joint price that finds leg 0 correlated with the others
+    penalize_0 = lambda sets: np.array([0.0 if 0 in s else 1.0 for s in sets])
+    _, _, beam = beam_search(odds, ev, None, 1e9, 2, 2, return_beam=True, rescore=penalize_0)
+    assert beam == [(1, 2), (0, 1)]
+
+def test_empty_inputs():
+    assert beam_search([], [], None, 10.0) == ()
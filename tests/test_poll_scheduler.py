@@ -0,0 +1,36 @@
+# tests/test_poll_scheduler.py
+from src.worker.scheduler import PollScheduler, TIER_FAR, TIER_IDLE, TIER_LIVE, TIER_PREMATCH
+
+def test_cadence_follows_kickoff_and_live(clock):
+    s = PollScheduler(budgets={}, clock=clock)
+    s.add("far", "p")
+    s.add("soon", "p")
+    s.add("live", "p")
+    assert sorted(s.due()) == ["far", "live", "soon"]
+    s.observe("far", [{"start_time": clock.now + 3 * 86400}])
+    s.observe("soon", [{"start_time": clock.now + 600}, {"start_time": clock.now + 5 * 86400}])
+    s.observe("live", [{"start_time": clock.now - 1200}, {"start_time": clock.now - 900, "status": "finished"}])
+    assert (s.targets["far"].tier, s.targets["soon"].tier, s.targets["live"].tier) == (TIER_FAR, TIER_PREMATCH, TIER_LIVE)
+    assert s.next_due() == clock.now + 15
+    clock.now += 60
+    assert sorted(s.due()) == ["live", "soon"]
+    # a failed/empty refresh keeps the live cadence
+    s.observe("live", [])
+    assert s.targets["live"].tier == TIER_LIVE
+    clock.now += 4 * 3600
+    s.observe("soon", [])
+    assert s.targets["soon"].tier == TIER_FAR  # first match is over, the one in 5 days remains
+    s.observe("live", [])
+    assert s.targets["live"].tier == TIER_IDLE
+
+def test_budget_defers_targets_and_failures_back_off(clock):
+    s = PollScheduler(budgets={"odds": 60}, clock=clock)  # 1/min, burst of 1
+    s.add("a", "odds")
+    s.add("b", "odds")
+    assert s.due() == ["a"]
+    assert s.deferred == 1 and abs(s.next_due() - (clock.now + 60)) < 1e-6
+    s.observe("a", [{"start_time": clock.now + 3 * 86400}])
+    clock.now += 60
+    assert s.due() == ["b"]
+    s.failed("b")
+    assert s.targets["b"].failures == 1 and s.next_due() <= clock.now + 30
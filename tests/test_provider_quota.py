@@ -0,0 +1,71 @@
+# tests/test_provider_quota.py
+import asyncio
+import pytest
+from src.utils.ratelimit import QuotaExhausted, QuotaLimiter, retry_after
+
+LIMITS = {"apisports": {"per_minute": 10, "reserve": 1}, "pandascore": {"per_minute": 60, "reserve": 0}}
+
+def test_headers_drive_the_daily_quota_and_minute_bucket(clock):
+    lim = QuotaLimiter(LIMITS, clock=clock)
+    lim.acquire_sync("apisports")
+    lim.update("apisports", {"X-RateLimit-Requests-Remaining": "3", "X-RateLimit-Remaining": "9"})
+    lim.acquire_sync("apisports")
+    lim.acquire_sync("apisports")  # remaining counted down locally: 3 -> 1 == reserve
+    with pytest.raises(QuotaExhausted):
+        lim.acquire_sync("apisports")
+    # the daily quota comes back after UTC midnight
+    clock.now += 2 * 3600
+    asyncio.run(lim.acquire("apisports"))
+    # per-minute header at zero pauses the provider until the next minute
+    lim.update("pandascore", {"x-rate-limit-remaining": "500", "x-ratelimit-remaining": "0"})
+    assert lim._bucket("pandascore").try_acquire() > 0
+
+def test_state_persists_between_runs(tmp_path, clock):
+    path = str(tmp_path / "ratelimit.json")
+    lim = QuotaLimiter(LIMITS, path=path, clock=clock)
+    lim.update("apisports", {"x-ratelimit-requests-remaining": "1"})
+    lim.penalize("pandascore", 120)
+    lim.save()
+    again = QuotaLimiter(LIMITS, path=path, clock=clock)
+    assert again.exhausted("apisports")
+    assert again._bucket("pandascore").try_acquire() == pytest.approx(120)
+    clock.now += 86400
+    assert not QuotaLimiter(LIMITS, path=path, clock=clock).exhausted("apisports")
+
+def test_scheduler_waits_for_spent_quota_and_client_error_type(monkeypatch, clock):
+    from src.ingest import api_sports_client as client
+    from src.worker.scheduler import PollScheduler
+    lim = QuotaLimiter({"oddsapi": {"reserve": 10, "probe_interval": 3600}, "apisports": {"reserve": 5}}, clock=clock)
+    lim.update("oddsapi", {"x-requests-remaining": "12", "x-requests-last": "3"})
+    assert lim.budget("oddsapi") == 0  # 2 credits above the reserve, requests cost 3
+    s = PollScheduler(budgets={}, clock=clock, limiter=lim)
+    s.add("oddsapi:soccer_epl", "oddsapi")
+    assert s.due() == [] and s.next_due() == clock.now + 3600  # next probe
+    clock.now += 3600
+    assert s.due() == ["oddsapi:soccer_epl"]
+    # a spent API-Sports quota reaches the callers as APIClientError, like any failed request
+    lim.update("apisports", {"x-ratelimit-requests-remaining": "5"})
+    monkeypatch.setenv("HTTP_CACHE_PATH", "")
+
+    async def run():
+        async with client.AsyncAPISportsClient(limiter=lim) as c:
+            return await c.get_for_sport("football", "/fixtures", {"league": 39})
+    with pytest.raises(client.APIClientError):
+        asyncio.run(run())
+
+def test_retry_after_header():
+    assert retry_after({"Retry-After": "30"}) == 30.0
+    assert retry_after({"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"}) is None
+    assert retry_after({}) is None
+
+def test_oddsapi_credits_reset_monthly(clock):
+    from datetime import datetime, timezone
+    lim = QuotaLimiter({"oddsapi": {"reserve": 10}}, clock=clock)
+    lim.update("oddsapi", {"x-requests-remaining": "9", "x-requests-last": "3"})
+    assert lim.remaining("oddsapi") == 9 and lim.cost("oddsapi") == 3
+    assert lim.exhausted("oddsapi")
+    clock.now += 2 * 86400  # past UTC midnight: still the same billing month
+    assert lim.exhausted("oddsapi")
+    assert lim.resume_at("oddsapi") == datetime(2023, 12, 1, tzinfo=timezone.utc).timestamp()
+    clock.now = datetime(2023, 12, 1, 0, 1, tzinfo=timezone.utc).timestamp()
+    assert not lim.exhausted("oddsapi") and lim.remaining("oddsapi") is None
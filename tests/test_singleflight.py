@@ -0,0 +1,101 @@
+# tests/test_singleflight.py
+import asyncio
+import threading
+import time
+import src.ingest.api_sports_client as client
+from src.utils.singleflight import AsyncSingleFlight, SingleFlight
+
+def test_threads_with_same_key_share_one_call():
+    group = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def fetch(key):
+        calls.append(key)
+        started.set()
+        time.sleep(0.05)
+        return {"key": key}
+
+    results = []
+    def caller(key):
+        results.append(group.do(key, fetch, key, clone=dict))
+
+    threads = [threading.Thread(target=caller, args=("fixtures:39",))]
+    threads[0].start()
+    started.wait(1)
+    threads += [threading.Thread(target=caller, args=("fixtures:39",)) for _ in range(4)]
+    threads += [threading.Thread(target=caller, args=("fixtures:140",))]
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(calls) == ["fixtures:140", "fixtures:39"]
+    assert len(results) == 6
+    assert len({id(r) for r in results}) == 6  # every caller gets its own copy
+    st = group.stats()
+    assert (st["calls"], st["executions"], st["coalesced"], st["in_flight"]) == (6, 2, 4, 0)
+
+def test_async_callers_share_result_and_error():
+    group = AsyncSingleFlight()
+    runs = []
+
+    async def fetch(n):
+        runs.append(n)
+        await asyncio.sleep(0.01)
+        if n < 0:
+            raise RuntimeError("boom")
+        return n * 2
+
+    async def run():
+        ok = await asyncio.gather(*[group.do("a", fetch, 21) for _ in range(5)])
+        bad = await asyncio.gather(*[group.do("b", fetch, -1) for _ in range(3)], return_exceptions=True)
+        return ok, bad
+
+    ok, bad = asyncio.run(run())
+    assert ok == [42] * 5
+    assert all(isinstance(e, RuntimeError) for e in bad)
+    assert runs == [21, -1]
+    assert group.stats()["coalesced"] == 6
+
+def test_async_client_coalesces_identical_requests(monkeypatch):
+    monkeypatch.setenv("HTTP_CACHE_PATH", "")
+    sent = []
+
+    async def fake_fetch(self, url, params, headers=None):
+        sent.append(params["league"])
+        await asyncio.sleep(0.01)
+        return 200, {"response": [params["league"]]}, {}
+
+    monkeypatch.setattr(client.AsyncAPISportsClient, "_fetch", fake_fetch)
+    specs = [{"sport": "football", "league": 39, "season": 2025}] * 4 + [{"sport": "football", "league": 140, "season": 2025}]
+
+    async def run():
+        async with client.AsyncAPISportsClient() as c:
+            return await c.gather_fixtures(specs)
+
+    out = asyncio.run(run())
+    assert [r["response"] for r in out] == [[39]] * 4 + [[140]]
+    assert sorted(sent) == [39, 140]
+
+def test_cancelled_leader_hands_over_to_a_follower():
+    group = AsyncSingleFlight()
+    runs = []
+
+    async def fetch():
+        runs.append(1)
+        await asyncio.sleep(0.02)
+        return {"rows": [1]}
+
+    async def run():
+        leader = asyncio.ensure_future(group.do("k", fetch, clone=dict))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(group.do("k", fetch, clone=dict)) for _ in range(3)]
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        out = await asyncio.gather(*followers)
+        return leader, out
+
+    leader, out = asyncio.run(run())
+    assert leader.cancelled()
+    assert out == [{"rows": [1]}] * 3 and len({id(r) for r in out}) == 3
+    assert len(runs) == 2  # one follower re-ran the fetch for the others
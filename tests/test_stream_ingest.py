@@ -0,0 +1,118 @@
+# tests/test_stream_ingest.py
+import json
+import asyncio
+import pytest
+from src.worker.streaming import batches, iter_json_items, merge_streams
+
+class FakeStream:
+    def __init__(self, data):
+        self.data = data
+        self.reads = 0
+    async def read(self, n=-1):
+        self.reads += 1
+        chunk, self.data = self.data[:n], self.data[n:]
+        return chunk
+
+def test_items_are_parsed_incrementally():
+    body = json.dumps({"response": [{"fixture": {"id": i}, "odd": "1.5"} for i in range(50)]}).encode()
+    stream = FakeStream(body)
+
+    async def run():
+        first = None
+        out = []
+        async for item in iter_json_items(stream, "response.item", chunk_size=64):
+            if first is None:
+                first = len(stream.data)  # bytes not read yet when the first item came out
+            out.append(item)
+        return first, out
+
+    first, out = asyncio.run(run())
+    assert [x["fixture"]["id"] for x in out] == list(range(50))
+    assert first > len(body) // 2 and stream.reads > 10
+
+def test_merge_streams_backpressure_and_errors():
+    produced = []
+
+    async def good():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    async def bad():
+        yield "x"
+        raise RuntimeError("boom")
+
+    async def run():
+        merged = merge_streams({"good": good(), "bad": bad()}, maxsize=2)
+        key, item = await merged.__anext__()
+        await asyncio.sleep(0.01)
+        # the producers stop once the queue is full
+        assert len(produced) <= 4
+        rest = [(key, item)] + [x async for x in merged]
+        return rest
+
+    rest = asyncio.run(run())
+    assert [i for k, i in rest if k == "good"] == list(range(10))
+    errors = [i for k, i in rest if isinstance(i, Exception)]
+    assert len(errors) == 1 and str(errors[0]) == "boom"
+
+def test_batches():
+    async def items():
+        for i in range(7):
+            yield i
+
+    async def run():
+        return [b async for b in batches(items(), 3)]
+
+    assert asyncio.run(run()) == [[0, 1, 2], [3, 4, 5], [6]]
+
+def test_aborted_ingest_pass_releases_due_targets(monkeypatch):
+    import scripts.cron_notify as cn
+    from src.worker.changes import MarketsDigests
+    from src.worker.scheduler import PollScheduler
+
+    sched = PollScheduler(budgets={})
+    monkeypatch.setattr(cn, "POLL_SCHEDULER", sched)
+    monkeypatch.setattr(cn, "MARKETS_DIGESTS", MarketsDigests())
+
+    async def fixtures(session):
+        yield {"match_id": "m1", "sport": "soccer", "home": "A", "away": "B", "start_time": None, "status": "NS", "markets": {}}
+
+    class DB:
+        async def upsert_match_cache_bulk(self, rows):
+            raise RuntimeError("REST down")
+
+    targets = {"apisports:football": ("apisports", fixtures)}
+    sched.add("apisports:football", "apisports")
+    with pytest.raises(RuntimeError):
+        asyncio.run(cn.ingest_due_targets(DB(), None, targets))
+    t = sched.targets["apisports:football"]
+    assert not t.in_flight and t.failures == 1
+    assert sched.next_due() is not None
+
+def test_rows_that_failed_to_upsert_raise_no_alerts(monkeypatch):
+    import scripts.cron_notify as cn
+    from src.worker.changes import MarketsDigests
+    from src.worker.scheduler import PollScheduler
+
+    sched = PollScheduler(budgets={})
+    digests = MarketsDigests()
+    monkeypatch.setattr(cn, "POLL_SCHEDULER", sched)
+    monkeypatch.setattr(cn, "MARKETS_DIGESTS", digests)
+    rows = [{"match_id": mid, "sport": "soccer", "home": "A", "away": "B", "start_time": None,
+             "markets": {"Moneyline": [{"selection": "Home", "odds": 1.5}]}} for mid in ("m1", "m2")]
+
+    async def fixtures(session):
+        for r in rows:
+            yield r
+
+    class DB:
+        async def upsert_match_cache_bulk(self, matches):
+            return {"inserted": 1, "updated": 0, "unchanged": 0, "failed": 1, "failed_ids": ["m2"]}
+
+    sched.add("apisports:football", "apisports")
+    changed, deltas, _ = asyncio.run(cn.ingest_due_targets(DB(), None, {"apisports:football": ("apisports", fixtures)}))
+    assert [m["match_id"] for m in changed] == ["m1"]
+    assert {d.match_id for d in deltas} == {"m1"}
+    # m2 was not written: it is still a change on the next pass
+    assert [m["match_id"] for m in digests.diff(rows)[0]] == ["m2"]
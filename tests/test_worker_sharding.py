@@ -0,0 +1,43 @@
+# tests/test_worker_sharding.py
+import asyncio
+import pytest
+from src.worker.sharding import InMemoryLeaseStore, ShardManager, local_lease_store
+
+def test_shards_rebalance_and_fail_over(clock):
+    async def run():
+        store = InMemoryLeaseStore(clock=clock)
+        a = ShardManager(store, owner="a", shards=8, ttl=30)
+        b = ShardManager(store, owner="b", shards=8, ttl=30)
+        assert await a.heartbeat() and a.held == set(range(8)) and a.leader
+        # b joins: nothing free until a hands half back
+        await b.heartbeat()
+        assert b.held == set()
+        await a.heartbeat()
+        await b.heartbeat()
+        assert a.held == {0, 1, 2, 3} and b.held == {4, 5, 6, 7}
+        assert not (a.held & b.held)
+        notifs = [{"parlay_id": i} for i in range(20)]
+        assert len(a.filter(notifs)) + len(b.filter(notifs)) == 20
+        # a dies: its heartbeat and leases expire, b takes every shard (and the leader role)
+        clock.now += 31
+        await b.heartbeat()
+        assert b.held == set(range(8)) and b.leader
+
+    asyncio.run(run())
+
+def test_stop_releases_leases(clock):
+    async def run():
+        store = InMemoryLeaseStore(clock=clock)
+        a = ShardManager(store, owner="a", shards=4, ttl=30)
+        b = ShardManager(store, owner="b", shards=4, ttl=30)
+        await a.heartbeat()
+        await a.stop()
+        await b.heartbeat()
+        assert b.held == {0, 1, 2, 3}
+
+    asyncio.run(run())
+
+def test_rest_only_store_refuses_multi_worker_setup():
+    with pytest.raises(RuntimeError):
+        local_lease_store({"WORKER_ID": "w2", "WORKER_SHARDS": "16"})
+    assert isinstance(local_lease_store({}), InMemoryLeaseStore)